@@ -0,0 +1,491 @@
+# Part 6: Benchmarks (save as benchmark.py)
+#
+# Generate a synthetic photo corpus with rendered IDs:
+#
+#     python benchmark.py generate /tmp/corpus --count 200
+#
+# Time each stage of the pipeline on it (or on any folder with a truth.json)
+# and append the JSON report to a history file to compare runs over time:
+#
+#     python benchmark.py stages /tmp/corpus --history bench_history.jsonl
+#
+# Compare OCR preprocessing settings on a folder of real photos:
+#
+#     python benchmark.py preprocess /data/shoot_0412 --max-size 1600 --region bottom-right --region full
+#
+# Each candidate is timed against the full-frame, full-resolution baseline and
+# scored on match rate and on agreement with the baseline's group keys.
+#
+# Compare one Tesseract process per image with batched Tesseract runs:
+#
+#     python benchmark.py batch /tmp/corpus --batch-size 8 --batch-size 32
+#
+# Compare the installed OCR backends, with and without the pre-filter, on
+# per-image latency and match rate:
+#
+#     python benchmark.py backends /tmp/corpus --prefilter
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+import pytesseract
+from pptx import Presentation
+from deck_builder import add_group_slide
+from slide_layout import layout_groups
+from ocr_backends import available_backends
+from ocr_engine import (DEFAULT_PREPROCESS, IMAGE_EXTENSIONS, OCR_CONFIG, enhance_contrast,
+                        load_for_ocr, match_pattern, run_ocr_pool)
+from scanner import list_image_files, scan_images
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+TRUTH_FILENAME = "truth.json"
+
+# Pillow format names for the supported extensions
+EXTENSION_FORMATS = {
+    '.png': 'PNG',
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.gif': 'GIF',
+    '.bmp': 'BMP',
+}
+
+# Pipeline stages timed by the stages benchmark, in pipeline order
+STAGES = ('listing', 'decode', 'enhance', 'ocr', 'regex', 'layout', 'slides', 'save')
+
+
+def random_id(rng):
+    """A random ID in the ([1-2])[-_]?(\\d{9,}) format, returns (label, key)"""
+    prefix = rng.choice('12')
+    digits = ''.join(rng.choice('0123456789') for _ in range(rng.randint(9, 11)))
+    separator = rng.choice(['-', '_', ''])
+    return f"{prefix}{separator}{digits}", f"{prefix}-{digits}"
+
+
+def render_photo(rng, size, label):
+    """Draw a noisy 'photo' with an ID label (or no label) somewhere on it"""
+    width, height = size
+    base = Image.effect_noise((width, height), rng.randint(20, 80)).convert('RGB')
+    tint = Image.new('RGB', size, tuple(rng.randint(40, 200) for _ in range(3)))
+    image = Image.blend(base, tint, 0.6)
+
+    if label:
+        draw = ImageDraw.Draw(image)
+        font = ImageFont.load_default(size=max(16, height // 18))
+        left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+        text_width, text_height = right - left, bottom - top
+        x = rng.randint(0, max(0, width - text_width - 20))
+        y = rng.randint(0, max(0, height - text_height - 20))
+        draw.rectangle((x, y, x + text_width + 20, y + text_height + 20), fill='white')
+        draw.text((x + 10 - left, y + 10 - top), label, fill='black', font=font)
+
+    if rng.random() < 0.3:
+        image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.5, 1.5)))
+    return image
+
+
+def generate_corpus(folder, count=100, seed=0, sizes=((1024, 768), (2048, 1536), (4000, 3000)),
+                    unlabeled_rate=0.1, filename_rate=0.3):
+    """Write count synthetic photos to folder plus a truth.json of expected keys.
+
+    Photos cycle through every supported format; roughly unlabeled_rate of
+    them carry no ID at all and filename_rate also have the ID in their
+    filename. Several photos share each ID so they form groups.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    extensions = list(IMAGE_EXTENSIONS)
+    ids = [random_id(rng) for _ in range(max(1, count // 4))]
+    truth = {}
+
+    for index in range(count):
+        ext = extensions[index % len(extensions)]
+        label, key = (None, None) if rng.random() < unlabeled_rate else rng.choice(ids)
+        if key and rng.random() < filename_rate:
+            name = f"{label}_{index:05d}{ext}"
+        else:
+            name = f"photo_{index:05d}{ext}"
+
+        image = render_photo(rng, rng.choice(sizes), label)
+        image_format = EXTENSION_FORMATS[ext]
+        if image_format == 'GIF':
+            image = image.convert('P', palette=Image.ADAPTIVE)
+        image.save(os.path.join(folder, name), format=image_format)
+        truth[name] = key
+
+    with open(os.path.join(folder, TRUTH_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(truth, f, indent=1)
+    return truth
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, if the platform reports it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class StageClock:
+    """Accumulates wall time, call count and peak traced memory per stage"""
+
+    def __init__(self):
+        self.seconds = {stage: 0.0 for stage in STAGES}
+        self.calls = {stage: 0 for stage in STAGES}
+        self.peak_bytes = {stage: 0 for stage in STAGES}
+
+    def run(self, stage, func, *args):
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.seconds[stage] += time.perf_counter() - started
+            self.calls[stage] += 1
+            self.peak_bytes[stage] = max(self.peak_bytes[stage], tracemalloc.get_traced_memory()[1])
+
+
+def decode_image(img_path):
+    return load_for_ocr(img_path)
+
+
+def enhance_image(image):
+    return enhance_contrast(image)
+
+
+def ocr_text(image):
+    return pytesseract.image_to_string(image, config=OCR_CONFIG)
+
+
+def run_stages(input_folder, skip_ocr=False):
+    """Time each pipeline stage separately, one image at a time.
+
+    Stages run serially in this process so each one is measured on its own;
+    use the real pipeline for end-to-end throughput with parallel workers.
+    Returns the JSON-serialisable report.
+    """
+    truth_path = os.path.join(input_folder, TRUTH_FILENAME)
+    truth = None
+    if os.path.exists(truth_path):
+        with open(truth_path, 'r', encoding='utf-8') as f:
+            truth = json.load(f)
+
+    clock = StageClock()
+    tracemalloc.start()
+    try:
+        image_files = clock.run('listing', lambda: list(scan_images(input_folder)))
+        keys = {}
+        ocr_error = None
+
+        for img_file in image_files:
+            img_path = os.path.join(input_folder, img_file)
+            image = clock.run('decode', decode_image, img_path)
+            image = clock.run('enhance', enhance_image, image)
+
+            text = ''
+            if not skip_ocr and ocr_error is None:
+                try:
+                    text = clock.run('ocr', ocr_text, image)
+                except Exception as e:
+                    ocr_error = str(e)
+            image.close()
+
+            key = clock.run('regex', match_pattern, text)
+            if not key:
+                key = clock.run('regex', match_pattern, os.path.basename(img_file))
+            keys[img_file] = key
+
+        # Lay out and build each group's slides and save to memory
+        groups = {}
+        for img_file, key in keys.items():
+            if key:
+                groups.setdefault(key, []).append(img_file)
+        layouts = clock.run('layout', layout_groups, input_folder, groups)
+        prs = Presentation()
+        for slides in layouts.values():
+            for placements in slides:
+                clock.run('slides', add_group_slide, prs, input_folder, placements)
+        clock.run('save', prs.save, io.BytesIO())
+    finally:
+        tracemalloc.stop()
+
+    total = len(image_files)
+    stages = {}
+    for stage in STAGES:
+        seconds = clock.seconds[stage]
+        count = clock.calls[stage]
+        stages[stage] = {
+            'seconds': round(seconds, 4),
+            'calls': count,
+            'per_item_ms': round(seconds * 1000 / count, 3) if count else None,
+            'items_per_second': round(count / seconds, 2) if seconds else None,
+            'peak_traced_mb': round(clock.peak_bytes[stage] / (1024 * 1024), 2),
+        }
+
+    report = {
+        'benchmark': 'stages',
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'input_folder': os.path.abspath(input_folder),
+        'images': total,
+        'groups': len(groups),
+        'total_seconds': round(sum(clock.seconds.values()), 4),
+        'images_per_second': round(total / sum(clock.seconds.values()), 3) if total else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages,
+        'ocr_error': ocr_error,
+    }
+
+    if truth is not None:
+        scored = [name for name in image_files if name in truth]
+        correct = sum(1 for name in scored if keys.get(name) == truth[name])
+        report['accuracy'] = round(correct / len(scored), 4) if scored else None
+        report['false_matches'] = sum(1 for name in scored
+                                      if keys.get(name) and keys.get(name) != truth[name])
+    return report
+
+
+def time_preprocess(input_folder, image_files, preprocess, workers=None, batch_size=1):
+    """OCR every image with one preprocessing config, returns (seconds, keys)"""
+    keys = [None] * len(image_files)
+    started = time.perf_counter()
+    for result in run_ocr_pool(input_folder, enumerate(image_files),
+                               max_workers=workers,
+                               filename_fallback=False,
+                               preprocess=preprocess,
+                               batch_size=batch_size):
+        keys[result['index']] = result['key']
+    return time.perf_counter() - started, keys
+
+
+def compare_preprocess(input_folder, candidates, workers=None, limit=None):
+    """Benchmark preprocessing candidates against the full-frame baseline.
+
+    candidates is a list of (name, preprocess) pairs. The OCR cache and the
+    filename fallback are bypassed so only the OCR path is measured.
+    """
+    image_files = list_image_files(input_folder)[:limit]
+    if not image_files:
+        raise ValueError("No image files found")
+
+    runs = [('full-frame', dict(DEFAULT_PREPROCESS))] + list(candidates)
+    report = []
+    baseline_keys = None
+    for name, preprocess in runs:
+        seconds, keys = time_preprocess(input_folder, image_files, preprocess, workers)
+        if baseline_keys is None:
+            baseline_keys = keys
+        matched = sum(1 for key in keys if key)
+        agreed = sum(1 for key, base in zip(keys, baseline_keys) if key == base)
+        report.append({
+            'name': name,
+            'preprocess': preprocess,
+            'images': len(image_files),
+            'seconds': round(seconds, 3),
+            'images_per_second': round(len(image_files) / seconds, 3) if seconds else None,
+            'match_rate': round(matched / len(image_files), 4),
+            'baseline_agreement': round(agreed / len(image_files), 4),
+        })
+    return report
+
+
+def compare_batching(input_folder, batch_sizes, workers=None, limit=None, preprocess=None):
+    """Benchmark batched Tesseract runs against one Tesseract process per image"""
+    image_files = list_image_files(input_folder)[:limit]
+    if not image_files:
+        raise ValueError("No image files found")
+
+    preprocess = preprocess or dict(DEFAULT_PREPROCESS)
+    report = []
+    baseline_keys = None
+    for batch_size in [1] + [size for size in batch_sizes if size > 1]:
+        seconds, keys = time_preprocess(input_folder, image_files, preprocess, workers, batch_size)
+        if baseline_keys is None:
+            baseline_keys = keys
+        agreed = sum(1 for key, base in zip(keys, baseline_keys) if key == base)
+        report.append({
+            'batch_size': batch_size,
+            'images': len(image_files),
+            'seconds': round(seconds, 3),
+            'images_per_second': round(len(image_files) / seconds, 3) if seconds else None,
+            'match_rate': round(sum(1 for key in keys if key) / len(image_files), 4),
+            'baseline_agreement': round(agreed / len(image_files), 4),
+        })
+    return report
+
+
+def percentile(values, fraction):
+    """Value at the given fraction of the sorted values (nearest rank)"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def compare_backends(input_folder, backends=None, prefilter=False, workers=None, limit=None):
+    """Benchmark OCR backends on latency and match rate.
+
+    Every backend runs once as is and, with prefilter, once more with the
+    pre-filter enabled. The first run is the baseline for key agreement.
+    """
+    image_files = list_image_files(input_folder)[:limit]
+    if not image_files:
+        raise ValueError("No image files found")
+
+    runs = [(name, False) for name in backends or available_backends()]
+    if prefilter:
+        runs += [(name, True) for name, _ in runs]
+
+    report = []
+    baseline_keys = None
+    for name, use_prefilter in runs:
+        preprocess = dict(DEFAULT_PREPROCESS, backend=name, prefilter=use_prefilter)
+        keys = [None] * len(image_files)
+        latencies = []
+        skipped = errors = 0
+        started = time.perf_counter()
+        for result in run_ocr_pool(input_folder, enumerate(image_files),
+                                   max_workers=workers,
+                                   filename_fallback=False,
+                                   preprocess=preprocess):
+            keys[result['index']] = result['key']
+            if 'ocr' in result['timings']:
+                latencies.append(result['timings']['ocr'] * 1000)
+            skipped += result['prefiltered']
+            errors += bool(result['error'])
+        seconds = time.perf_counter() - started
+
+        if baseline_keys is None:
+            baseline_keys = keys
+        agreed = sum(1 for key, base in zip(keys, baseline_keys) if key == base)
+        report.append({
+            'backend': name,
+            'prefilter': use_prefilter,
+            'images': len(image_files),
+            'seconds': round(seconds, 3),
+            'images_per_second': round(len(image_files) / seconds, 3) if seconds else None,
+            'ocr_ms_mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'ocr_ms_p50': round(percentile(latencies, 0.5), 2) if latencies else None,
+            'ocr_ms_p95': round(percentile(latencies, 0.95), 2) if latencies else None,
+            'prefiltered': skipped,
+            'errors': errors,
+            'match_rate': round(sum(1 for key in keys if key) / len(image_files), 4),
+            'baseline_agreement': round(agreed / len(image_files), 4),
+        })
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Photo organizer benchmarks.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="Write a synthetic photo corpus with rendered IDs")
+    generate.add_argument('output_folder', help="Folder to write the corpus to")
+    generate.add_argument('--count', type=int, default=100, help="Number of photos (default: %(default)s)")
+    generate.add_argument('--seed', type=int, default=0, help="Random seed (default: %(default)s)")
+
+    stages = commands.add_parser('stages', help="Time each pipeline stage on a corpus")
+    stages.add_argument('input_folder', nargs='?', default=None,
+                        help="Corpus folder; a temporary synthetic corpus is used if omitted")
+    stages.add_argument('--count', type=int, default=50,
+                        help="Size of the temporary corpus (default: %(default)s)")
+    stages.add_argument('--skip-ocr', action='store_true', help="Do not run Tesseract")
+    stages.add_argument('--output', default=None, help="Write the JSON report to this file")
+    stages.add_argument('--history', default=None,
+                        help="Append the report as one line to this JSONL file")
+
+    preprocess = commands.add_parser('preprocess',
+                                     help="Compare OCR downscaling/region settings to full-frame OCR")
+    preprocess.add_argument('input_folder', help="Folder of sample photos")
+    preprocess.add_argument('--max-size', type=int, default=None,
+                            help="Long edge in pixels for the candidate run")
+    preprocess.add_argument('--region', action='append', dest='regions', default=None,
+                            help="Region for the candidate run; repeat to try several in order")
+    preprocess.add_argument('--workers', type=int, default=None,
+                            help="Number of OCR worker processes (default: one per CPU)")
+    preprocess.add_argument('--limit', type=int, default=None,
+                            help="Only use the first N images")
+
+    batch = commands.add_parser('batch',
+                                help="Compare batched Tesseract runs to one process per image")
+    batch.add_argument('input_folder', help="Folder of sample photos")
+    batch.add_argument('--batch-size', action='append', dest='batch_sizes', type=int, default=None,
+                       help="Images per Tesseract run to compare; repeatable (default: 8 and 32)")
+    batch.add_argument('--workers', type=int, default=None,
+                       help="Number of OCR worker processes (default: one per CPU)")
+    batch.add_argument('--limit', type=int, default=None,
+                       help="Only use the first N images")
+
+    backends = commands.add_parser('backends',
+                                   help="Compare OCR backends on per-image latency and match rate")
+    backends.add_argument('input_folder', help="Folder of sample photos")
+    backends.add_argument('--backend', action='append', dest='backends', default=None,
+                          choices=available_backends(),
+                          help="Backend to include; repeatable (default: all installed)")
+    backends.add_argument('--prefilter', action='store_true',
+                          help="Also run every backend with the pre-filter enabled")
+    backends.add_argument('--workers', type=int, default=None,
+                          help="Number of OCR worker processes (default: one per CPU)")
+    backends.add_argument('--limit', type=int, default=None,
+                          help="Only use the first N images")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == 'generate':
+        truth = generate_corpus(args.output_folder, args.count, args.seed)
+        report = {'output_folder': args.output_folder, 'images': len(truth),
+                  'groups': len({key for key in truth.values() if key})}
+
+    elif args.command == 'stages':
+        if args.input_folder:
+            report = run_stages(args.input_folder, skip_ocr=args.skip_ocr)
+        else:
+            with tempfile.TemporaryDirectory() as corpus:
+                generate_corpus(corpus, args.count)
+                report = run_stages(corpus, skip_ocr=args.skip_ocr)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        if args.history:
+            with open(args.history, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(report) + "\n")
+
+    elif args.command == 'preprocess':
+        candidate = {
+            'max_size': args.max_size,
+            'regions': args.regions or DEFAULT_PREPROCESS['regions'],
+        }
+        report = compare_preprocess(args.input_folder, [('candidate', candidate)],
+                                    workers=args.workers, limit=args.limit)
+
+    elif args.command == 'batch':
+        report = compare_batching(args.input_folder, args.batch_sizes or [8, 32],
+                                  workers=args.workers, limit=args.limit)
+
+    elif args.command == 'backends':
+        report = compare_backends(args.input_folder, args.backends, prefilter=args.prefilter,
+                                  workers=args.workers, limit=args.limit)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
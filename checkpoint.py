@@ -0,0 +1,151 @@
+# Part 11: Run Checkpoints (save as checkpoint.py)
+
+import hashlib
+import json
+import os
+import time
+from ocr_engine import config_fingerprint
+
+CHECKPOINT_FILENAME = "organize_checkpoint.jsonl"
+CHECKPOINT_VERSION = 2
+
+# Journal lines are forced to disk after this many results or seconds
+FLUSH_EVERY = 25
+FLUSH_SECONDS = 5.0
+
+
+class RunCancelled(Exception):
+    """Raised when a run is cancelled; its checkpoint is kept for resuming"""
+
+
+def checkpoint_path(output_folder):
+    """Checkpoint journal stored in the output folder"""
+    return os.path.join(output_folder, CHECKPOINT_FILENAME)
+
+
+def file_signature(input_folder, img_file):
+    """Size and mtime of a photo, or None if it can't be read"""
+    try:
+        stat = os.stat(os.path.join(input_folder, img_file))
+        return [stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        return None
+
+
+def run_fingerprint(input_folder, settings, preprocess, pattern_config=None):
+    """Identify the inputs and options that decide each photo's match.
+
+    A journal written under a different fingerprint cannot be resumed
+    from, since its group assignments may no longer be what this run
+    would produce.
+    """
+    config = json.dumps({
+        'input_folder': os.path.abspath(input_folder),
+        'ocr': config_fingerprint(pattern_config, preprocess),
+        # Journalled keys depend on it, cached OCR results don't
+        'multiple': bool((pattern_config or {}).get('multiple')),
+        'match_strategy': settings['match_strategy'],
+    }, sort_keys=True)
+    return hashlib.sha256(config.encode('utf-8')).hexdigest()
+
+
+class RunJournal:
+    """Append-only journal of finished matches for one input folder.
+
+    The first line is a header holding the run fingerprint; each following
+    line records one photo's match along with its size and mtime, so a
+    resumed run can reuse the result as long as the file is unchanged. A
+    line torn by a crash is ignored on load.
+    """
+
+    def __init__(self, path, fingerprint, resume=True, log=print):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.log = log
+        self.completed = self.load() if resume else {}
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+        # Rewrite what is kept, dropping torn lines and entries of other
+        # runs, next to the journal so a crash meanwhile leaves it intact
+        temp_path = path + ".tmp"
+        self.file = open(temp_path, 'w', encoding='utf-8')
+        self.write({'version': CHECKPOINT_VERSION, 'fingerprint': fingerprint})
+        for entry in self.completed.values():
+            self.write(entry)
+        self.flush()
+        self.file.close()
+        os.replace(temp_path, path)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def load(self):
+        """Finished entries of a previous run with the same fingerprint"""
+        completed = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or 'null')
+                if (not isinstance(header, dict) or header.get('version') != CHECKPOINT_VERSION
+                        or header.get('fingerprint') != self.fingerprint):
+                    return {}
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    completed[entry['file']] = entry
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.path):
+                self.log(f"Ignoring unreadable checkpoint {self.path}: {str(e)}")
+            return {}
+        return completed
+
+    def lookup(self, img_file, signature):
+        """The journalled entry for a photo if its signature (see
+        file_signature) is unchanged, or None"""
+        entry = self.completed.get(img_file)
+        if entry is None or signature is None:
+            return None
+        if signature != entry['signature']:
+            return None
+        return entry
+
+    def record(self, result, signature):
+        """Journal a finished match, flushing to disk periodically.
+
+        signature is the photo's file_signature taken before it was read,
+        so a photo replaced while it was being matched is not resumed
+        with the old photo's match.
+        """
+        self.write({
+            'file': result['file'],
+            'signature': signature,
+            'text': result['text'],
+            'key': result['key'],
+            'keys': result['keys'],
+            'source': result['source'],
+        })
+        self.pending += 1
+        if self.pending >= FLUSH_EVERY or time.monotonic() - self.last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def discard(self):
+        """Close and delete the journal once the run has completed"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,262 @@
+# Part 5: Headless Command Line (save as cli.py)
+#
+# Runs the organizer without the Tkinter window, e.g. from cron:
+#
+#     python cli.py /data/shoot_0412 /data/decks --workers 8 --output-name "{folder}.pptx"
+#
+# A JSON summary equivalent to the app's processing details is written to
+# stdout (or --summary-file); debug output goes to stderr. Ctrl+C stops the
+# run after the images in progress and keeps its checkpoint, so running the
+# same command again resumes where it left off.
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import pytesseract
+from checkpoint import RunCancelled
+from dedup import DEDUP_MODES
+from ocr_backends import OCR_BACKENDS
+from ocr_engine import MATCH_STRATEGIES, OCR_REGIONS
+from photo_pipeline import DEFAULT_SETTINGS, make_settings, organize_photos, rebuild_from_results
+from watcher import DEFAULT_POLL_SECONDS, DEFAULT_SETTLE_SECONDS, watch_folder
+
+# Exit codes
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_NO_IMAGES = 3
+EXIT_CANCELLED = 130
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Group photos by OCR-extracted IDs into a PowerPoint presentation.")
+    parser.add_argument('input_folder', help="Folder containing the source photos")
+    parser.add_argument('output_folder', help="Folder to write the presentation to")
+    parser.add_argument('--recursive', action='store_true',
+                        help="Also process photos in subfolders of the input folder")
+    parser.add_argument('--include', action='append', default=None, metavar='GLOB',
+                        help="Only process images whose relative path or name matches; repeatable")
+    parser.add_argument('--exclude', action='append', default=None, metavar='GLOB',
+                        help="Skip images and subfolders whose relative path or name matches; repeatable")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of OCR worker processes (default: one per CPU)")
+    parser.add_argument('--output-name', default=DEFAULT_SETTINGS['output_name'],
+                        help="Presentation file name; may use {folder}, {date} and {timestamp} "
+                             "(default: %(default)s)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Update the previous presentation in place, rebuilding only slides "
+                             "of new or changed groups")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and update the presentation as photos are added, "
+                             "changed or removed, until Ctrl+C; implies --incremental")
+    parser.add_argument('--poll-seconds', type=float, default=DEFAULT_POLL_SECONDS, metavar='S',
+                        help="With --watch, how often to rescan the folder when file system "
+                             "events are unavailable (default: %(default)s)")
+    parser.add_argument('--settle-seconds', type=float, default=DEFAULT_SETTLE_SECONDS, metavar='S',
+                        help="With --watch, how long a file must stay unchanged before it is "
+                             "read (default: %(default)s)")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Build the slides of groups that have settled while OCR is still "
+                             "running on the rest (not with sharded output)")
+    parser.add_argument('--group-gap', type=int, default=DEFAULT_SETTINGS['group_gap'], metavar='N',
+                        help="With --pipeline, a group is built once the N images after its last "
+                             "photo have been matched; larger values rebuild fewer groups when "
+                             "photos are out of order (default: %(default)s)")
+    parser.add_argument('--embed-dpi', type=int, default=DEFAULT_SETTINGS['embed_dpi'],
+                        help="Shrink photos to the pixels their slide slot needs at this DPI "
+                             "before embedding; 0 embeds the original files (default: %(default)s)")
+    parser.add_argument('--embed-quality', type=int, default=DEFAULT_SETTINGS['embed_quality'],
+                        help="JPEG quality for shrunk photos (default: %(default)s)")
+    parser.add_argument('--max-photos-per-slide', type=int,
+                        default=DEFAULT_SETTINGS['max_photos_per_slide'], metavar='N',
+                        help="Continue larger groups on further slides, laid out in a grid; "
+                             "0 puts each group on one slide (default: %(default)s)")
+    parser.add_argument('--shard-slides', type=int, default=0, metavar='N',
+                        help="Write a new presentation every N slides (e.g. organized_photos_001.pptx)")
+    parser.add_argument('--shard-mb', type=float, default=0, metavar='MB',
+                        help="Write a new presentation once embedded media reaches this many MB")
+    parser.add_argument('--match-strategy', choices=MATCH_STRATEGIES,
+                        default=DEFAULT_SETTINGS['match_strategy'],
+                        help="Where to look for the group key first (default: %(default)s)")
+    parser.add_argument('--patterns-file', default=None,
+                        help="JSON file with the group key patterns and normalization rules "
+                             "(default: the built-in 1-123456789 style IDs)")
+    parser.add_argument('--multi-group', action='store_true',
+                        help="Add a photo showing several IDs to each of their groups")
+    parser.add_argument('--dedup', choices=DEDUP_MODES, default=DEFAULT_SETTINGS['dedup'],
+                        help="Collapse duplicate photos: identical files only, before OCR (exact), "
+                             "or also near-identical shots with the same match (similar) "
+                             "(default: %(default)s)")
+    parser.add_argument('--dedup-threshold', type=int, default=DEFAULT_SETTINGS['dedup_threshold'],
+                        metavar='BITS',
+                        help="Perceptual hash bits (of 64) similar photos may differ in "
+                             "(default: %(default)s)")
+    parser.add_argument('--ocr-max-size', type=int, default=DEFAULT_SETTINGS['ocr_max_size'],
+                        help="Downscale images so their long edge is at most this many pixels "
+                             "before OCR (default: full resolution)")
+    parser.add_argument('--ocr-region', action='append', dest='ocr_regions', default=None,
+                        help="Region to OCR, either a name (%s) or left,top,right,bottom "
+                             "fractions; repeat to try several in order (default: full)"
+                             % ", ".join(OCR_REGIONS))
+    parser.add_argument('--ocr-batch-size', type=int, default=DEFAULT_SETTINGS['ocr_batch_size'],
+                        metavar='N',
+                        help="OCR N images per Tesseract process instead of starting one per "
+                             "image (default: %(default)s)")
+    parser.add_argument('--ocr-backend', choices=list(OCR_BACKENDS),
+                        default=DEFAULT_SETTINGS['ocr_backend'],
+                        help="OCR engine; tesserocr must be installed separately (default: %(default)s)")
+    parser.add_argument('--prefilter', action='store_true',
+                        help="Skip OCR for images a quick edge check finds no label in")
+    parser.add_argument('--memory-budget-mb', type=float, default=0, metavar='MB',
+                        help="Limit decoded image data held by all OCR workers together; "
+                             "decoding waits while the budget is used up (default: no limit)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Do not read or write the OCR result cache")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Start over instead of resuming an interrupted run from its checkpoint")
+    parser.add_argument('--tesseract-cmd', default=None,
+                        help="Path to the tesseract executable if it is not on PATH")
+    parser.add_argument('--timings-log', default=None,
+                        help="Export per-stage timings to this file (.json summary or .csv per image)")
+    parser.add_argument('--export-results', default=None, metavar='FILE',
+                        help="Export every photo's match (OCR text, key, file size, mtime and "
+                             "hash) to this JSON lines file, for rebuilding with --from-results")
+    parser.add_argument('--results-index', action='store_true',
+                        help="With --export-results, also write an SQLite index of photos and "
+                             "group keys next to the export")
+    parser.add_argument('--from-results', default=None, metavar='FILE',
+                        help="Build the presentation from an exported result set instead of "
+                             "running OCR")
+    parser.add_argument('--group', action='append', dest='groups', default=None, metavar='KEY',
+                        help="With --from-results, only build this group; repeatable")
+    parser.add_argument('--summary-file', default=None,
+                        help="Write the JSON summary to this file instead of stdout")
+    parser.add_argument('--quiet', action='store_true',
+                        help="Suppress per-image debug output on stderr")
+    parser.add_argument('--verbose', action='store_true',
+                        help="Also log each photo's OCR text and the photos of every group")
+    return parser
+
+
+def settings_from_args(args):
+    """Pipeline settings from the parsed command line options"""
+    return make_settings(workers=args.workers,
+                         recursive=args.recursive,
+                         include=args.include or [],
+                         exclude=args.exclude or [],
+                         use_cache=not args.no_cache,
+                         match_strategy=args.match_strategy,
+                         patterns_file=args.patterns_file,
+                         multi_group=args.multi_group,
+                         dedup=args.dedup,
+                         dedup_threshold=args.dedup_threshold,
+                         ocr_max_size=args.ocr_max_size,
+                         ocr_regions=args.ocr_regions or DEFAULT_SETTINGS['ocr_regions'],
+                         ocr_batch_size=args.ocr_batch_size,
+                         ocr_backend=args.ocr_backend,
+                         ocr_prefilter=args.prefilter,
+                         memory_budget_mb=args.memory_budget_mb,
+                         output_name=args.output_name,
+                         incremental=args.incremental,
+                         pipeline=args.pipeline,
+                         group_gap=args.group_gap,
+                         embed_dpi=args.embed_dpi,
+                         embed_quality=args.embed_quality,
+                         max_photos_per_slide=args.max_photos_per_slide,
+                         shard_slides=args.shard_slides,
+                         shard_mb=args.shard_mb,
+                         timings_log=args.timings_log,
+                         export_results=args.export_results,
+                         results_index=args.results_index,
+                         resume=not args.no_resume,
+                         verbose=args.verbose)
+
+
+def write_summary(summary, summary_file=None):
+    """Write the JSON summary to a file or stdout"""
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    if summary_file:
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = args.tesseract_cmd
+
+    if args.quiet:
+        log = lambda message: None
+    else:
+        log = lambda message: print(message, file=sys.stderr)
+
+    summary = {
+        'status': 'ok',
+        'input_folder': args.input_folder,
+        'output_folder': args.output_folder,
+    }
+    exit_code = EXIT_OK
+
+    # The first Ctrl+C cancels cleanly, a second one aborts immediately
+    cancel_event = threading.Event()
+
+    def request_cancel(signum, frame):
+        print("Cancelling after the images in progress (Ctrl+C again to abort)", file=sys.stderr)
+        cancel_event.set()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    previous_handler = signal.signal(signal.SIGINT, request_cancel)
+    if args.watch:
+        # Service managers stop a watcher with SIGTERM
+        previous_term_handler = signal.signal(signal.SIGTERM, request_cancel)
+
+    if not os.path.isdir(args.input_folder):
+        summary.update(status='error', error="Input folder does not exist")
+        exit_code = EXIT_ERROR
+    elif args.from_results and args.watch:
+        summary.update(status='error', error="--from-results cannot be used with --watch")
+        exit_code = EXIT_ERROR
+    elif args.groups and not args.from_results:
+        summary.update(status='error', error="--group needs --from-results")
+        exit_code = EXIT_ERROR
+    else:
+        try:
+            settings = settings_from_args(args)
+            if args.watch:
+                details = watch_folder(args.input_folder, args.output_folder, settings, cancel_event,
+                                       log=log, poll_seconds=args.poll_seconds,
+                                       settle_seconds=args.settle_seconds)
+            elif args.from_results:
+                details = rebuild_from_results(args.from_results, args.input_folder,
+                                               args.output_folder, settings, keys=args.groups,
+                                               log=log, cancel_event=cancel_event)
+            else:
+                details = organize_photos(args.input_folder, args.output_folder,
+                                          settings=settings, log=log, cancel_event=cancel_event)
+            if details is None:
+                summary.update(status='no_images', error="No image files found")
+                exit_code = EXIT_NO_IMAGES
+            else:
+                summary.update(details)
+        except RunCancelled as e:
+            summary.update(status='cancelled', error=str(e))
+            exit_code = EXIT_CANCELLED
+        except Exception as e:
+            summary.update(status='error', error=str(e))
+            exit_code = EXIT_ERROR
+
+    signal.signal(signal.SIGINT, previous_handler)
+    if args.watch:
+        signal.signal(signal.SIGTERM, previous_term_handler)
+    write_summary(summary, args.summary_file)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
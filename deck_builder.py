@@ -0,0 +1,693 @@
+# Part 8: Presentation Builder (save as deck_builder.py)
+
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.parts.image import ImagePart
+from embed_images import DEFAULT_EMBED, iter_prepared, load_picture, prepare_embed, slot_pixels
+from slide_layout import DEFAULT_LAYOUT, DimensionCache, dimensions_path, layout_group, layout_groups
+from checkpoint import RunCancelled
+
+MANIFEST_VERSION = 2
+
+# Groups a GroupFeed holds before its producer has to wait for slide building
+FEED_SIZE = 64
+
+
+def manifest_path(output_path):
+    """Manifest file stored next to a presentation"""
+    return os.path.splitext(output_path)[0] + ".manifest.json"
+
+
+def load_manifest(output_path, log=print):
+    """Load the manifest for a previous presentation, or None"""
+    path = manifest_path(output_path)
+    if not os.path.exists(output_path) or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        log(f"Ignoring unreadable manifest {path}: {str(e)}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(output_path, manifest):
+    """Write the manifest next to the presentation it describes"""
+    path = manifest_path(output_path)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def embed_key(embed):
+    """The embed settings that change what ends up on a slide"""
+    return {'dpi': embed['dpi'] or None, 'quality': embed['quality'] if embed['dpi'] else None}
+
+
+def photo_signature(input_folder, photo):
+    """Identify a photo's current contents by path, size and mtime"""
+    try:
+        stat = os.stat(os.path.join(input_folder, photo))
+        return [photo, stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        return [photo, None, None]
+
+
+def lay_out(input_folder, output_folder, photo_groups, layout=None, workers=None, timings=None,
+            log=print):
+    """Lay out the slides of all groups up front (see slide_layout.layout_groups)"""
+    started = time.perf_counter()
+    os.makedirs(output_folder, exist_ok=True)
+    layouts = layout_groups(input_folder, photo_groups, layout, dimensions_path(output_folder), workers,
+                            log)
+    if timings:
+        timings.add_stage('layout', time.perf_counter() - started)
+    return layouts
+
+
+class PictureParts:
+    """The image parts of a presentation, indexed for adding pictures.
+
+    slide.shapes.add_picture walks every part of the package twice per
+    picture, once to find an identical image to reuse and once to pick the
+    next free media name, so a deck of n photos costs O(n^2). Indexing both
+    once gives the same parts and names in O(1) per picture. The index has
+    to be refreshed after slides are deleted (see invalidate), since their
+    images may no longer be part of the package.
+    """
+
+    def __init__(self, prs):
+        self.package = prs.part.package
+        self.by_sha1 = None
+        self.used_idxs = None
+        self.next_idx = 1
+
+    def invalidate(self):
+        self.by_sha1 = None
+
+    def refresh(self):
+        self.by_sha1 = {}
+        self.used_idxs = set()
+        self.next_idx = 1
+        for part in self.package.iter_parts():
+            if isinstance(part, ImagePart):
+                self.by_sha1.setdefault(part.sha1, part)
+            if part.partname.startswith('/ppt/media/image') and part.partname.idx is not None:
+                self.used_idxs.add(part.partname.idx)
+
+    def get_or_add(self, image):
+        """The image part holding a loaded picture (see embed_images.load_picture)"""
+        if self.by_sha1 is None:
+            self.refresh()
+        image_part = self.by_sha1.get(image.sha1)
+        if image_part is None:
+            # Lowest free media number, as Package.next_image_partname picks
+            while self.next_idx in self.used_idxs:
+                self.next_idx += 1
+            self.used_idxs.add(self.next_idx)
+            image_part = ImagePart(PackURI(f"/ppt/media/image{self.next_idx}.{image.ext}"),
+                                   image.content_type, self.package, image.blob, image.filename)
+            self.by_sha1[image.sha1] = image_part
+        return image_part
+
+
+def place_picture(slide, image_part, x, y, width, height):
+    """Add a picture of an image part to a slide, as shapes.add_picture does
+    when given both width and height"""
+    rId = slide.part.relate_to(image_part, RT.IMAGE)
+    shapes = slide.shapes
+    shape_id = shapes._next_shape_id
+    shapes._grpSp.add_pic(shape_id, f"Picture {shape_id - 1}", image_part.desc, rId,
+                           x, y, width, height)
+
+
+def add_group_slide(prs, input_folder, placements, pictures=None, parts=None, log=print,
+                    timings=None):
+    """Create one slide of a group from (photo, (x, y, width, height)) placements.
+
+    pictures optionally gives, per photo, the picture prepared for it on a
+    worker thread (see embed_images.prepare_embed), None for one that could
+    not be prepared; otherwise the original files are loaded here. parts is
+    the deck's PictureParts, made for this slide alone if not given.
+    """
+    slide = prs.slides.add_slide(prs.slide_layouts[6])  # blank layout
+    parts = parts or PictureParts(prs)
+
+    # Add photos to slide at their laid out positions
+    for photo_idx, (photo, (x, y, width, height)) in enumerate(placements):
+        try:
+            if pictures:
+                image = pictures[photo_idx]
+                if image is None:
+                    continue  # Already reported by take_pictures
+            else:
+                image = load_picture(os.path.join(input_folder, photo))
+            started = time.perf_counter()
+            place_picture(slide, parts.get_or_add(image), x, y, width, height)
+            if timings:
+                timings.add_stage('add_picture', time.perf_counter() - started)
+        except Exception as e:
+            log(f"Error adding photo {photo}: {str(e)}")
+
+    return slide
+
+
+def find_slide_entry(prs, slide_id):
+    """Return the <p:sldId> element for a slide id, or None"""
+    for sld_id in prs.slides._sldIdLst:
+        if sld_id.id == slide_id:
+            return sld_id
+    return None
+
+
+def delete_slide(prs, slide_id):
+    """Remove a slide; its part (and any media only it used) is not saved again"""
+    sld_id = find_slide_entry(prs, slide_id)
+    if sld_id is None:
+        return None
+    sld_id_lst = prs.slides._sldIdLst
+    position = list(sld_id_lst).index(sld_id)
+    prs.part.drop_rel(sld_id.rId)
+    sld_id_lst.remove(sld_id)
+    renumber_slides(prs)
+    return position
+
+
+def renumber_slides(prs):
+    """Give slide parts consecutive names in slide order, so names freed by
+    deleted slides are never handed out twice"""
+    prs.part.rename_slide_parts([sld_id.rId for sld_id in prs.slides._sldIdLst])
+
+
+def move_slide(prs, slide_id, position):
+    """Move a slide to the given position in the slide order"""
+    sld_id_lst = prs.slides._sldIdLst
+    sld_id = find_slide_entry(prs, slide_id)
+    sld_id_lst.remove(sld_id)
+    sld_id_lst.insert(position, sld_id)
+
+
+def save_presentation(prs, output_folder, output_name, timings=None):
+    """Save presentation with error handling, returns the path written"""
+    os.makedirs(output_folder, exist_ok=True)
+    output_path = os.path.join(output_folder, output_name)
+    started = time.perf_counter()
+    try:
+        prs.save(output_path)
+    except PermissionError:
+        # Try saving with a different filename
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        stem, ext = os.path.splitext(output_name)
+        alternative_path = os.path.join(output_folder, f"{stem}_{timestamp}{ext}")
+        try:
+            prs.save(alternative_path)
+            output_path = alternative_path  # Update output_path for success message
+        except Exception as save_error:
+            raise Exception(f"Could not save presentation. Please ensure PowerPoint is closed and you have write permissions. Error: {str(save_error)}")
+    if timings:
+        timings.add_stage('save', time.perf_counter() - started)
+    return output_path
+
+
+def prepare_pictures(input_folder, slides, embed):
+    """Start preparing every photo of slides (lists of placements) for embedding.
+
+    Photos are read (and, with embed['dpi'] set, shrunk to their slot) on a
+    thread pool. Returns an iterator of prepared pictures in photo order.
+    """
+    tasks = [(os.path.join(input_folder, photo),
+              slot_pixels(width, height, embed['dpi']) if embed['dpi'] else None)
+             for placements in slides
+             for photo, (_, _, width, height) in placements]
+    return iter_prepared(tasks, embed['quality'], workers=embed['workers'])
+
+
+def take_pictures(prepared, input_folder, photos, deck_stats, log=print, timings=None):
+    """Collect one slide's pictures, returns (pictures, embedded media bytes)"""
+    pictures = []
+    media_bytes = 0
+    for photo in photos:
+        picture = next(prepared)
+        if picture['error']:
+            log(f"Error preparing photo {photo}: {picture['error']}")
+        if picture['image_error']:
+            log(f"Error adding photo {photo}: {picture['image_error']}")
+        deck_stats['original_bytes'] += picture['original_bytes']
+        deck_stats['embedded_bytes'] += picture['embedded_bytes']
+        if timings:
+            timings.add_stage('prepare', picture['seconds'])
+        media_bytes += picture['embedded_bytes']
+        pictures.append(picture['image'])
+    return pictures, media_bytes
+
+
+def open_deck(input_folder, output_folder, output_name, incremental, embed, layout, log=print):
+    """Open the deck to update, returns (prs, manifest, previous).
+
+    With incremental set and a previous presentation and manifest in place,
+    that deck is opened; previous then holds the manifest groups whose
+    slides may be kept, none if they were embedded or laid out with other
+    settings. Otherwise a new presentation is started.
+    """
+    target_path = os.path.join(output_folder, output_name)
+    manifest = load_manifest(target_path, log) if incremental else None
+    if manifest is not None and manifest.get('input_folder') != os.path.abspath(input_folder):
+        log(f"Manifest for {target_path} was built from another folder, rebuilding")
+        manifest = None
+
+    if manifest is not None:
+        prs = Presentation(target_path)
+        # Slides embedded or laid out with other settings have to be rebuilt
+        previous = (manifest['groups'] if manifest.get('embed') == embed_key(embed)
+                    and manifest.get('layout') == layout else {})
+    else:
+        # Create PowerPoint
+        prs = Presentation()
+        previous = {}
+    return prs, manifest, previous
+
+
+def new_deck_stats():
+    return {'slides_added': 0, 'slides_rebuilt': 0, 'slides_kept': 0, 'slides_removed': 0,
+            'original_bytes': 0, 'embedded_bytes': 0}
+
+
+def drop_group(prs, entry, deck_stats):
+    """Delete the slides of a group's manifest entry"""
+    for slide_id in entry['slide_ids']:
+        if delete_slide(prs, slide_id) is not None:
+            deck_stats['slides_removed'] += 1
+
+
+def can_keep(prs, entry, signature):
+    """Whether a group's previous slides still show exactly its photos"""
+    return (entry is not None and entry['photos'] == signature
+            and all(find_slide_entry(prs, slide_id) is not None for slide_id in entry['slide_ids']))
+
+
+def render_group(prs, parts, input_folder, slides, entry, prepared, deck_stats, log=print,
+                 timings=None):
+    """Build the slides of one group from its layout and prepared pictures.
+
+    If entry (a manifest entry) is given, its slides are replaced where the
+    first one was. Returns (slide ids, whether old slides were replaced).
+    """
+    position = None
+    for slide_id in (entry['slide_ids'] if entry else []):
+        removed = delete_slide(prs, slide_id)
+        if position is None:
+            position = removed
+        parts.invalidate()
+    slide_ids = []
+    for placements in slides:
+        pictures, _ = take_pictures(prepared, input_folder, [photo for photo, _ in placements],
+                                    deck_stats, log, timings)
+        slide_id = add_group_slide(prs, input_folder, placements, pictures, parts, log,
+                                   timings).slide_id
+        if position is not None:
+            move_slide(prs, slide_id, position + len(slide_ids))
+        slide_ids.append(slide_id)
+    return slide_ids, position is not None
+
+
+def finish_deck(prs, input_folder, output_folder, output_name, embed, layout, groups_manifest,
+                deck_stats, log=print, timings=None):
+    """Save the presentation and its manifest, returns the path written"""
+    log(f"Slides added: {deck_stats['slides_added']}, rebuilt: {deck_stats['slides_rebuilt']}, "
+        f"kept: {deck_stats['slides_kept']}, removed: {deck_stats['slides_removed']}")
+    if embed['dpi']:
+        log(f"Embedded images: {deck_stats['original_bytes']} bytes before, "
+            f"{deck_stats['embedded_bytes']} bytes after")
+
+    renumber_slides(prs)
+    output_path = save_presentation(prs, output_folder, output_name, timings)
+    save_manifest(output_path, {
+        'version': MANIFEST_VERSION,
+        'input_folder': os.path.abspath(input_folder),
+        'embed': embed_key(embed),
+        'layout': layout,
+        'groups': groups_manifest,
+    })
+    deck_stats['total_slides'] = len(prs.slides)
+    return output_path
+
+
+def build_deck(input_folder, output_folder, output_name, photo_groups, incremental=False,
+               embed=None, layout=None, progress_callback=None, log=print, timings=None,
+               cancel_event=None):
+    """Create the presentation with the slides of each group and save it.
+
+    Groups get as many slides as layout (see slide_layout.DEFAULT_LAYOUT)
+    needs. A manifest of group key -> photos -> slides is written next to
+    the presentation. With incremental set and a previous presentation and
+    manifest in place, that deck is opened instead of starting from scratch:
+    unchanged groups keep their slides (and embedded media) as they are,
+    changed groups are rebuilt in place, new groups are appended and groups
+    that no longer exist are removed.
+
+    embed overrides DEFAULT_EMBED; when its dpi is set, photos are shrunk to
+    their slot size and re-encoded on a thread pool while slides are built.
+    If cancel_event is set between groups nothing is saved and the previous
+    presentation is left untouched.
+
+    Returns (output_path, deck_stats).
+    """
+    embed = dict(DEFAULT_EMBED, **(embed or {}))
+    layout = dict(DEFAULT_LAYOUT, **(layout or {}))
+    prs, manifest, previous = open_deck(input_folder, output_folder, output_name, incremental,
+                                        embed, layout, log)
+    deck_stats = new_deck_stats()
+    groups_manifest = {}
+    parts = PictureParts(prs)
+
+    # Drop slides of groups that disappeared (or whose manifest entry is stale)
+    for group_key, entry in (manifest['groups'] if manifest else {}).items():
+        if group_key not in photo_groups or group_key not in previous:
+            drop_group(prs, entry, deck_stats)
+
+    # Work out which groups need new slides before building anything, so
+    # their images can be prepared ahead of the slide loop
+    plan = []
+    for group_key, photos in photo_groups.items():
+        signature = [photo_signature(input_folder, photo) for photo in photos]
+        entry = previous.get(group_key)
+        plan.append((group_key, photos, signature, entry, can_keep(prs, entry, signature)))
+
+    layouts = lay_out(input_folder, output_folder,
+                      {group_key: photos for group_key, photos, _, _, keep in plan if not keep},
+                      layout, embed['workers'], timings, log)
+    prepared = prepare_pictures(input_folder,
+                                [placements for slides in layouts.values() for placements in slides],
+                                embed)
+
+    # Process each group
+    total_groups = len(plan)
+    if timings:
+        timings.start_deck(total_groups)
+    for idx, (group_key, photos, signature, entry, keep) in enumerate(plan, 1):
+        check_cancelled(cancel_event)
+        if keep:
+            slide_ids = entry['slide_ids']
+            deck_stats['slides_kept'] += len(slide_ids)
+        else:
+            slide_ids, replaced = render_group(prs, parts, input_folder, layouts[group_key], entry,
+                                               prepared, deck_stats, log, timings)
+            deck_stats['slides_rebuilt' if replaced else 'slides_added'] += len(slide_ids)
+
+        groups_manifest[group_key] = {'photos': signature, 'slide_ids': slide_ids}
+
+        # Update progress
+        if timings:
+            timings.group_done()
+        if progress_callback:
+            progress_callback(50 + (idx / total_groups) * 50)
+
+    output_path = finish_deck(prs, input_folder, output_folder, output_name, embed, layout,
+                              groups_manifest, deck_stats, log, timings)
+    return output_path, deck_stats
+
+
+class GroupFeed:
+    """Groups handed to build_streamed_deck one at a time while OCR is still
+    running.
+
+    A bounded queue, so a producer that gets far ahead of slide building
+    waits instead of piling up groups. Putting a group key again replaces
+    that group's slides. close() ends the feed once every group is in;
+    abort() gives up on it (OCR failed, or slide building did), so neither
+    side is left waiting for the other.
+    """
+
+    END = object()
+
+    def __init__(self, max_groups=FEED_SIZE):
+        self.queue = queue.Queue(max_groups)
+        self.keys = set()
+        self.total = None  # Distinct groups, known once closed
+        self.aborted = threading.Event()
+
+    def put(self, group_key, photos):
+        self.keys.add(group_key)
+        self.send((group_key, list(photos)))
+
+    def close(self):
+        self.total = len(self.keys)
+        self.send(self.END)
+
+    def abort(self):
+        self.aborted.set()
+
+    def send(self, item):
+        while not self.aborted.is_set():
+            try:
+                self.queue.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                pass
+
+    def get(self, block=True):
+        """The next (group_key, photos), END once closed, or None when
+        nothing has arrived yet and block is off"""
+        while True:
+            if self.aborted.is_set():
+                raise RunCancelled("Slide building stopped with the run")
+            try:
+                return self.queue.get(timeout=0.2) if block else self.queue.get_nowait()
+            except queue.Empty:
+                if not block:
+                    return None
+
+
+def submit_pictures(executor, input_folder, slides, embed):
+    """Start preparing the photos of slides on executor, returns their futures in photo order"""
+    return [executor.submit(prepare_embed, os.path.join(input_folder, photo),
+                            slot_pixels(width, height, embed['dpi']) if embed['dpi'] else None,
+                            embed['quality'])
+            for placements in slides
+            for photo, (_, _, width, height) in placements]
+
+
+def build_streamed_deck(input_folder, output_folder, output_name, feed, incremental=False,
+                        embed=None, layout=None, progress_callback=None, log=print, timings=None,
+                        cancel_event=None):
+    """Build the presentation from groups arriving on a GroupFeed, e.g. while
+    OCR is still matching the rest of the photos.
+
+    Works like build_deck, but each group is laid out and its pictures are
+    started on the thread pool as soon as it arrives; while the pool has
+    room, groups already waiting in the feed are started ahead of the one
+    being built. A group put again replaces its slides in place. Groups of
+    the previous deck that never arrive are removed once the feed is
+    closed. The total for progress is only known by then.
+
+    Returns (output_path, deck_stats).
+    """
+    embed = dict(DEFAULT_EMBED, **(embed or {}))
+    layout = dict(DEFAULT_LAYOUT, **(layout or {}))
+    prs, manifest, previous = open_deck(input_folder, output_folder, output_name, incremental,
+                                        embed, layout, log)
+    deck_stats = new_deck_stats()
+    groups_manifest = {}
+    counted = {}  # Group key -> its share of deck_stats
+    parts = PictureParts(prs)
+
+    # Stale manifest entries can go now; vanished groups only once all have arrived
+    for group_key, entry in (manifest['groups'] if manifest else {}).items():
+        if group_key not in previous:
+            drop_group(prs, entry, deck_stats)
+
+    os.makedirs(output_folder, exist_ok=True)
+    dimensions = DimensionCache(dimensions_path(output_folder), input_folder, log)
+    workers = embed['workers'] or max(1, os.cpu_count() or 1)
+    max_ahead = workers * 4
+    pending = deque()  # Groups whose pictures are being prepared, in arrival order
+    pending_pictures = 0
+    seen = set()
+    closed = False
+    built = 0
+    deck_started = False
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Take in arrived groups while the pool has room, waiting only
+            # when there is nothing to build
+            while not closed and (not pending or pending_pictures < max_ahead):
+                item = feed.get(block=not pending)
+                if item is None:
+                    break
+                if item is GroupFeed.END:
+                    closed = True
+                    break
+                group_key, photos = item
+                signature = [photo_signature(input_folder, photo) for photo in photos]
+                keep = group_key not in seen and can_keep(prs, previous.get(group_key), signature)
+                seen.add(group_key)
+                slides = []
+                if not keep:
+                    started = time.perf_counter()
+                    sizes = dimensions.lookup(input_folder, photos, embed['workers'])
+                    slides = layout_group(photos, sizes, layout['max_per_slide'])
+                    if timings:
+                        timings.add_stage('layout', time.perf_counter() - started)
+                futures = submit_pictures(executor, input_folder, slides, embed)
+                pending.append((group_key, signature, keep, slides, futures))
+                pending_pictures += len(futures)
+            if not pending:
+                break
+
+            group_key, signature, keep, slides, futures = pending.popleft()
+            pending_pictures -= len(futures)
+            check_cancelled(cancel_event)
+            # A group built again replaces what its earlier slides were counted as
+            for name, value in counted.pop(group_key, {}).items():
+                deck_stats[name] -= value
+            group_stats = new_deck_stats()
+            if keep:
+                slide_ids = previous[group_key]['slide_ids']
+                group_stats['slides_kept'] = len(slide_ids)
+            else:
+                entry = groups_manifest.get(group_key) or previous.get(group_key)
+                slide_ids, _ = render_group(prs, parts, input_folder, slides, entry,
+                                            (future.result() for future in futures),
+                                            group_stats, log, timings)
+                group_stats['slides_rebuilt' if group_key in previous else 'slides_added'] = len(slide_ids)
+            for name, value in group_stats.items():
+                deck_stats[name] += value
+            counted[group_key] = group_stats
+            groups_manifest[group_key] = {'photos': signature, 'slide_ids': slide_ids}
+
+            # Update progress, a group built again doesn't count twice
+            if len(counted) > built:
+                built = len(counted)
+                if timings:
+                    timings.group_done()
+            if timings and feed.total is not None and not deck_started:
+                timings.start_deck(feed.total)
+                deck_started = True
+            if progress_callback and feed.total:
+                progress_callback(50 + (built / feed.total) * 50)
+
+    for group_key, entry in previous.items():
+        if group_key not in groups_manifest:
+            drop_group(prs, entry, deck_stats)
+    if timings and not deck_started:
+        timings.start_deck(len(groups_manifest))
+    try:
+        dimensions.save()
+    except OSError as e:
+        log(f"Could not save dimension cache {dimensions.path}: {str(e)}")
+
+    output_path = finish_deck(prs, input_folder, output_folder, output_name, embed, layout,
+                              groups_manifest, deck_stats, log, timings)
+    return output_path, deck_stats
+
+
+def check_cancelled(cancel_event):
+    """Stop slide building between groups once the run is cancelled"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise RunCancelled("Cancelled while building slides")
+
+
+def shard_name(output_name, number):
+    """File name of a numbered shard, e.g. organized_photos_001.pptx"""
+    stem, ext = os.path.splitext(output_name)
+    return f"{stem}_{number:03d}{ext}"
+
+
+def build_sharded_decks(input_folder, output_folder, output_name, photo_groups,
+                        max_slides=0, max_mb=0, embed=None, layout=None, progress_callback=None,
+                        log=print, timings=None, cancel_event=None):
+    """Split the groups over several presentations and save each one.
+
+    A new deck is started once adding the next group's slides would take
+    the current one past max_slides slides or push its embedded media past
+    max_mb megabytes (0 disables either limit); a group's slides always
+    stay together. Each deck is saved and released
+    before the next is started, so memory stays bounded by one shard. An
+    index file lists which group keys landed in which shard.
+
+    Returns (index_path, output_paths, deck_stats).
+    """
+    embed = dict(DEFAULT_EMBED, **(embed or {}))
+    max_bytes = max_mb * 1024 * 1024
+    deck_stats = dict(new_deck_stats(), total_slides=0)
+    shards = []
+    output_paths = []
+    prs = None
+    shard = None
+
+    def finish_shard():
+        path = save_presentation(prs, output_folder, shard_name(output_name, len(shards) + 1), timings)
+        log(f"Saved shard {path} with {shard['slides']} slides")
+        shard['file'] = os.path.basename(path)
+        shards.append(shard)
+        output_paths.append(path)
+
+    layouts = lay_out(input_folder, output_folder, photo_groups, layout, embed['workers'], timings, log)
+    prepared = prepare_pictures(input_folder,
+                                [placements for slides in layouts.values() for placements in slides],
+                                embed)
+
+    # Process each group
+    total_groups = len(photo_groups)
+    if timings:
+        timings.start_deck(total_groups)
+    for idx, group_key in enumerate(photo_groups, 1):
+        check_cancelled(cancel_event)
+        slides = []
+        media_bytes = 0
+        for placements in layouts[group_key]:
+            pictures, slide_bytes = take_pictures(prepared, input_folder, [photo for photo, _ in placements],
+                                                  deck_stats, log, timings)
+            slides.append((placements, pictures))
+            media_bytes += slide_bytes
+
+        if prs is not None and ((max_slides and shard['slides'] + len(slides) > max_slides) or
+                                (max_bytes and shard['media_bytes'] + media_bytes > max_bytes)):
+            finish_shard()
+            prs = None  # Release the saved deck before starting the next one
+
+        if prs is None:
+            # Create PowerPoint
+            prs = Presentation()
+            parts = PictureParts(prs)
+            shard = {'file': None, 'groups': [], 'slides': 0, 'media_bytes': 0}
+
+        for placements, pictures in slides:
+            add_group_slide(prs, input_folder, placements, pictures, parts, log, timings)
+        shard['groups'].append(group_key)
+        shard['slides'] += len(slides)
+        shard['media_bytes'] += media_bytes
+        deck_stats['slides_added'] += len(slides)
+        deck_stats['total_slides'] += len(slides)
+
+        # Update progress
+        if timings:
+            timings.group_done()
+        if progress_callback:
+            progress_callback(50 + (idx / total_groups) * 50)
+
+    if prs is not None:
+        finish_shard()
+        prs = None
+
+    index_path = os.path.join(output_folder, os.path.splitext(output_name)[0] + ".index.json")
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'input_folder': os.path.abspath(input_folder),
+            'shards': shards,
+        }, f, indent=1, ensure_ascii=False)
+    return index_path, output_paths, deck_stats
@@ -0,0 +1,209 @@
+# Part 15: Duplicate Detection (save as dedup.py)
+#
+# Field uploads often contain the same photo twice or a burst of nearly
+# identical shots. Before OCR each photo is checked against the photos seen
+# so far. Copies with the same content hash are collapsed onto the first one
+# (the representative), reuse its match and are left off the slides. In
+# 'similar' mode photos whose perceptual hash is within a threshold are
+# near-duplicates: a thumbnail hash cannot see the ID label, so they are
+# still matched and only collapsed if they get the same key.
+
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from ocr_cache import file_hash
+from ocr_engine import new_result
+
+# off: every photo is processed, exact: identical files only,
+# similar: identical files and photos with nearly the same perceptual hash
+DEDUP_MODES = ('off', 'exact', 'similar')
+DEFAULT_DEDUP = 'off'
+
+# The perceptual hash keeps the HASH_SIZE x HASH_SIZE lowest frequencies of
+# a THUMB_SIZE thumbnail, giving HASH_BITS bits; photos differing in at most
+# DEFAULT_THRESHOLD of them count as near-duplicates. Re-encoded and resized
+# copies land within a bit or two, but so do some distinct shots of a similar
+# scene, which is why near-duplicates must also match the same key
+THUMB_SIZE = 32
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+DEFAULT_THRESHOLD = 4
+
+# Photos fingerprinted ahead of the one being checked, per thread
+FINGERPRINT_AHEAD = 4
+
+# DCT-II basis rows for the low frequencies, computed once
+DCT_BASIS = [[math.cos(math.pi * (2 * x + 1) * u / (2 * THUMB_SIZE)) for x in range(THUMB_SIZE)]
+             for u in range(HASH_SIZE)]
+
+
+def perceptual_hash(img_path):
+    """DCT hash of an image as an int of HASH_BITS bits.
+
+    Each bit tells whether one of the lowest spatial frequencies of a tiny
+    grayscale thumbnail is above their median, so re-encoding, resizing and
+    sensor noise leave the hash (nearly) unchanged. JPEGs are decoded at
+    reduced scale, so this costs a fraction of a full decode.
+    """
+    with Image.open(img_path) as image:
+        image.draft('L', (THUMB_SIZE * 4, THUMB_SIZE * 4))
+        small = image.convert('L').resize((THUMB_SIZE, THUMB_SIZE), Image.BOX)
+    pixels = small.tobytes()
+
+    # Separable 2D DCT, restricted to the frequencies the hash keeps
+    rows = [[sum(basis[x] * pixels[y * THUMB_SIZE + x] for x in range(THUMB_SIZE))
+             for basis in DCT_BASIS] for y in range(THUMB_SIZE)]
+    coefficients = [sum(DCT_BASIS[v][y] * rows[y][u] for y in range(THUMB_SIZE))
+                    for v in range(HASH_SIZE) for u in range(HASH_SIZE)]
+    median = sorted(coefficients)[len(coefficients) // 2]
+    bits = 0
+    for coefficient in coefficients:
+        bits = (bits << 1) | (coefficient > median)
+    return bits
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class DuplicateFinder:
+    """Collapse each photo onto the first photo seen that it duplicates.
+
+    Representatives are indexed by content hash and, in 'similar' mode, in a
+    BK-tree of perceptual hashes, so a lookup only visits the few entries
+    whose distance could be within the threshold instead of every photo.
+    Near-duplicates are not added themselves, so a burst is matched against
+    its first shot rather than drifting from shot to shot.
+    """
+
+    def __init__(self, mode='exact', threshold=DEFAULT_THRESHOLD, log=print):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown duplicate mode: {mode}")
+        self.similar = mode == 'similar'
+        self.threshold = threshold
+        self.log = log
+        self.exact = {}   # Content hash -> representative
+        self.tree = None  # BK-tree nodes: [hash, representative, {distance: child node}]
+
+    def fingerprint(self, img_path):
+        """(content hash, perceptual hash or None) of a photo, or None if it
+        can't be read. Only reads the photo, so it may run on any thread."""
+        try:
+            digest = file_hash(img_path)
+        except OSError:
+            return None  # Left for the OCR stage to report
+        phash = None
+        if self.similar:
+            try:
+                phash = perceptual_hash(img_path)
+            except Exception as e:
+                self.log(f"Could not hash {img_path} for duplicate detection: {str(e)}")
+        return digest, phash
+
+    def check(self, fingerprint, representative):
+        """Return (representative, distance) of an earlier photo the one
+        with this fingerprint duplicates, or None after recording it as a
+        new representative. Photos must be checked in scan order.
+
+        distance is None for an exact copy and the perceptual hash distance
+        for a near-duplicate, whose match still has to be checked against
+        the representative's. representative is whatever the caller wants
+        back for this photo should a later one duplicate it.
+        """
+        if fingerprint is None:
+            return None
+        digest, phash = fingerprint
+        if digest in self.exact:
+            return self.exact[digest], None
+        if phash is not None:
+            found = self.nearest(phash)
+            if found:
+                return found
+
+        self.exact[digest] = representative
+        if phash is not None:
+            self.add(phash, representative)
+        return None
+
+    def add(self, phash, representative):
+        if self.tree is None:
+            self.tree = [phash, representative, {}]
+            return
+        node = self.tree
+        while True:
+            distance = hamming_distance(phash, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [phash, representative, {}]
+                return
+            node = child
+
+    def nearest(self, phash):
+        """Closest representative within the threshold as (representative, distance), or None"""
+        best = None
+        nodes = [self.tree] if self.tree else []
+        while nodes:
+            node = nodes.pop()
+            distance = hamming_distance(phash, node[0])
+            if distance <= self.threshold and (best is None or distance < best[1]):
+                best = (node[1], distance)
+            # Only subtrees this close to the node can hold a match
+            for child_distance, child in node[2].items():
+                if abs(child_distance - distance) <= self.threshold:
+                    nodes.append(child)
+        return best
+
+
+def fingerprint_ahead(finder, input_folder, image_files, workers):
+    """Yield (index, img_file, fingerprint, seconds taken) for each image
+    in scan order.
+
+    Reading and hashing the photos happens on a pool of workers threads,
+    up to FINGERPRINT_AHEAD images per thread ahead of the caller, so the
+    caller handing the photos to OCR doesn't wait on each file in turn.
+    """
+    def timed(img_file):
+        started = time.perf_counter()
+        return finder.fingerprint(os.path.join(input_folder, img_file)), time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for index, img_file in enumerate(image_files):
+            pending.append((index, img_file, executor.submit(timed, img_file)))
+            if len(pending) >= workers * FINGERPRINT_AHEAD:
+                index, img_file, future = pending.popleft()
+                yield (index, img_file) + future.result()
+        while pending:
+            index, img_file, future = pending.popleft()
+            yield (index, img_file) + future.result()
+
+
+def duplicate_result(index, img_file, original):
+    """Match result for an exact copy, copied from its representative's"""
+    result = new_result(index, img_file)
+    result.update(text=original['text'],
+                  key=original['key'],
+                  keys=list(original['keys']),
+                  source=original['source'],
+                  error=original['error'],
+                  duplicate_of=original['file'])
+    return result
+
+
+def same_match(result, original):
+    """Whether a near-duplicate was matched to the same keys as its
+    representative, so it can be collapsed onto it"""
+    return bool(result['keys']) and not result['error'] and set(result['keys']) == set(original['keys'])
+
+
+def collect_duplicates(results):
+    """Duplicates by representative file, in scan order"""
+    duplicates = {}
+    for result in results:
+        if result['duplicate_of']:
+            duplicates.setdefault(result['duplicate_of'], []).append(
+                {'file': result['file'], 'distance': result['duplicate_distance']})
+    return duplicates
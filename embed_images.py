@@ -0,0 +1,122 @@
+# Part 9: Slide Image Preparation (save as embed_images.py)
+
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from pptx.parts.image import Image as PictureImage
+
+EMU_PER_INCH = 914400
+
+# Formats PowerPoint can take as-is when no downscaling is needed
+PASSTHROUGH_FORMATS = ('JPEG', 'PNG', 'GIF')
+
+DEFAULT_EMBED = {
+    'dpi': 150,        # Pixels per inch of slot size; 0 or None embeds originals
+    'quality': 85,     # JPEG quality for re-encoded photos
+    'workers': None,   # Threads preparing images, None uses one per CPU
+}
+
+
+def slot_pixels(width_emu, height_emu, dpi):
+    """Pixel size needed to fill a slide slot at the given DPI"""
+    return (max(1, int(round(width_emu / EMU_PER_INCH * dpi))),
+            max(1, int(round(height_emu / EMU_PER_INCH * dpi))))
+
+
+def load_picture(source):
+    """Read a picture the way add_picture does (a path or a buffer) and work
+    out its SHA1 and format, so none of that is left for the slide loop"""
+    image = PictureImage.from_file(source)
+    image.sha1
+    image.content_type
+    return image
+
+
+def shrink_for_slot(img_path, slot_size, quality):
+    """JPEG buffer of an image shrunk to its slot, or None if it already fits"""
+    with Image.open(img_path) as image:
+        target = (min(image.width, slot_size[0]), min(image.height, slot_size[1]))
+        if target == image.size and image.format in PASSTHROUGH_FORMATS:
+            return None
+
+        # Let the JPEG decoder skip straight to a reduced scale
+        image.draft('RGB', target)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Flatten transparency onto white before dropping alpha
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        if image.size != target:
+            image = image.resize(target, Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer
+
+
+def prepare_embed(img_path, slot_size, quality):
+    """Get an image ready to be placed on a slide.
+
+    With a slot_size the image is shrunk to the pixels its slot needs and
+    re-encoded as JPEG; the slot stretches the picture to its box anyway,
+    so each dimension is capped independently and never upscaled. Without
+    one the original file is embedded. Returns a dict with the 'source'
+    embedded (an in-memory buffer, or the original path when it is already
+    small enough), its loaded 'image' (see load_picture, None if it can't
+    be embedded) and the byte sizes before/after.
+    """
+    prepared = {
+        'source': img_path,
+        'image': None,
+        'original_bytes': 0,
+        'embedded_bytes': 0,
+        'seconds': 0.0,
+        'error': None,
+        'image_error': None,
+    }
+    started = time.perf_counter()
+    try:
+        prepared['original_bytes'] = os.path.getsize(img_path)
+        prepared['embedded_bytes'] = prepared['original_bytes']
+        buffer = shrink_for_slot(img_path, slot_size, quality) if slot_size else None
+
+        # Keep the original if re-encoding did not make it smaller
+        if buffer is not None and buffer.tell() < prepared['original_bytes']:
+            buffer.seek(0)
+            prepared['source'] = buffer
+            prepared['embedded_bytes'] = buffer.getbuffer().nbytes
+    except Exception as e:
+        prepared['error'] = str(e)
+    try:
+        prepared['image'] = load_picture(prepared['source'])
+    except Exception as e:
+        prepared['image_error'] = str(e)
+    prepared['seconds'] = time.perf_counter() - started
+    return prepared
+
+
+def iter_prepared(tasks, quality, workers=None, max_ahead=None):
+    """Prepare (img_path, slot_size) tasks on a thread pool, in task order.
+
+    Images are read, hashed, decoded and resized by worker threads (file
+    reads, hashlib and Pillow release the GIL for this) while the caller
+    builds slides from earlier results; at most max_ahead prepared images
+    are held in memory at once. slot_size None embeds the original file.
+    """
+    workers = workers or max(1, os.cpu_count() or 1)
+    max_ahead = max_ahead or workers * 4
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for img_path, slot_size in tasks:
+            pending.append(executor.submit(prepare_embed, img_path, slot_size, quality))
+            if len(pending) >= max_ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,151 @@
+# Part 10: Run Instrumentation (save as instrumentation.py)
+
+import csv
+import json
+import os
+import threading
+import time
+
+# Per-image stages in pipeline order; dedup runs in the main process, the
+# rest inside the OCR workers
+IMAGE_STAGES = ('dedup', 'hash', 'decode', 'prefilter', 'enhance', 'ocr', 'regex')
+
+# Stages timed while building the presentation
+DECK_STAGES = ('layout', 'prepare', 'add_picture', 'save')
+
+
+class RunTimings:
+    """Thread-safe collector of per-stage durations for one processing run.
+
+    The pipeline records into it from its worker thread while the UI reads
+    snapshot() on a timer to show throughput and ETA.
+    """
+
+    def __init__(self, slowest_count=10):
+        self.lock = threading.Lock()
+        self.slowest_count = slowest_count
+        self.started = time.perf_counter()
+        self.finished = None
+        self.phase = 'ocr'
+        self.discovered = 0
+        self.images_done = 0
+        self.groups_total = 0
+        self.groups_done = 0
+        self.deck_started = None
+        self.deck_groups_base = 0  # Groups already built when the slide phase started
+        self.stage_seconds = {stage: 0.0 for stage in IMAGE_STAGES + DECK_STAGES}
+        self.stage_counts = {stage: 0 for stage in IMAGE_STAGES + DECK_STAGES}
+        self.images = []  # (file, {stage: seconds}) in completion order
+
+    def set_discovered(self, count):
+        with self.lock:
+            self.discovered = count
+
+    def add_image(self, img_file, stages):
+        """Record the stage durations of one OCR'd (or matched) image"""
+        with self.lock:
+            self.images_done += 1
+            self.images.append((img_file, dict(stages)))
+            for stage, seconds in stages.items():
+                self.stage_seconds[stage] += seconds
+                self.stage_counts[stage] += 1
+
+    def add_stage(self, stage, seconds):
+        """Record a stage run outside the OCR workers (slide building, save)"""
+        with self.lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_counts[stage] += 1
+
+    def start_deck(self, groups_total):
+        """Enter the slide phase; groups built while OCR was still running
+        (see deck_builder.build_streamed_deck) stay counted"""
+        with self.lock:
+            self.phase = 'slides'
+            self.groups_total = groups_total
+            self.deck_groups_base = self.groups_done
+            self.deck_started = time.perf_counter()
+
+    def group_done(self):
+        with self.lock:
+            self.groups_done += 1
+
+    def finish(self):
+        with self.lock:
+            self.phase = 'done'
+            self.finished = time.perf_counter()
+
+    def slowest(self, count=None):
+        """Images with the longest total stage time, slowest first"""
+        with self.lock:
+            images = list(self.images)
+        ranked = sorted(images, key=lambda item: sum(item[1].values()), reverse=True)
+        return [{'file': img_file, 'seconds': round(sum(stages.values()), 4)}
+                for img_file, stages in ranked[:count or self.slowest_count]]
+
+    def snapshot(self):
+        """Current throughput, ETA and stage totals as a plain dictionary"""
+        with self.lock:
+            now = self.finished or time.perf_counter()
+            elapsed = now - self.started
+            rate = self.images_done / elapsed if elapsed > 0 else 0.0
+            if self.phase == 'ocr':
+                remaining = max(self.discovered - self.images_done, 0)
+                eta = remaining / rate if rate else None
+            elif self.phase == 'slides':
+                deck_elapsed = now - self.deck_started
+                remaining = max(self.groups_total - self.groups_done, 0)
+                deck_groups = self.groups_done - self.deck_groups_base
+                eta = (remaining * deck_elapsed / deck_groups) if deck_groups else None
+            else:
+                eta = 0.0
+            stage_seconds = dict(self.stage_seconds)
+            stage_counts = dict(self.stage_counts)
+            snapshot = {
+                'phase': self.phase,
+                'elapsed_seconds': round(elapsed, 3),
+                'images_done': self.images_done,
+                'images_discovered': self.discovered,
+                'groups_done': self.groups_done,
+                'groups_total': self.groups_total,
+                'images_per_second': round(rate, 3),
+                'eta_seconds': round(eta, 1) if eta is not None else None,
+            }
+        snapshot['stages'] = {
+            stage: {
+                'seconds': round(stage_seconds[stage], 4),
+                'count': stage_counts[stage],
+                'mean_ms': (round(stage_seconds[stage] * 1000 / stage_counts[stage], 3)
+                            if stage_counts[stage] else None),
+            }
+            for stage in stage_seconds
+        }
+        snapshot['slowest'] = self.slowest()
+        return snapshot
+
+    def export(self, path):
+        """Write the run summary (.json) or per-image durations (.csv)"""
+        if os.path.splitext(path)[1].lower() == '.csv':
+            with self.lock:
+                images = list(self.images)
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(('file',) + IMAGE_STAGES + ('total',))
+                for img_file, stages in images:
+                    writer.writerow([img_file] +
+                                    [round(stages.get(stage, 0.0), 6) for stage in IMAGE_STAGES] +
+                                    [round(sum(stages.values()), 6)])
+        else:
+            report = self.snapshot()
+            with self.lock:
+                report['images'] = [{'file': img_file, 'stages': stages}
+                                    for img_file, stages in self.images]
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=1, ensure_ascii=False)
+
+
+def format_eta(seconds):
+    """Format an ETA in seconds as h:mm:ss (or -- when unknown)"""
+    if seconds is None:
+        return "--"
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
@@ -0,0 +1,494 @@
+# Part 20: Job Queue (save as job_queue.py)
+#
+# Queue up any number of (input folder, output folder) jobs and work
+# through them on one shared OCR worker pool:
+#
+#     python job_queue.py add /data/shoot_0412 /data/decks --output-name "{folder}.pptx"
+#     python job_queue.py add /data/shoot_0413 /data/decks --recursive --pipeline
+#     python job_queue.py run --workers 16 --max-jobs 4
+#     python job_queue.py list
+#
+# `add` takes the same options as cli.py. The queue is kept in a JSON file
+# (--queue, default ~/.photo_organizer/job_queue.json), so it survives
+# restarts; jobs added while `run` is going are picked up too. Ctrl+C stops
+# the jobs in progress after their images in flight and puts them back in
+# the queue, to resume from their checkpoints on the next `run`.
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import pytesseract
+from checkpoint import RunCancelled
+from instrumentation import RunTimings
+from memory_budget import MemoryBudget
+from ocr_engine import SharedOCRPool, default_worker_count, shared_pool_context
+from photo_pipeline import DEFAULT_SETTINGS, make_settings, organize_photos
+
+try:
+    import fcntl
+except ImportError:  # Windows, which locks with msvcrt instead
+    fcntl = None
+    import msvcrt
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.expanduser("~"), ".photo_organizer", "job_queue.json")
+DEFAULT_MAX_JOBS = 4  # Jobs in progress at once, sharing the OCR workers
+
+# Settings naming files, stored as absolute paths since the queue may be run
+# from another directory
+PATH_SETTINGS = ('patterns_file', 'timings_log', 'export_results')
+
+# Seconds between live status lines while the queue runs
+STATUS_SECONDS = 30.0
+# Seconds between on_update calls while jobs run
+UPDATE_SECONDS = 1.0
+
+
+def now_text():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold an exclusive lock on the file at path (created if missing) for
+    the block; other processes taking it wait until it is released"""
+    with open(path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # Gave up after 10 seconds, keep waiting
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def this_runner():
+    """Identifies the process running jobs, recorded with each job it claims"""
+    return {'host': socket.gethostname(), 'pid': os.getpid()}
+
+
+def process_alive(pid):
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+    return True
+
+
+def runner_alive(runner):
+    """Whether a job's runner is known to be still running: only a process
+    on this host can be checked"""
+    return bool(runner) and runner['host'] == socket.gethostname() and process_alive(runner['pid'])
+
+
+def runner_gone(runner):
+    """Whether a job's runner is known to have ended without finishing it"""
+    return not runner or (runner['host'] == socket.gethostname() and not process_alive(runner['pid']))
+
+
+class JobQueue:
+    """Jobs in a JSON file, in the order they were added. A job is queued,
+    running, done, failed or no_images.
+
+    Every change reads the file again, applies the change and writes it
+    back while holding a lock file next to it, so a queue being run also
+    sees jobs added from the app or another command meanwhile, and no
+    change is lost to one made at the same time. A job's settings are
+    stored as the ones that differ from DEFAULT_SETTINGS.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)['jobs']
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, KeyError) as e:
+            raise ValueError(f"Unreadable job queue {self.path}: {str(e)}")
+
+    @contextlib.contextmanager
+    def edit(self):
+        """The job list, written back when the block ends"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.lock, locked(self.path + ".lock"):
+            jobs = self.load()
+            yield jobs
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'jobs': jobs}, f, indent=1, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+
+    def jobs(self):
+        with self.lock:
+            return self.load()
+
+    def add(self, input_folder, output_folder, settings):
+        """Queue a job, returns it"""
+        overrides = {name: value for name, value in settings.items()
+                     if value != DEFAULT_SETTINGS[name]}
+        for name in PATH_SETTINGS:
+            if overrides.get(name):
+                overrides[name] = os.path.abspath(overrides[name])
+        with self.edit() as jobs:
+            job = {
+                'id': max((job['id'] for job in jobs), default=0) + 1,
+                'input_folder': os.path.abspath(input_folder),
+                'output_folder': os.path.abspath(output_folder),
+                'settings': overrides,
+                'status': 'queued',
+                'added': now_text(),
+                'started': None,
+                'finished': None,
+                'error': None,
+                'output_path': None,
+                'stats': {},
+                'runner': None,
+            }
+            jobs.append(job)
+        return job
+
+    def update(self, job_id, **fields):
+        with self.edit() as jobs:
+            for job in jobs:
+                if job['id'] == job_id:
+                    job.update(fields)
+
+    def claim(self):
+        """Mark the first queued job as running by this process and return
+        it, or None"""
+        with self.edit() as jobs:
+            for job in jobs:
+                if job['status'] == 'queued':
+                    job.update(status='running', started=now_text(), finished=None, error=None,
+                               runner=this_runner())
+                    return dict(job)
+        return None
+
+    def requeue(self, job_ids=None, statuses=('failed',)):
+        """Queue jobs again (by default every failed one), returns how many.
+        Running jobs whose runner is still alive are left alone."""
+        requeued = 0
+        with self.edit() as jobs:
+            for job in jobs:
+                if (job['id'] in job_ids if job_ids else job['status'] in statuses):
+                    if job['status'] == 'running' and runner_alive(job.get('runner')):
+                        continue
+                    if job['status'] != 'queued':
+                        job.update(status='queued', error=None, runner=None)
+                        requeued += 1
+        return requeued
+
+    def requeue_abandoned(self):
+        """Queue running jobs again whose runner has ended, returns how many.
+
+        Those were left behind by a run that was killed. Jobs claimed on
+        another host can't be checked; 'retry' queues them by hand.
+        """
+        requeued = 0
+        with self.edit() as jobs:
+            for job in jobs:
+                if job['status'] == 'running' and runner_gone(job.get('runner')):
+                    job.update(status='queued', error=None, runner=None)
+                    requeued += 1
+        return requeued
+
+    def remove(self, job_ids):
+        """Drop jobs that aren't running, returns how many"""
+        with self.edit() as jobs:
+            keep = [job for job in jobs if job['id'] not in job_ids or job['status'] == 'running']
+            removed = len(jobs) - len(keep)
+            jobs[:] = keep
+        return removed
+
+    def clear_finished(self):
+        """Drop every done job, returns how many"""
+        with self.edit() as jobs:
+            keep = [job for job in jobs if job['status'] != 'done']
+            removed = len(jobs) - len(keep)
+            jobs[:] = keep
+        return removed
+
+
+def job_settings(job):
+    return make_settings(**job['settings'])
+
+
+def job_stats(details):
+    """The figures kept in the queue for a finished job"""
+    stats = details['stats']
+    return {
+        'total_photos': stats['total_photos'],
+        'total_groups': stats['total_groups'],
+        'unmatched_count': stats['unmatched_count'],
+        'total_slides': stats['total_slides'],
+        'ocr_runs': stats['ocr_runs'],
+        'elapsed_seconds': stats['elapsed_seconds'],
+        'images_per_second': details['timings']['images_per_second'],
+    }
+
+
+def run_queue(queue, workers=None, max_jobs=DEFAULT_MAX_JOBS, memory_budget_mb=0, log=print,
+              cancel_event=None, on_update=None, verbose=True):
+    """Work through the queued jobs until none are left or cancel_event is set.
+
+    Up to max_jobs jobs run at once, started in queue order, and their OCR
+    goes to one pool of workers processes, shared evenly between the jobs
+    with images waiting (see ocr_engine.SharedOCRPool). A job's scanning,
+    filename matching and slide building happen on its own thread, so the
+    pool keeps busy with the other jobs meanwhile. Jobs left running by an
+    earlier run that was killed are queued again first (not those of runs
+    still going); they resume from their checkpoints. on_update, if given, is called with the live status
+    of every running job (see running_status) whenever a job starts or
+    ends, and every UPDATE_SECONDS in between. Without verbose the jobs'
+    per-image output is left out of log. Returns {status: job count} of
+    the jobs this call finished.
+    """
+    cancel_event = cancel_event or threading.Event()
+    requeued = queue.requeue_abandoned()
+    if requeued:
+        log(f"Queued {requeued} interrupted jobs again")
+    context = shared_pool_context()
+    memory_budget = MemoryBudget(memory_budget_mb * 1024 * 1024, context) if memory_budget_mb else None
+    pool = SharedOCRPool(workers or default_worker_count(), memory_budget=memory_budget, context=context)
+    running = {}  # Job id -> (job, RunTimings)
+    changed = threading.Condition()
+    outcome = {}
+
+    def live_status():
+        with changed:
+            current = dict(running)
+        return running_status(current)
+
+    def notify():
+        if on_update:
+            on_update(live_status())
+
+    def run_job(job):
+        job_id = job['id']
+        job_log = lambda message: log(f"[job {job_id}] {message}")
+        status, fields = 'failed', {}
+        try:
+            details = organize_photos(job['input_folder'], job['output_folder'],
+                                      settings=job_settings(job),
+                                      log=job_log if verbose else lambda message: None,
+                                      timings=running[job_id][1], cancel_event=cancel_event,
+                                      ocr_pool=pool)
+            if details is None:
+                status, fields = 'no_images', {'error': "No image files found"}
+            else:
+                status, fields = 'done', {'output_path': details['output_path'],
+                                          'stats': job_stats(details)}
+                job_log(f"Done: {fields['stats']['total_photos']} photos in "
+                        f"{fields['stats']['total_groups']} groups, "
+                        f"{fields['stats']['images_per_second']:.1f} images/s")
+        except RunCancelled:
+            # Back in the queue, its checkpoint picks up where it stopped
+            status, fields = 'queued', {'error': "Stopped, resumes on the next run"}
+        except Exception as e:
+            fields = {'error': str(e)}
+            job_log(f"Failed: {str(e)}")
+        queue.update(job_id, status=status, finished=now_text(), runner=None, **fields)
+        with changed:
+            del running[job_id]
+            outcome[status] = outcome.get(status, 0) + 1
+            changed.notify_all()
+        notify()
+
+    threads = []
+    last_status = last_update = time.monotonic()
+    try:
+        while not cancel_event.is_set():
+            if running and time.monotonic() - last_update >= UPDATE_SECONDS:
+                notify()
+                last_update = time.monotonic()
+            if running and time.monotonic() - last_status >= STATUS_SECONDS:
+                for row in live_status():
+                    log(f"[job {row['id']}] {row['phase']}: {row['images_done']}/"
+                        f"{row['images_discovered']} images, {row['images_per_second']:.1f} images/s")
+                last_status = time.monotonic()
+            with changed:
+                if len(running) >= max_jobs:
+                    changed.wait(1.0)
+                    continue
+            job = queue.claim()
+            if job is None:
+                with changed:
+                    if not running:
+                        break
+                    # Wait for a job to end, or for new ones to be added
+                    changed.wait(1.0)
+                continue
+            log(f"[job {job['id']}] Started {job['input_folder']} -> {job['output_folder']}")
+            with changed:
+                running[job['id']] = (job, RunTimings())
+            thread = threading.Thread(target=run_job, args=(job,), name=f"job-{job['id']}", daemon=True)
+            thread.start()
+            threads.append(thread)
+            notify()
+    finally:
+        for thread in threads:
+            thread.join()
+        pool.close()
+    return outcome
+
+
+def running_status(running):
+    """Live progress of running jobs ({job id: (job, RunTimings)}), one
+    dictionary each"""
+    rows = []
+    for job_id, (job, timings) in sorted(running.items()):
+        snapshot = timings.snapshot()
+        rows.append({
+            'id': job_id,
+            'input_folder': job['input_folder'],
+            'phase': snapshot['phase'],
+            'images_done': snapshot['images_done'],
+            'images_discovered': snapshot['images_discovered'],
+            'images_per_second': snapshot['images_per_second'],
+            'eta_seconds': snapshot['eta_seconds'],
+        })
+    return rows
+
+
+def format_job(job):
+    """One line of the job list"""
+    stats = job['stats']
+    line = f"{job['id']:>4}  {job['status']:<9}  {job['input_folder']} -> {job['output_folder']}"
+    if stats:
+        line += (f"  ({stats['total_photos']} photos, {stats['total_groups']} groups, "
+                 f"{stats['images_per_second']:.1f} images/s)")
+    if job['error']:
+        line += f"  [{job['error']}]"
+    return line
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Queue photo folders and organize them on one shared pool of OCR workers.")
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_PATH,
+                        help="Job queue file (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="Queue a job; takes the arguments and options of cli.py",
+                              add_help=False)
+    add.add_argument('job_args', nargs=argparse.REMAINDER,
+                     help="INPUT_FOLDER OUTPUT_FOLDER [cli.py options]")
+
+    listing = commands.add_parser('list', help="Show the jobs and their status")
+    listing.add_argument('--json', action='store_true', help="Print the queue as JSON")
+
+    run = commands.add_parser('run', help="Work through the queued jobs")
+    run.add_argument('--workers', type=int, default=None,
+                     help="OCR worker processes shared by all jobs (default: one per CPU)")
+    run.add_argument('--max-jobs', type=int, default=DEFAULT_MAX_JOBS,
+                     help="Jobs in progress at once (default: %(default)s)")
+    run.add_argument('--memory-budget-mb', type=float, default=0, metavar='MB',
+                     help="Limit decoded image data held by all OCR workers together")
+    run.add_argument('--tesseract-cmd', default=None,
+                     help="Path to the tesseract executable if it is not on PATH")
+    run.add_argument('--quiet', action='store_true', help="Only report jobs starting and ending")
+
+    retry = commands.add_parser('retry', help="Queue failed jobs again")
+    retry.add_argument('ids', type=int, nargs='*', help="Job ids (default: every failed job)")
+
+    remove = commands.add_parser('remove', help="Drop jobs from the queue")
+    remove.add_argument('ids', type=int, nargs='+', help="Job ids")
+
+    commands.add_parser('clear', help="Drop every finished job")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    queue = JobQueue(args.queue)
+
+    if args.command == 'add':
+        import cli  # Its parser describes a job's options
+        job_parser = cli.build_parser()
+        job_parser.prog = f"{os.path.basename(sys.argv[0])} add"
+        job_args = job_parser.parse_args(args.job_args)
+        if job_args.watch or job_args.from_results:
+            job_parser.error("--watch and --from-results cannot be queued")
+        if job_args.workers or job_args.memory_budget_mb:
+            job_parser.error("--workers and --memory-budget-mb apply to the shared pool; "
+                             "pass them to 'run' instead")
+        if job_args.tesseract_cmd or job_args.summary_file or job_args.quiet:
+            job_parser.error("--tesseract-cmd, --summary-file and --quiet cannot be queued")
+        if not os.path.isdir(job_args.input_folder):
+            job_parser.error(f"Input folder does not exist: {job_args.input_folder}")
+        job = queue.add(job_args.input_folder, job_args.output_folder, cli.settings_from_args(job_args))
+        print(f"Queued job {job['id']}")
+
+    elif args.command == 'list':
+        jobs = queue.jobs()
+        if args.json:
+            print(json.dumps(jobs, indent=2, ensure_ascii=False))
+        else:
+            for job in jobs:
+                print(format_job(job))
+
+    elif args.command == 'run':
+        if args.tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = args.tesseract_cmd
+        cancel_event = threading.Event()
+
+        def request_cancel(signum, frame):
+            print("Stopping the jobs in progress after their images in flight (Ctrl+C again to abort)",
+                  file=sys.stderr)
+            cancel_event.set()
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        signal.signal(signal.SIGINT, request_cancel)
+        signal.signal(signal.SIGTERM, request_cancel)
+        outcome = run_queue(queue, args.workers, args.max_jobs, args.memory_budget_mb,
+                            log=lambda message: sys.stderr.write(message + "\n"),  # Whole lines across threads
+                            cancel_event=cancel_event, verbose=not args.quiet)
+        print(json.dumps(outcome))
+        return 1 if outcome.get('failed') else 0
+
+    elif args.command == 'retry':
+        print(f"Queued {queue.requeue(args.ids)} jobs again")
+
+    elif args.command == 'remove':
+        print(f"Removed {queue.remove(args.ids)} jobs")
+
+    elif args.command == 'clear':
+        print(f"Removed {queue.clear_finished()} finished jobs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,38 @@
 # Part 1: UI and Setup (save as photo_organizer_ui.py)
 
+import io
 import os
-import re
+import queue
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image
-import pytesseract
-from pptx import Presentation
-from pptx.util import Inches
 import threading
-from collections import defaultdict
-import datetime
+from PIL import Image, ImageTk
+from ocr_engine import (DEFAULT_BATCH_SIZE, DEFAULT_MATCH_STRATEGY, DEFAULT_PREPROCESS,
+                        MATCH_STRATEGIES, default_worker_count, split_regions)
+from embed_images import DEFAULT_EMBED
+from slide_layout import DEFAULT_LAYOUT
+from ocr_backends import available_backends
+from instrumentation import IMAGE_STAGES, RunTimings, format_eta
+from photo_pipeline import (DEFAULT_SETTINGS, load_manual_keys, make_settings, organize_photos,
+                            rebuild_from_results, save_manual_keys)
+from result_export import RESULTS_FILENAME, results_path
+from job_queue import JobQueue, run_queue
+from thumbnails import THUMBNAIL_SIZE, ThumbnailCache, ThumbnailLoader, thumbnails_path
+from checkpoint import RunCancelled
+from dedup import DEDUP_MODES, DEFAULT_DEDUP, DEFAULT_THRESHOLD, HASH_BITS
+
+# Worker thread updates are applied to the window at this interval (ms)
+UI_POLL_MS = 100
+
+# Rows inserted at a time into the group details tree
+TREE_PAGE_SIZE = 500
+
+# Job queue window refresh interval (ms)
+QUEUE_REFRESH_MS = 1000
+
+# Thumbnail cells of the preview grid (pixels)
+PREVIEW_CELL_WIDTH = THUMBNAIL_SIZE + 20
+PREVIEW_CELL_HEIGHT = THUMBNAIL_SIZE + 40
 
 class PhotoOrganizerApp:
     def __init__(self, root):
@@ -102,6 +124,21 @@ class PhotoOrganizerApp:
                            foreground=self.colors['text_secondary'],
                            font=('Helvetica', 12))
         
+        # Details tree style
+        self.style.configure('Details.Treeview',
+                           background=self.colors['surface'],
+                           fieldbackground=self.colors['surface'],
+                           foreground=self.colors['text'],
+                           font=('Consolas', 11),
+                           rowheight=24)
+        
+        self.style.configure('Details.Treeview.Heading',
+                           font=('Helvetica', 10, 'bold'))
+        
+        # Updates posted by the worker thread, applied by poll_updates
+        self.updates = queue.Queue()
+        self.last_progress = None
+        
         # Main container
         self.main_frame = ttk.Frame(root, style='Main.TFrame')
         self.main_frame.pack(fill=tk.BOTH, expand=True)
@@ -132,6 +169,11 @@ class PhotoOrganizerApp:
         input_browse_frame = ttk.Frame(input_frame)
         input_browse_frame.pack(fill=tk.X, pady=(5, 10))
         
+        self.recursive = tk.BooleanVar(value=False)
+        ttk.Checkbutton(input_frame,
+                       text="Include subfolders",
+                       variable=self.recursive).pack(anchor='w')
+        
         self.input_path = tk.StringVar()
         self.input_entry = tk.Entry(input_browse_frame, 
                                    textvariable=self.input_path,
@@ -175,6 +217,287 @@ class PhotoOrganizerApp:
                   style='Custom.TButton',
                   command=self.browse_output).pack(side=tk.LEFT)
         
+        self.incremental = tk.BooleanVar(value=False)
+        ttk.Checkbutton(output_frame,
+                       text="Update existing presentation (only rebuild changed groups)",
+                       variable=self.incremental).pack(anchor='w')
+        
+        self.export_results = tk.BooleanVar(value=False)
+        ttk.Checkbutton(output_frame,
+                       text=f"Save results for rebuilding without OCR ({RESULTS_FILENAME})",
+                       variable=self.export_results).pack(anchor='w')
+        
+        pipeline_frame = ttk.Frame(output_frame)
+        pipeline_frame.pack(fill=tk.X)
+        
+        self.pipeline = tk.BooleanVar(value=False)
+        ttk.Checkbutton(pipeline_frame,
+                       text="Build slides while OCR runs, group gap:",
+                       variable=self.pipeline).pack(side=tk.LEFT)
+        
+        self.group_gap = tk.IntVar(value=DEFAULT_SETTINGS['group_gap'])
+        tk.Spinbox(pipeline_frame,
+                  from_=0,
+                  to=1000,
+                  increment=10,
+                  width=5,
+                  textvariable=self.group_gap,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 0))
+        
+        embed_frame = ttk.Frame(output_frame)
+        embed_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(embed_frame,
+                 text="Image DPI (0 = original):",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.embed_dpi = tk.IntVar(value=DEFAULT_EMBED['dpi'])
+        tk.Spinbox(embed_frame,
+                  from_=0,
+                  to=600,
+                  increment=50,
+                  width=5,
+                  textvariable=self.embed_dpi,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 15))
+        
+        ttk.Label(embed_frame,
+                 text="JPEG Quality:",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.embed_quality = tk.IntVar(value=DEFAULT_EMBED['quality'])
+        tk.Spinbox(embed_frame,
+                  from_=10,
+                  to=100,
+                  increment=5,
+                  width=5,
+                  textvariable=self.embed_quality,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 0))
+        
+        shard_frame = ttk.Frame(output_frame)
+        shard_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(shard_frame,
+                 text="Slides per File (0 = single file):",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.shard_slides = tk.IntVar(value=0)
+        tk.Spinbox(shard_frame,
+                  from_=0,
+                  to=10000,
+                  increment=50,
+                  width=6,
+                  textvariable=self.shard_slides,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 15))
+        
+        ttk.Label(shard_frame,
+                 text="Photos per Slide (0 = all):",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.max_photos_per_slide = tk.IntVar(value=DEFAULT_LAYOUT['max_per_slide'])
+        tk.Spinbox(shard_frame,
+                  from_=0,
+                  to=100,
+                  width=5,
+                  textvariable=self.max_photos_per_slide,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Processing Options
+        options_frame = ttk.LabelFrame(left_panel,
+                                     text="Processing Options",
+                                     padding="15")
+        options_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        workers_frame = ttk.Frame(options_frame)
+        workers_frame.pack(fill=tk.X)
+        
+        ttk.Label(workers_frame,
+                 text="OCR Workers:",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.worker_count = tk.IntVar(value=default_worker_count())
+        tk.Spinbox(workers_frame,
+                  from_=1,
+                  to=64,
+                  width=5,
+                  textvariable=self.worker_count,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 15))
+        
+        ttk.Label(workers_frame,
+                 text="Images per Tesseract Run:",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.ocr_batch_size = tk.IntVar(value=DEFAULT_BATCH_SIZE)
+        tk.Spinbox(workers_frame,
+                  from_=1,
+                  to=256,
+                  width=5,
+                  textvariable=self.ocr_batch_size,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 0))
+        
+        self.use_cache = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame,
+                       text="Reuse cached OCR results for unchanged photos",
+                       variable=self.use_cache).pack(anchor='w', pady=(10, 0))
+        
+        self.resume = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame,
+                       text="Resume interrupted runs from their checkpoint",
+                       variable=self.resume).pack(anchor='w', pady=(5, 0))
+        
+        strategy_frame = ttk.Frame(options_frame)
+        strategy_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(strategy_frame,
+                 text="Match Strategy:",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.match_strategy = tk.StringVar(value=DEFAULT_MATCH_STRATEGY)
+        ttk.Combobox(strategy_frame,
+                    textvariable=self.match_strategy,
+                    values=MATCH_STRATEGIES,
+                    state='readonly',
+                    width=15).pack(side=tk.LEFT, padx=(10, 15))
+        
+        ttk.Label(strategy_frame,
+                 text="OCR Engine:",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.ocr_backend = tk.StringVar(value=DEFAULT_PREPROCESS['backend'])
+        ttk.Combobox(strategy_frame,
+                    textvariable=self.ocr_backend,
+                    values=available_backends(),
+                    state='readonly',
+                    width=16).pack(side=tk.LEFT, padx=(10, 0))
+        
+        self.ocr_prefilter = tk.BooleanVar(value=DEFAULT_PREPROCESS['prefilter'])
+        ttk.Checkbutton(options_frame,
+                       text="Skip OCR for photos without a visible label (quick pre-filter)",
+                       variable=self.ocr_prefilter).pack(anchor='w', pady=(10, 0))
+        
+        patterns_frame = ttk.Frame(options_frame)
+        patterns_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(patterns_frame,
+                 text="Patterns File:",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.patterns_file = tk.StringVar()
+        tk.Entry(patterns_frame,
+                textvariable=self.patterns_file,
+                width=30,
+                font=('Helvetica', 11, 'bold'),
+                bg=self.colors['surface'],
+                fg=self.colors['entry_text'],
+                insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 10))
+        
+        ttk.Button(patterns_frame,
+                  text="Browse",
+                  style='Custom.TButton',
+                  command=self.browse_patterns).pack(side=tk.LEFT)
+        
+        self.multi_group = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame,
+                       text="Add photos showing several IDs to each of their groups",
+                       variable=self.multi_group).pack(anchor='w', pady=(5, 0))
+        
+        dedup_frame = ttk.Frame(options_frame)
+        dedup_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(dedup_frame,
+                 text="Duplicates:",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.dedup = tk.StringVar(value=DEFAULT_DEDUP)
+        ttk.Combobox(dedup_frame,
+                    textvariable=self.dedup,
+                    values=DEDUP_MODES,
+                    state='readonly',
+                    width=10).pack(side=tk.LEFT, padx=(10, 15))
+        
+        ttk.Label(dedup_frame,
+                 text="Similarity Threshold (bits):",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.dedup_threshold = tk.IntVar(value=DEFAULT_THRESHOLD)
+        tk.Spinbox(dedup_frame,
+                  from_=0,
+                  to=HASH_BITS,
+                  width=5,
+                  textvariable=self.dedup_threshold,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 0))
+        
+        preprocess_frame = ttk.Frame(options_frame)
+        preprocess_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(preprocess_frame,
+                 text="OCR Regions:",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.ocr_regions = tk.StringVar(value=" ".join(DEFAULT_PREPROCESS['regions']))
+        tk.Entry(preprocess_frame,
+                textvariable=self.ocr_regions,
+                width=20,
+                font=('Helvetica', 11, 'bold'),
+                bg=self.colors['surface'],
+                fg=self.colors['entry_text'],
+                insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 15))
+        
+        ttk.Label(preprocess_frame,
+                 text="Max OCR Size (px, 0 = full):",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.ocr_max_size = tk.IntVar(value=DEFAULT_PREPROCESS['max_size'] or 0)
+        tk.Spinbox(preprocess_frame,
+                  from_=0,
+                  to=10000,
+                  increment=100,
+                  width=6,
+                  textvariable=self.ocr_max_size,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 15))
+        
+        ttk.Label(preprocess_frame,
+                 text="Decode Memory (MB, 0 = no limit):",
+                 font=('Helvetica', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.memory_budget = tk.IntVar(value=0)
+        tk.Spinbox(preprocess_frame,
+                  from_=0,
+                  to=65536,
+                  increment=256,
+                  width=6,
+                  textvariable=self.memory_budget,
+                  font=('Helvetica', 11, 'bold'),
+                  bg=self.colors['surface'],
+                  fg=self.colors['entry_text'],
+                  insertbackground=self.colors['entry_text']).pack(side=tk.LEFT, padx=(10, 0))
+        
         # Right Panel (Statistics and Progress)
         right_panel = ttk.Frame(self.main_frame, style='Surface.TFrame')
         right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, padx=20, pady=20, ipadx=20, ipady=20)
@@ -192,6 +515,13 @@ class PhotoOrganizerApp:
         self.create_stat_widget(stats_frame, "Total Groups", "0", 2)
         self.create_stat_widget(stats_frame, "Unmatched", "0", 3)
         
+        # Live throughput widgets, refreshed from the run timings while processing
+        self.rate_widget = self.create_stat_widget(stats_frame, "Images/sec", "0", 0, row=1)
+        self.eta_widget = self.create_stat_widget(stats_frame, "ETA", "--", 1, row=1)
+        self.elapsed_widget = self.create_stat_widget(stats_frame, "Elapsed", "0:00:00", 2, row=1)
+        self.avg_widget = self.create_stat_widget(stats_frame, "Sec / Image", "0", 3, row=1)
+        self.timings = None
+        
         # Progress Bar
         progress_frame = ttk.Frame(right_panel, style='Surface.TFrame')
         progress_frame.pack(fill=tk.X, pady=(0, 20))
@@ -223,12 +553,47 @@ class PhotoOrganizerApp:
                                        text="▶ Start Processing",
                                        style='Process.TButton',
                                        command=self.start_processing)
-        self.process_button.pack(pady=20)
+        self.process_button.pack(pady=(20, 10))
+        
+        # Rebuild Button (slides from saved results, no OCR)
+        self.rebuild_button = ttk.Button(right_panel,
+                                       text="Rebuild from Results...",
+                                       style='Custom.TButton',
+                                       command=self.rebuild_from_results)
+        self.rebuild_button.pack(pady=(0, 10))
+        
+        # Job Queue Buttons (folders processed one after another, or several
+        # at once on shared OCR workers)
+        self.job_queue = JobQueue()
+        self.queue_cancel = threading.Event()
+        self.queue_thread = None
+        self.queue_live = []  # Progress of the running jobs
+        queue_frame = ttk.Frame(right_panel, style='Surface.TFrame')
+        queue_frame.pack(pady=(0, 10))
+        ttk.Button(queue_frame,
+                  text="Add to Queue",
+                  style='Custom.TButton',
+                  command=self.add_to_queue).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(queue_frame,
+                  text="Job Queue...",
+                  style='Custom.TButton',
+                  command=self.show_queue_window).pack(side=tk.LEFT)
+        
+        # Cancel Button (stops between images, the checkpoint is kept for resuming)
+        self.cancel_event = threading.Event()
+        self.cancel_button = ttk.Button(right_panel,
+                                      text="■ Cancel",
+                                      style='Custom.TButton',
+                                      command=self.cancel_processing,
+                                      state='disabled')
+        self.cancel_button.pack(pady=(0, 20))
+        
+        self.poll_updates()
 
-    def create_stat_widget(self, parent, label, value, column):
+    def create_stat_widget(self, parent, label, value, column, row=0):
         """Create a statistics widget and store reference"""
         frame = ttk.Frame(parent, style='Surface.TFrame')
-        frame.grid(row=0, column=column, padx=15)
+        frame.grid(row=row, column=column, padx=15, pady=(0 if row == 0 else 15, 0))
         
         # Create and store reference to value label
         value_label = ttk.Label(frame,
@@ -259,6 +624,12 @@ class PhotoOrganizerApp:
             self.output_entry.delete(0, tk.END)  # Clear current text
             self.output_entry.insert(0, folder)  # Insert new path
 
+    def browse_patterns(self):
+        path = filedialog.askopenfilename(title="Select Patterns File",
+                                          filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if path:
+            self.patterns_file.set(path)
+
     def validate_inputs(self):
         if not self.input_path.get() or not self.output_path.get():
             messagebox.showerror("Error", "Please select both input and output folders")
@@ -268,22 +639,226 @@ class PhotoOrganizerApp:
             return False
         return True
 
-    def start_processing(self):
+    def start_processing(self, results_file=None):
         if not self.validate_inputs():
             return
         
         self.process_button.configure(state='disabled')
+        self.rebuild_button.configure(state='disabled')
+        self.cancel_button.configure(state='normal')
+        self.cancel_event.clear()
+        self.last_progress = None
         self.progress_var.set(0)
         self.status_label.configure(text="Processing...")
         
+        # Fresh timings for this run, polled by the stats panel
+        self.timings = RunTimings()
+        self.poll_timings()
+        
         # Start processing in a separate thread
-        thread = threading.Thread(target=self.process_photos)
+        thread = threading.Thread(target=self.process_photos, args=(results_file,))
         thread.start()
 
-    def reset_ui(self):
+    def rebuild_from_results(self):
+        """Build the presentation from a saved result set instead of running OCR"""
+        output_folder = self.output_path.get()
+        path = filedialog.askopenfilename(title="Select Saved Results",
+                                          initialdir=output_folder or None,
+                                          filetypes=[("Saved results", "*.jsonl"),
+                                                     ("All files", "*.*")])
+        if path:
+            self.start_processing(results_file=path)
+
+    def add_to_queue(self):
+        """Queue the selected folders with the current options"""
+        if not self.validate_inputs():
+            return
+        try:
+            job = self.job_queue.add(self.input_path.get(), self.output_path.get(), self.get_settings())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Could not queue the job: {str(e)}")
+            return
+        self.status_label.configure(text=f"Queued job {job['id']}")
+
+    def run_job_queue(self):
+        """Work through the queued jobs on a background thread"""
+        if self.queue_thread and self.queue_thread.is_alive():
+            return
+        try:
+            workers = max(1, int(self.worker_count.get()))
+        except (tk.TclError, ValueError):
+            workers = default_worker_count()
+        self.queue_cancel.clear()
+
+        def work():
+            try:
+                run_queue(self.job_queue, workers=workers, cancel_event=self.queue_cancel,
+                          on_update=lambda rows: setattr(self, 'queue_live', rows))
+            except Exception as e:
+                error_message = str(e)
+                self.run_on_ui(lambda: messagebox.showerror("Error", f"Job queue stopped: {error_message}"))
+            finally:
+                self.queue_live = []
+
+        self.queue_thread = threading.Thread(target=work, daemon=True)
+        self.queue_thread.start()
+
+    def show_queue_window(self):
+        """List the queued jobs with their status, refreshed while open"""
+        queue_window = tk.Toplevel(self.root)
+        queue_window.title("Job Queue")
+        queue_window.configure(bg=self.colors['background'])
+        queue_window.geometry("900x400")
+
+        main_frame = ttk.Frame(queue_window, style='Surface.TFrame')
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+
+        columns = ('status', 'photos', 'groups', 'rate', 'input', 'output', 'error')
+        tree = ttk.Treeview(main_frame, columns=columns, style='Details.Treeview')
+        tree.heading('#0', text='Job', anchor='w')
+        tree.column('#0', width=50, stretch=False)
+        for column, heading, width in (('status', 'Status', 90), ('photos', 'Photos', 90),
+                                       ('groups', 'Groups', 60), ('rate', 'Images/s', 70),
+                                       ('input', 'Input Folder', 200), ('output', 'Output Folder', 200),
+                                       ('error', 'Error', 200)):
+            tree.heading(column, text=heading, anchor='w')
+            tree.column(column, width=width, stretch=column in ('input', 'output', 'error'))
+        scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+
+        controls = ttk.Frame(main_frame, style='Surface.TFrame')
+        controls.pack(fill=tk.X, side=tk.BOTTOM, pady=(10, 0))
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        def selected_ids():
+            return [int(item) for item in tree.selection()]
+
+        def stop():
+            self.queue_cancel.set()
+
+        def retry():
+            self.job_queue.requeue(selected_ids() or None)
+            refresh(repeat=False)
+
+        def remove():
+            self.job_queue.remove(selected_ids())
+            refresh(repeat=False)
+
+        def clear():
+            self.job_queue.clear_finished()
+            refresh(repeat=False)
+
+        for text, command in (("▶ Run Queue", self.run_job_queue), ("■ Stop", stop),
+                              ("Retry", retry), ("Remove", remove), ("Clear Finished", clear)):
+            ttk.Button(controls, text=text, style='Custom.TButton',
+                       command=command).pack(side=tk.LEFT, padx=(0, 5))
+        queue_state = ttk.Label(controls, style='Surface.TLabel')
+        queue_state.pack(side=tk.RIGHT)
+
+        def refresh(repeat=True):
+            if not tree.winfo_exists():
+                return
+            try:
+                jobs = self.job_queue.jobs()
+            except ValueError as e:
+                jobs = []
+                queue_state.configure(text=str(e))
+            live = {row['id']: row for row in self.queue_live}
+            for job in jobs:
+                stats = job['stats']
+                if job['id'] in live:
+                    row = live[job['id']]
+                    photos = f"{row['images_done']}/{row['images_discovered']}"
+                    rate = f"{row['images_per_second']:.1f}"
+                    groups = ""
+                elif stats:
+                    photos = stats['total_photos']
+                    rate = f"{stats['images_per_second']:.1f}"
+                    groups = stats['total_groups']
+                else:
+                    photos = rate = groups = ""
+                values = (job['status'], photos, groups, rate, job['input_folder'],
+                          job['output_folder'], job['error'] or "")
+                item = str(job['id'])
+                if tree.exists(item):
+                    tree.item(item, values=values)
+                else:
+                    tree.insert('', 'end', iid=item, text=item, values=values)
+            current = {str(job['id']) for job in jobs}
+            stale = [item for item in tree.get_children() if item not in current]
+            if stale:
+                tree.delete(*stale)
+            running = self.queue_thread is not None and self.queue_thread.is_alive()
+            if running and self.queue_cancel.is_set():
+                queue_state.configure(text="Stopping after the images in progress...")
+            elif jobs or running:
+                queue_state.configure(text=f"{'Running' if running else 'Idle'}, "
+                                           f"{sum(1 for job in jobs if job['status'] == 'queued')} queued")
+            if repeat:
+                queue_window.after(QUEUE_REFRESH_MS, refresh)
+
+        refresh()
+
+    def post_progress(self, percent):
+        """Progress callback for the worker thread; unchanged values are dropped"""
+        percent = round(percent, 1)
+        if percent != self.last_progress:
+            self.last_progress = percent
+            self.updates.put(('progress', percent))
+
+    def run_on_ui(self, func):
+        """Queue a call to run on the Tk thread at the next poll"""
+        self.updates.put(('call', func))
+
+    def poll_updates(self):
+        """Apply queued worker updates, showing only the latest progress value"""
+        progress = None
+        calls = []
+        try:
+            while True:
+                kind, value = self.updates.get_nowait()
+                if kind == 'progress':
+                    progress = value
+                else:
+                    calls.append(value)
+        except queue.Empty:
+            pass
+        
+        if progress is not None:
+            self.progress_var.set(progress)
+        for func in calls:
+            func()
+        self.root.after(UI_POLL_MS, self.poll_updates)
+
+    def poll_timings(self):
+        """Refresh the throughput widgets from the run timings"""
+        if not self.timings:
+            return
+        snapshot = self.timings.snapshot()
+        image_seconds = sum(snapshot['stages'][stage]['seconds'] for stage in IMAGE_STAGES)
+        self.rate_widget.configure(text=f"{snapshot['images_per_second']:.1f}")
+        self.eta_widget.configure(text=format_eta(snapshot['eta_seconds']))
+        self.elapsed_widget.configure(text=format_eta(snapshot['elapsed_seconds']))
+        if snapshot['images_done']:
+            self.avg_widget.configure(text=f"{image_seconds / snapshot['images_done']:.2f}")
+        if snapshot['phase'] != 'done':
+            self.root.after(500, self.poll_timings)
+
+    def cancel_processing(self):
+        """Ask the running pipeline to stop after the images in progress"""
+        self.cancel_event.set()
+        self.cancel_button.configure(state='disabled')
+        self.status_label.configure(text="Cancelling...")
+
+    def reset_ui(self, status="Ready"):
         self.process_button.configure(state='normal')
-        self.status_label.configure(text="Ready")
-        self.progress_var.set(100)
+        self.rebuild_button.configure(state='normal')
+        self.cancel_button.configure(state='disabled')
+        self.status_label.configure(text=status)
+        if status == "Ready":
+            self.progress_var.set(100)
+        self.poll_timings()
 
     def update_statistics(self, total_photos, total_slides, total_groups, unmatched_photos):
         """Update the statistics display"""
@@ -291,192 +866,135 @@ class PhotoOrganizerApp:
         for widget, value in zip(self.stats_widgets, values):
             widget.configure(text=str(value))
 
-    def process_photos(self):
+    def get_settings(self):
+        """Collect pipeline settings from the option widgets"""
+        try:
+            workers = max(1, int(self.worker_count.get()))
+        except (tk.TclError, ValueError):
+            workers = default_worker_count()
+        try:
+            ocr_max_size = max(0, int(self.ocr_max_size.get()))
+        except (tk.TclError, ValueError):
+            ocr_max_size = 0
+        try:
+            dedup_threshold = min(HASH_BITS, max(0, int(self.dedup_threshold.get())))
+        except (tk.TclError, ValueError):
+            dedup_threshold = DEFAULT_THRESHOLD
+        try:
+            memory_budget_mb = max(0, int(self.memory_budget.get()))
+        except (tk.TclError, ValueError):
+            memory_budget_mb = 0
+        try:
+            ocr_batch_size = max(1, int(self.ocr_batch_size.get()))
+        except (tk.TclError, ValueError):
+            ocr_batch_size = DEFAULT_BATCH_SIZE
+        regions = split_regions(self.ocr_regions.get())
+        try:
+            embed_dpi = max(0, int(self.embed_dpi.get()))
+            embed_quality = min(100, max(1, int(self.embed_quality.get())))
+        except (tk.TclError, ValueError):
+            embed_dpi = DEFAULT_EMBED['dpi']
+            embed_quality = DEFAULT_EMBED['quality']
+        try:
+            shard_slides = max(0, int(self.shard_slides.get()))
+        except (tk.TclError, ValueError):
+            shard_slides = 0
+        try:
+            max_photos_per_slide = max(0, int(self.max_photos_per_slide.get()))
+        except (tk.TclError, ValueError):
+            max_photos_per_slide = DEFAULT_LAYOUT['max_per_slide']
+        try:
+            group_gap = max(0, int(self.group_gap.get()))
+        except (tk.TclError, ValueError):
+            group_gap = DEFAULT_SETTINGS['group_gap']
+        export_results = None
+        if self.export_results.get():
+            export_results = results_path(self.output_path.get())
+        return make_settings(workers=workers,
+                             recursive=self.recursive.get(),
+                             incremental=self.incremental.get(),
+                             pipeline=self.pipeline.get(),
+                             group_gap=group_gap,
+                             embed_dpi=embed_dpi,
+                             embed_quality=embed_quality,
+                             max_photos_per_slide=max_photos_per_slide,
+                             shard_slides=shard_slides,
+                             use_cache=self.use_cache.get(),
+                             match_strategy=self.match_strategy.get(),
+                             ocr_max_size=ocr_max_size or None,
+                             ocr_regions=regions or DEFAULT_PREPROCESS['regions'],
+                             ocr_batch_size=ocr_batch_size,
+                             ocr_backend=self.ocr_backend.get(),
+                             ocr_prefilter=self.ocr_prefilter.get(),
+                             memory_budget_mb=memory_budget_mb,
+                             patterns_file=self.patterns_file.get().strip() or None,
+                             multi_group=self.multi_group.get(),
+                             dedup=self.dedup.get(),
+                             dedup_threshold=dedup_threshold,
+                             export_results=export_results,
+                             resume=self.resume.get())
+
+    def process_photos(self, results_file=None):
+        status = "Ready"
         try:
             input_folder = self.input_path.get()
             output_folder = self.output_path.get()
             
-            # Get all image files
-            image_files = [f for f in os.listdir(input_folder) 
-                         if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
+            if results_file:
+                details = rebuild_from_results(
+                    results_file,
+                    input_folder,
+                    output_folder,
+                    settings=self.get_settings(),
+                    progress_callback=self.post_progress,
+                    timings=self.timings,
+                    cancel_event=self.cancel_event)
+            else:
+                details = organize_photos(
+                    input_folder,
+                    output_folder,
+                    settings=self.get_settings(),
+                    progress_callback=self.post_progress,
+                    timings=self.timings,
+                    cancel_event=self.cancel_event)
             
-            if not image_files:
-                self.root.after(0, lambda: messagebox.showwarning("Warning", "No image files found"))
+            if details is None:
+                self.run_on_ui(lambda: messagebox.showwarning("Warning", "No image files found"))
                 return
             
-            # Group photos by their OCR-extracted pattern
-            photo_groups = defaultdict(list)
-            # Modified patterns to allow 7 or more digits
-            patterns = [
-                r'([1-2])[-_]?(\d{9,})',  # Matches 7 or more digits
-                
-            ]
-            
-            # Add tracking for unmatched photos
-            unmatched_photos = []
-            
-            # Process each image with OCR
-            for idx, img_file in enumerate(image_files):
-                try:
-                    img_path = os.path.join(input_folder, img_file)
-                    # Open and preprocess image
-                    image = Image.open(img_path)
-                    
-                    # Convert to RGB if necessary
-                    if image.mode != 'RGB':
-                        image = image.convert('RGB')
-                    
-                    # Enhance image for better OCR
-                    from PIL import ImageEnhance
-                    enhancer = ImageEnhance.Contrast(image)
-                    image = enhancer.enhance(2.0)  # Increase contrast
-                    # Extract text using Tesseract with custom configuration
-                    custom_config = r'--oem 3 --psm 6'  # Added closing quote
-                    text = pytesseract.image_to_string(image, config=custom_config)
-                    print(f"OCR Text for {img_file}: {text}")  # Debug print
-                    
-                    # Try all patterns
-                    pattern_found = False
-                    for pattern in patterns:
-                        match = re.search(pattern, text)
-                        if match:
-                            key = f"{match.group(1)}-{match.group(2)}"  # Standardize format
-                            photo_groups[key].append(img_file)
-                            print(f"Found pattern {key} in {img_file}")  # Debug print
-                            pattern_found = True
-                            break
-                    
-                    if not pattern_found:
-                        # Try finding pattern in filename as fallback
-                        for pattern in patterns:
-                            match = re.search(pattern, img_file)
-                            if match:
-                                key = f"{match.group(1)}-{match.group(2)}"
-                                photo_groups[key].append(img_file)
-                                print(f"Found pattern {key} in filename {img_file}")
-                                pattern_found = True
-                                break
-                    
-                    if not pattern_found:
-                        unmatched_photos.append(img_file)
-                        print(f"No pattern match found in {img_file}")
-                    
-                    # Update progress
-                    progress = (idx / len(image_files)) * 50
-                    self.root.after(0, lambda p=progress: self.progress_var.set(p))
-                    
-                except Exception as e:
-                    print(f"Error processing {img_file}: {str(e)}")
-                    unmatched_photos.append(img_file)
-                    continue
+            stats = details['stats']
             
-            print(f"Total groups found: {len(photo_groups)}")  # Debug print
-            print(f"Groups: {dict(photo_groups)}")  # Debug print
-
-            # Create PowerPoint
-            prs = Presentation()
-            total_slides = 0
-            
-            # Process each group
-            total_groups = len(photo_groups)
-            for idx, (group_key, photos) in enumerate(photo_groups.items(), 1):
-                # Create one slide for all photos in this group
-                slide = prs.slides.add_slide(prs.slide_layouts[6])  # blank layout
-                
-                # Use full slide dimensions with small margins
-                margin = Inches(0.2)  # 0.2 inch margin
-                slide_width = Inches(10) - (2 * margin)
-                slide_height = Inches(7.5) - (2 * margin)
-                
-                # Calculate photo width to fit all photos in one row
-                num_photos = len(photos)
-                photo_width = slide_width / num_photos
-                photo_height = slide_height  # Full height of slide
-                
-                # Add photos to slide in a single row
-                for photo_idx, photo in enumerate(photos):
-                    # Calculate x position for each photo
-                    x = margin + (photo_idx * photo_width)
-                    y = margin
-                    
-                    try:
-                        img_path = os.path.join(input_folder, photo)
-                        slide.shapes.add_picture(img_path, x, y, photo_width, photo_height)
-                    except Exception as e:
-                        print(f"Error adding photo {photo}: {str(e)}")
-                
-                total_slides += 1
-                
-                # Update progress
-                progress = 50 + (idx / total_groups) * 50
-                self.root.after(0, lambda p=progress: self.progress_var.set(p))
-            
-            # Save presentation with error handling
-            output_path = os.path.join(output_folder, "organized_photos.pptx")
-            try:
-                prs.save(output_path)
-            except PermissionError:
-                # Try saving with a different filename
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                alternative_path = os.path.join(output_folder, f"organized_photos_{timestamp}.pptx")
-                try:
-                    prs.save(alternative_path)
-                    output_path = alternative_path  # Update output_path for success message
-                except Exception as save_error:
-                    raise Exception(f"Could not save presentation. Please ensure PowerPoint is closed and you have write permissions. Error: {str(save_error)}")
-            
-            # Create summary text
-            summary = f"""Processing Summary:
-• Total Photos: {len(image_files)}
-• Successfully Grouped Photos: {len(image_files) - len(unmatched_photos)}
-• Unmatched Photos: {len(unmatched_photos)}
-• Total Groups Created: {len(photo_groups)}
-• Groups Details:"""
-
-            # Add group details
-            for group_key, photos in photo_groups.items():
-                summary += f"\n  - Group {group_key}: {len(photos)} photos"
-
-            # Add unmatched photos list if any
-            if unmatched_photos:
-                summary += "\n\nUnmatched Photos:"
-                for photo in unmatched_photos:
-                    summary += f"\n  • {photo}"
-
             # Update statistics including unmatched
-            self.root.after(0, lambda: self.update_statistics(
-                len(image_files),          # total photos
-                len(photo_groups),         # total slides (one per group)
-                len(photo_groups),         # total groups
-                len(unmatched_photos)      # unmatched photos
+            self.run_on_ui(lambda: self.update_statistics(
+                stats['total_photos'],     # total photos
+                stats['total_slides'],     # total slides (one per group)
+                stats['total_groups'],     # total groups
+                stats['unmatched_count']   # unmatched photos
             ))
             
             # Store the processing details
-            self.processing_details = {
-                'groups': dict(photo_groups),
-                'unmatched': unmatched_photos,
-                'stats': {
-                    'total_photos': len(image_files),
-                    'grouped_photos': len(image_files) - len(unmatched_photos),
-                    'total_groups': len(photo_groups),
-                    'unmatched_count': len(unmatched_photos)
-                }
-            }
+            self.processing_details = details
 
             # Enable the details button after processing
-            self.root.after(0, lambda: self.details_button.configure(state='normal'))
+            self.run_on_ui(lambda: self.details_button.configure(state='normal'))
             
             # Show simple success message
-            self.root.after(0, lambda: self.show_success(output_path))
+            self.run_on_ui(lambda: self.show_success(details['output_path'],
+                                                     details['output_files'],
+                                                     details['shard_index']))
 
+        except RunCancelled:
+            status = "Cancelled - start again to resume"
+        
         except Exception as e:
             error_message = str(e)  # Capture the error message
-            self.root.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {error_message}"))
+            self.run_on_ui(lambda: messagebox.showerror("Error", f"An error occurred: {error_message}"))
         
         finally:
-            self.root.after(0, self.reset_ui)
+            self.timings.finish()
+            self.run_on_ui(lambda: self.reset_ui(status))
 
-    def show_success(self, output_path):
+    def show_success(self, output_path, output_files=None, shard_index=None):
         """Show success message in dark theme"""
         success_window = tk.Toplevel(self.root)
         success_window.title("Success")
@@ -504,8 +1022,12 @@ class PhotoOrganizerApp:
                  font=('Helvetica', 16, 'bold')).pack(pady=(10, 5))
         
         # File path (with word wrap)
+        if shard_index:
+            message = f"{len(output_files)} presentations saved, index:\n{shard_index}"
+        else:
+            message = f"Presentation saved as:\n{output_path}"
         path_label = ttk.Label(content_frame,
-                             text=f"Presentation saved as:\n{output_path}",
+                             text=message,
                              style='Surface.TLabel',
                              wraplength=350,
                              justify='center')
@@ -552,46 +1074,79 @@ class PhotoOrganizerApp:
         stats = self.processing_details['stats']
         groups = self.processing_details['groups']
         
-        # Create detailed summary text
-        summary_text = "📊 Processing Summary\n"
-        summary_text += "═══════════════════\n\n"
-        summary_text += f"Total Photos: {stats['total_photos']}\n"
-        summary_text += f"Successfully Grouped: {stats['grouped_photos']}\n"
-        summary_text += f"Total Groups: {stats['total_groups']}\n"
-        summary_text += f"Unmatched Photos: {stats['unmatched_count']}\n\n"
-        
-        # Add group summary
-        summary_text += "📁 Groups Overview\n"
-        summary_text += "═══════════════\n\n"
-        for group_key, photos in groups.items():
-            summary_text += f"Group {group_key}: {len(photos)} photos\n"
-        
-        # Add unmatched photos if any exist
-        if self.processing_details['unmatched']:
-            summary_text += "\n❌ Unmatched Photos\n"
-            summary_text += "═══════════════════\n\n"
-            for idx, photo in enumerate(self.processing_details['unmatched'], 1):
-                summary_text += f"{idx}. {photo}\n"
-        
-        self.create_scrolled_text(summary_frame, summary_text)
+        # Create detailed summary text (group members are listed in the
+        # Group Details tree, which loads them on demand)
+        summary_lines = [
+            "📊 Processing Summary",
+            "═══════════════════",
+            "",
+            f"Total Photos: {stats['total_photos']}",
+            f"Successfully Grouped: {stats['grouped_photos']}",
+            f"Total Groups: {stats['total_groups']}",
+            f"Unmatched Photos: {stats['unmatched_count']}",
+            f"Match Strategy: {stats['match_strategy']}",
+            f"Matched by OCR: {stats['ocr_matches']}",
+            f"Matched by Filename: {stats['filename_matches']}",
+            f"Assigned by Hand: {stats['manual_matches']}",
+            f"Photos in Several Groups: {stats['multi_group_photos']}",
+            f"Duplicates Collapsed: {stats['duplicates']} (mode: {stats['dedup']})",
+            f"OCR Engine: {stats['ocr_backend']}",
+            f"Images OCR'd: {stats['ocr_runs']}",
+            f"Skipped by Pre-filter: {stats['prefiltered']}",
+            f"OCR Cache Hits: {stats['cache_hits']}",
+            f"OCR Cache Misses: {stats['cache_misses']}",
+            f"Resumed From Checkpoint: {stats['resumed']}",
+            f"Slides Added: {stats['slides_added']}, Rebuilt: {stats['slides_rebuilt']}, "
+            f"Kept: {stats['slides_kept']}, Removed: {stats['slides_removed']}",
+            f"Embedded Images: {stats['original_image_bytes'] / 1e6:.1f} MB originals -> "
+            f"{stats['embedded_image_bytes'] / 1e6:.1f} MB in slides",
+            "",
+            "See Group Details for the photos in each group and the unmatched photos,",
+            "Preview to look through them and assign photos to a group by hand,",
+            "and Duplicates for the photos left off the slides as copies of another.",
+        ]
+        self.create_scrolled_text(summary_frame, "\n".join(summary_lines))
 
         # Detailed Groups Tab
         groups_frame = ttk.Frame(notebook, style='Surface.TFrame')
         notebook.add(groups_frame, text='Group Details')
+        self.create_group_tree(groups_frame, groups, self.processing_details['unmatched'])
 
-        groups_text = "📑 Detailed Group Contents\n"
-        groups_text += "═════════════════════════\n\n"
-        
-        # Sort groups by key for better organization
-        for group_key in sorted(groups.keys()):
-            photos = groups[group_key]
-            groups_text += f"Group {group_key} ({len(photos)} photos):\n"
-            groups_text += "─" * 40 + "\n"  # Separator line
-            for idx, photo in enumerate(photos, 1):
-                groups_text += f"  {idx}. {photo}\n"
-            groups_text += "\n"
-            
-        self.create_scrolled_text(groups_frame, groups_text)
+        # Thumbnail Preview Tab
+        preview_frame = ttk.Frame(notebook, style='Surface.TFrame')
+        notebook.add(preview_frame, text='Preview')
+        self.create_preview_grid(preview_frame, details_window)
+
+        # Duplicates Tab
+        duplicates_frame = ttk.Frame(notebook, style='Surface.TFrame')
+        notebook.add(duplicates_frame, text='Duplicates')
+        self.create_duplicates_tree(duplicates_frame, self.processing_details['duplicates'])
+
+        # Timings Tab
+        timings_frame = ttk.Frame(notebook, style='Surface.TFrame')
+        notebook.add(timings_frame, text='Timings')
+
+        timings = self.processing_details['timings']
+        timings_text = "⏱ Stage Timings\n"
+        timings_text += "═══════════════\n\n"
+        timings_text += f"Elapsed: {format_eta(timings['elapsed_seconds'])}\n"
+        timings_text += f"Throughput: {timings['images_per_second']:.2f} images/sec\n\n"
+        timings_text += f"{'Stage':<14}{'Total (s)':>12}{'Count':>10}{'Mean (ms)':>12}\n"
+        timings_text += "─" * 48 + "\n"
+        for stage, values in timings['stages'].items():
+            mean = f"{values['mean_ms']:.1f}" if values['mean_ms'] is not None else "-"
+            timings_text += f"{stage:<14}{values['seconds']:>12.2f}{values['count']:>10}{mean:>12}\n"
+
+        timings_text += "\n🐢 Slowest Files\n"
+        timings_text += "═══════════════\n\n"
+        for idx, item in enumerate(timings['slowest'], 1):
+            timings_text += f"{idx}. {item['file']} ({item['seconds']:.2f}s)\n"
+
+        ttk.Button(timings_frame,
+                  text="Export Timings...",
+                  style='Custom.TButton',
+                  command=self.export_timings).pack(anchor='e', padx=10, pady=(10, 0))
+        self.create_scrolled_text(timings_frame, timings_text)
 
         # Center the window
         details_window.update_idletasks()
@@ -599,6 +1154,316 @@ class PhotoOrganizerApp:
         y = self.root.winfo_y() + (self.root.winfo_height() - details_window.winfo_height()) // 2
         details_window.geometry(f"+{x}+{y}")
 
+    def export_timings(self):
+        """Save the last run's timings to a JSON or CSV file"""
+        if not self.timings:
+            return
+        path = filedialog.asksaveasfilename(title="Export Timings",
+                                            defaultextension=".json",
+                                            filetypes=[("JSON summary", "*.json"),
+                                                       ("CSV per image", "*.csv")])
+        if path:
+            try:
+                self.timings.export(path)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not export timings: {str(e)}")
+
+    def create_group_tree(self, parent, groups, unmatched):
+        """Treeview of the groups and their photos, plus the unmatched photos"""
+        # Sort groups by key for better organization
+        rows = []
+        if unmatched:
+            rows.append(("❌ Unmatched", len(unmatched), unmatched))
+        rows.extend((f"Group {group_key}", len(groups[group_key]), groups[group_key])
+                    for group_key in sorted(groups.keys()))
+        return self.create_lazy_tree(parent, rows, 'Group / Photo')
+
+    def create_duplicates_tree(self, parent, duplicates):
+        """Treeview of each kept photo and the duplicates collapsed onto it"""
+        rows = [(photo, len(copies),
+                 [f"{copy['file']} (exact copy)" if copy['distance'] is None
+                  else f"{copy['file']} ({copy['distance']} bits apart)" for copy in copies])
+                for photo, copies in duplicates.items()]
+        if not rows:
+            rows.append(("No duplicates found", None, None))
+        return self.create_lazy_tree(parent, rows, 'Kept Photo / Duplicate')
+
+    def create_lazy_tree(self, parent, rows, heading):
+        """Treeview of (text, count, children) rows whose children are only
+        inserted when a row is opened.
+
+        Rows are inserted a page at a time; a trailing "more" row loads the
+        next page on double-click, so huge runs open instantly.
+        """
+        frame = ttk.Frame(parent, style='Surface.TFrame')
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        tree = ttk.Treeview(frame, columns=('photos',), style='Details.Treeview')
+        tree.heading('#0', text=heading, anchor='w')
+        tree.heading('photos', text='Photos')
+        tree.column('photos', width=80, anchor='e', stretch=False)
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        members = {}     # Unopened group item -> its photos
+        more_rows = {}   # "more" item -> (parent item, rows, offset of next page)
+
+        def insert_page(parent_item, rows, offset):
+            for text, count, photos in rows[offset:offset + TREE_PAGE_SIZE]:
+                item = tree.insert(parent_item, 'end', text=text,
+                                   values=(count,) if count is not None else ())
+                if photos:
+                    members[item] = photos
+                    tree.insert(item, 'end', text="…")  # Placeholder so the group can be opened
+            remaining = len(rows) - offset - TREE_PAGE_SIZE
+            if remaining > 0:
+                more = tree.insert(parent_item, 'end', text=f"… {remaining} more (double-click to load)")
+                more_rows[more] = (parent_item, rows, offset + TREE_PAGE_SIZE)
+
+        def on_open(event):
+            item = tree.focus()
+            photos = members.pop(item, None)
+            if photos is not None:
+                tree.delete(*tree.get_children(item))
+                insert_page(item, [(f"{idx}. {photo}", None, None)
+                                   for idx, photo in enumerate(photos, 1)], 0)
+
+        def on_double_click(event):
+            item = tree.identify_row(event.y)
+            if item in more_rows:
+                parent_item, rows, offset = more_rows.pop(item)
+                tree.delete(item)
+                insert_page(parent_item, rows, offset)
+
+        tree.bind('<<TreeviewOpen>>', on_open)
+        tree.bind('<Double-1>', on_double_click)
+
+        insert_page('', rows, 0)
+        return tree
+
+    def create_preview_grid(self, parent, details_window):
+        """Thumbnail grid of the unmatched photos or of one group, where
+        selected photos can be assigned a group key by hand.
+
+        Only the rows scrolled into view are drawn; their thumbnails are made
+        on background threads and kept in the output folder's thumbnail
+        cache. Assignments are saved to the output folder and take effect
+        the next time the folder is processed (Apply to Presentation).
+        """
+        details = self.processing_details
+        input_folder = details['input_folder']
+        output_folder = details['output_folder']
+        groups = details['groups']
+        unmatched = details['unmatched']
+
+        frame = ttk.Frame(parent, style='Surface.TFrame')
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        controls = ttk.Frame(frame, style='Surface.TFrame')
+        controls.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(controls, text="Show:", style='Surface.TLabel').pack(side=tk.LEFT)
+        bucket = tk.StringVar()
+        bucket_box = ttk.Combobox(controls, textvariable=bucket, state='readonly', width=28)
+        bucket_box.pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Label(controls, text="Group Key:", style='Surface.TLabel').pack(side=tk.LEFT)
+        key_var = tk.StringVar()
+        key_box = ttk.Combobox(controls, textvariable=key_var, width=18)
+        key_box.pack(side=tk.LEFT, padx=(5, 5))
+        assign_button = ttk.Button(controls, text="Assign Selected", style='Custom.TButton')
+        assign_button.pack(side=tk.LEFT)
+        apply_button = ttk.Button(controls, text="Apply to Presentation", style='Custom.TButton')
+        apply_button.pack(side=tk.RIGHT)
+
+        status = ttk.Label(frame, text="Click photos to select them", style='Surface.TLabel')
+        status.pack(side=tk.BOTTOM, anchor='w', pady=(10, 0))
+
+        canvas = tk.Canvas(frame, bg=self.colors['surface'], highlightthickness=0,
+                           yscrollincrement=PREVIEW_CELL_HEIGHT // 4)
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=canvas.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        view = {'photos': [], 'columns': 0}
+        cells = {}        # Index of a drawn photo -> {'photo', 'frame', 'image', 'picture'}
+        thumbnails = {}   # Photo -> thumbnail JPEG bytes, decoded only while drawn
+        selected = set()
+
+        def thumbnail_ready(photo, data):
+            if not canvas.winfo_exists():
+                return  # Finished after the window was closed
+            thumbnails[photo] = data
+            for index, cell in cells.items():
+                if cell['photo'] == photo:
+                    show_thumbnail(index, cell)
+
+        loader = ThumbnailLoader(ThumbnailCache(thumbnails_path(output_folder), input_folder),
+                                 lambda photo, data: self.run_on_ui(lambda: thumbnail_ready(photo, data)))
+        frame.bind('<Destroy>', lambda event: loader.close() if event.widget is frame else None)
+
+        def cell_origin(index):
+            row, col = divmod(index, view['columns'])
+            return col * PREVIEW_CELL_WIDTH, row * PREVIEW_CELL_HEIGHT
+
+        def show_thumbnail(index, cell):
+            data = thumbnails.get(cell['photo'])
+            if data is None or cell['image'] is not None:
+                return
+            try:
+                cell['picture'] = ImageTk.PhotoImage(Image.open(io.BytesIO(data)), master=canvas)
+            except Exception:
+                return
+            x, y = cell_origin(index)
+            cell['image'] = canvas.create_image(x + PREVIEW_CELL_WIDTH // 2, y + 10 + THUMBNAIL_SIZE // 2,
+                                                image=cell['picture'])
+
+        def draw_cell(index):
+            photo = view['photos'][index]
+            x, y = cell_origin(index)
+            name = os.path.basename(photo)
+            if len(name) > 22:
+                name = name[:10] + "…" + name[-11:]
+            cell = {'photo': photo, 'image': None, 'picture': None}
+            cell['frame'] = canvas.create_rectangle(x + 4, y + 4, x + PREVIEW_CELL_WIDTH - 4,
+                                                    y + PREVIEW_CELL_HEIGHT - 4, width=2,
+                                                    outline=self.colors['primary'] if photo in selected
+                                                    else self.colors['background'])
+            cell['label'] = canvas.create_text(x + PREVIEW_CELL_WIDTH // 2, y + THUMBNAIL_SIZE + 22,
+                                               text=name, fill=self.colors['text_secondary'],
+                                               font=('Helvetica', 9))
+            cells[index] = cell
+            if photo in thumbnails:
+                show_thumbnail(index, cell)
+            else:
+                loader.request(photo)
+
+        def clear_cells():
+            canvas.delete('all')
+            cells.clear()
+
+        def render(event=None):
+            columns = max(1, canvas.winfo_width() // PREVIEW_CELL_WIDTH)
+            if columns != view['columns']:
+                view['columns'] = columns
+                clear_cells()
+                rows = -(-len(view['photos']) // columns)
+                canvas.configure(scrollregion=(0, 0, columns * PREVIEW_CELL_WIDTH,
+                                               rows * PREVIEW_CELL_HEIGHT))
+            top = canvas.canvasy(0)
+            first = int(top // PREVIEW_CELL_HEIGHT) * columns
+            last = min(len(view['photos']),
+                       (int((top + canvas.winfo_height()) // PREVIEW_CELL_HEIGHT) + 1) * columns)
+            for index in [index for index in cells if not first <= index < last]:
+                cell = cells.pop(index)
+                canvas.delete(cell['frame'], cell['label'])
+                if cell['image'] is not None:
+                    canvas.delete(cell['image'])
+            for index in range(first, last):
+                if index not in cells:
+                    draw_cell(index)
+            loader.keep_only(view['photos'][first:last])
+
+        def on_scroll(*args):
+            scrollbar.set(*args)
+            render()
+
+        def on_wheel(event):
+            if event.num == 4 or event.delta > 0:
+                canvas.yview_scroll(-1, 'units')
+            else:
+                canvas.yview_scroll(1, 'units')
+
+        def on_click(event):
+            if not view['columns']:
+                return
+            col = int(canvas.canvasx(event.x) // PREVIEW_CELL_WIDTH)
+            index = int(canvas.canvasy(event.y) // PREVIEW_CELL_HEIGHT) * view['columns'] + col
+            if col >= view['columns'] or index not in cells:
+                return
+            photo = cells[index]['photo']
+            if photo in selected:
+                selected.discard(photo)
+            else:
+                selected.add(photo)
+            canvas.itemconfigure(cells[index]['frame'],
+                                 outline=self.colors['primary'] if photo in selected
+                                 else self.colors['background'])
+            status.configure(text=f"{len(selected)} selected")
+
+        def buckets():
+            """(label, photos) choices, the unmatched photos first"""
+            choices = [(f"Unmatched ({len(unmatched)})", unmatched)]
+            choices.extend((f"Group {group_key} ({len(groups[group_key])})", groups[group_key])
+                           for group_key in sorted(groups))
+            return choices
+
+        def show_bucket(event=None):
+            choices = dict(buckets())
+            view['photos'] = list(choices.get(bucket.get(), []))
+            view['columns'] = 0
+            selected.clear()
+            canvas.yview_moveto(0)
+            render()
+
+        def refresh_buckets(name=None):
+            choices = buckets()
+            bucket_box.configure(values=[label for label, _ in choices])
+            key_box.configure(values=sorted(groups))
+            labels = [label for label, _ in choices if label.rsplit(" (", 1)[0] == name]
+            bucket.set(labels[0] if labels else choices[0][0])
+            show_bucket()
+
+        def assign():
+            key = key_var.get().strip()
+            if not key or not selected:
+                status.configure(text="Select photos and enter a group key first")
+                return
+            manual_keys = load_manual_keys(output_folder, input_folder)
+            manual_keys.update((photo, key) for photo in selected)
+            try:
+                save_manual_keys(output_folder, input_folder, manual_keys)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not save the assignments: {str(e)}")
+                return
+            # Move the photos in the shown results as the next run will
+            for photo in selected:
+                if photo in unmatched:
+                    unmatched.remove(photo)
+                for group_key in [group_key for group_key, photos in groups.items()
+                                  if photo in photos and group_key != key]:
+                    groups[group_key].remove(photo)
+                    if not groups[group_key]:
+                        del groups[group_key]
+                if photo not in groups.setdefault(key, []):
+                    groups[key].append(photo)
+            count = len(selected)
+            refresh_buckets(bucket.get().rsplit(" (", 1)[0])
+            status.configure(text=f"Assigned {count} photos to {key}. "
+                                  "Apply to Presentation to update the slides.")
+
+        def apply():
+            if str(self.process_button['state']) == 'disabled':
+                status.configure(text="Wait for the current run to finish")
+                return
+            details_window.destroy()
+            # Re-run the folders these details belong to, which the main
+            # window may have moved away from since
+            self.input_path.set(input_folder)
+            self.output_path.set(output_folder)
+            self.start_processing()
+
+        canvas.configure(yscrollcommand=on_scroll)
+        canvas.bind('<Configure>', render)
+        canvas.bind('<Button-1>', on_click)
+        canvas.bind('<MouseWheel>', on_wheel)
+        canvas.bind('<Button-4>', on_wheel)
+        canvas.bind('<Button-5>', on_wheel)
+        bucket_box.bind('<<ComboboxSelected>>', show_bucket)
+        assign_button.configure(command=assign)
+        apply_button.configure(command=apply)
+        refresh_buckets()
+
     def create_scrolled_text(self, parent, content):
         """Helper method to create scrolled text widget"""
         frame = ttk.Frame(parent, style='Surface.TFrame')
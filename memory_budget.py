@@ -0,0 +1,70 @@
+# Part 14: Decode Memory Budget (save as memory_budget.py)
+
+import multiprocessing
+from contextlib import contextmanager
+from PIL import Image
+
+# JPEG decoders can reduce the scale by up to this factor (see Image.draft)
+MAX_DRAFT_SCALE = 8
+
+
+def decoded_size(img_path, max_size=None):
+    """Rough bytes held while an image is decoded and preprocessed for OCR.
+
+    Only the header is read. Counts the decoded frame in its own mode plus
+    the grayscale working copy, at the reduced scale JPEG drafting gives.
+    """
+    with Image.open(img_path) as image:
+        width, height = image.size
+        bands = len(image.getbands())
+        scale = 1
+        if max_size and image.format == 'JPEG':
+            while scale < MAX_DRAFT_SCALE and max(width, height) // (scale * 2) >= max_size:
+                scale *= 2
+    return (width // scale) * (height // scale) * (bands + 1)
+
+
+class MemoryBudget:
+    """Byte budget for decoded images, shared by all OCR worker processes.
+
+    Workers reserve the estimated size of what they are about to decode
+    and wait while the reservations of the other workers would push the
+    total past the limit. A single reservation is capped at the limit, so
+    an image larger than the whole budget still gets decoded - alone.
+    Hand it to the workers when the pool is created (as an initializer
+    argument); it cannot be pickled later.
+    """
+
+    def __init__(self, limit_bytes, context=None):
+        context = context or multiprocessing.get_context()
+        self.limit = int(limit_bytes)
+        self.used = context.Value('q', 0, lock=False)
+        self.condition = context.Condition()
+
+    def acquire(self, size):
+        """Block until size bytes fit in the budget, returns the amount held"""
+        size = max(0, min(int(size), self.limit))
+        with self.condition:
+            while self.used.value and self.used.value + size > self.limit:
+                self.condition.wait()
+            self.used.value += size
+        return size
+
+    def release(self, size):
+        with self.condition:
+            self.used.value -= size
+            self.condition.notify_all()
+
+    @contextmanager
+    def reserve(self, size):
+        held = self.acquire(size)
+        try:
+            yield held
+        finally:
+            self.release(held)
+
+
+@contextmanager
+def no_budget(size):
+    """Stand-in for MemoryBudget.reserve when no budget is configured"""
+    yield size
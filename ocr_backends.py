@@ -0,0 +1,146 @@
+# Part 12: OCR Backends (save as ocr_backends.py)
+
+import os
+import shlex
+import subprocess
+import tempfile
+from PIL import ImageFilter
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # Optional in-process Tesseract API
+    tesserocr = None
+
+# Tesseract configuration
+OCR_CONFIG = r'--oem 3 --psm 6'
+
+# The group keys only ever contain digits and a separator
+DIGITS_WHITELIST = '0123456789-_'
+
+# Pre-filter: images are shrunk to PREFILTER_SIZE on their long edge and
+# skipped when fewer than PREFILTER_MIN_EDGES of their pixels are edges at
+# least PREFILTER_EDGE_LEVEL strong. Dark print on a light label gives far
+# stronger edges than photo texture or sensor noise
+PREFILTER_SIZE = 256
+PREFILTER_EDGE_LEVEL = 128
+PREFILTER_MIN_EDGES = 0.004
+
+DEFAULT_BACKEND = 'tesseract'
+
+
+def run_tesseract_batch(images, config=OCR_CONFIG):
+    """OCR several images with a single Tesseract process.
+
+    The images are written to a temporary folder and passed as a list file,
+    which Tesseract treats as one multi-page input; pages come back
+    separated by form feeds, which splits the text per image again.
+    Returns the texts in image order.
+    """
+    with tempfile.TemporaryDirectory(prefix='ocr_batch_') as temp_dir:
+        paths = []
+        for number, image in enumerate(images):
+            path = os.path.join(temp_dir, f"{number:05d}.png")
+            image.save(path, compress_level=1)
+            paths.append(path)
+        list_path = os.path.join(temp_dir, 'images.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(paths) + "\n")
+
+        command = [pytesseract.pytesseract.tesseract_cmd, list_path, 'stdout'] + shlex.split(config)
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Tesseract failed: {completed.stderr.decode('utf-8', 'replace').strip()}")
+
+    pages = completed.stdout.decode('utf-8', 'replace').split('\f')
+    # Every page, including the last, is followed by a separator
+    if len(pages) == len(images) + 1 and not pages[-1].strip():
+        pages.pop()
+    if len(pages) != len(images):
+        raise RuntimeError(f"Tesseract returned {len(pages)} pages for {len(images)} images")
+    return pages
+
+
+def likely_has_text(image):
+    """Cheap check whether an image could contain a printed label at all"""
+    small = image.convert('L')
+    small.thumbnail((PREFILTER_SIZE, PREFILTER_SIZE))
+    if small.width < 3 or small.height < 3:
+        return True
+    # The filter leaves the outermost pixels unchanged, so they are cropped off
+    edges = small.filter(ImageFilter.FIND_EDGES).crop((1, 1, small.width - 1, small.height - 1))
+    histogram = edges.histogram()
+    return sum(histogram[PREFILTER_EDGE_LEVEL:]) >= PREFILTER_MIN_EDGES * edges.width * edges.height
+
+
+class TesseractBackend:
+    """Tesseract command line through pytesseract, one process per image"""
+
+    name = 'tesseract'
+    config = OCR_CONFIG
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def recognize(self, image):
+        return pytesseract.image_to_string(image, config=self.config)
+
+    def recognize_batch(self, images):
+        """OCR several images with one Tesseract process"""
+        return run_tesseract_batch(images, self.config)
+
+    def close(self):
+        pass
+
+
+class DigitsBackend(TesseractBackend):
+    """Tesseract restricted to digits and separators, which avoids letters
+    being read as look-alike digits and the other way round"""
+
+    name = 'tesseract-digits'
+    config = f"{OCR_CONFIG} -c tessedit_char_whitelist={DIGITS_WHITELIST}"
+
+
+class TesserocrBackend:
+    """In-process Tesseract API (tesserocr), no process or temp file per image"""
+
+    name = 'tesserocr'
+    config = 'psm=6'
+
+    @classmethod
+    def available(cls):
+        return tesserocr is not None
+
+    def __init__(self):
+        self.api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.SINGLE_BLOCK)
+
+    def recognize(self, image):
+        self.api.SetImage(image)
+        return self.api.GetUTF8Text()
+
+    def recognize_batch(self, images):
+        # Already in-process, so there is no start-up cost to amortize
+        return [self.recognize(image) for image in images]
+
+    def close(self):
+        self.api.End()
+
+
+OCR_BACKENDS = {backend.name: backend
+                for backend in (TesseractBackend, DigitsBackend, TesserocrBackend)}
+
+
+def available_backends():
+    """Names of the backends usable in this installation"""
+    return [name for name, backend in OCR_BACKENDS.items() if backend.available()]
+
+
+def make_backend(name):
+    """Create the OCR backend with the given name"""
+    backend = OCR_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    if not backend.available():
+        raise ValueError(f"OCR backend {name} is not installed")
+    return backend()
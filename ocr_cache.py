@@ -0,0 +1,114 @@
+# Part 3: OCR Result Cache (save as ocr_cache.py)
+
+import hashlib
+import os
+import pathlib
+import sqlite3
+import time
+
+CACHE_FILENAME = "ocr_cache.sqlite"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Bytes an entry's stored values take up, as counted against the cap
+ENTRY_BYTES = """(LENGTH(content_hash) + LENGTH(config_key) + LENGTH(CAST(text AS BLOB))
+                  + IFNULL(LENGTH(CAST(group_key AS BLOB)), 0))"""
+
+
+def connect_read_only(path):
+    """Open an SQLite database read-only. The path goes into a file: URI,
+    quoted so folder names with '#', '?' or '%' still name the same file"""
+    return sqlite3.connect(pathlib.Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """On-disk cache of OCR results keyed by file content hash.
+
+    Entries are only valid for the OCR configuration they were produced
+    with; opening the cache with a different config key drops everything
+    stored under the old one. The entries are capped at max_bytes of
+    stored data, evicting the least recently used ones first; SQLite
+    reuses the space they free, so the file stops growing near the cap.
+    """
+
+    def __init__(self, path, config_key, max_bytes=DEFAULT_MAX_BYTES, read_only=False):
+        self.path = path
+        self.config_key = config_key
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+
+        if read_only:
+            # Created by the process that hands out the work; if the table
+            # is missing, this is not that file and every lookup would fail
+            try:
+                self.conn = connect_read_only(path)
+                self.conn.execute("SELECT 1 FROM ocr_results LIMIT 0")
+            except sqlite3.Error as e:
+                raise RuntimeError(f"Cannot open the OCR cache {path}: {str(e)}")
+        else:
+            self.conn = sqlite3.connect(path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS ocr_results (
+                                     content_hash TEXT PRIMARY KEY,
+                                     config_key TEXT NOT NULL,
+                                     text TEXT NOT NULL,
+                                     group_key TEXT,
+                                     last_used REAL NOT NULL)""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON ocr_results (last_used)")
+            # Invalidate results produced with a different OCR config or pattern set
+            self.conn.execute("DELETE FROM ocr_results WHERE config_key != ?", (config_key,))
+            self.conn.commit()
+
+    def get(self, content_hash):
+        """Return (text, group_key) for a cached image, or None"""
+        row = self.conn.execute(
+            "SELECT text, group_key FROM ocr_results WHERE content_hash = ? AND config_key = ?",
+            (content_hash, self.config_key)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def put(self, content_hash, text, group_key):
+        """Store an OCR result (call commit() to persist)"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ocr_results VALUES (?, ?, ?, ?, ?)",
+            (content_hash, self.config_key, text, group_key, time.time()))
+
+    def touch(self, content_hash):
+        """Mark a cached entry as recently used"""
+        self.conn.execute("UPDATE ocr_results SET last_used = ? WHERE content_hash = ?",
+                          (time.time(), content_hash))
+
+    def evict(self):
+        """Drop the least recently used entries until the rest fit in
+        max_bytes, returns how many were dropped"""
+        # Running total from the most recently used entry down
+        return self.conn.execute(f"""DELETE FROM ocr_results WHERE content_hash IN (
+                                         SELECT content_hash FROM (
+                                             SELECT content_hash, SUM({ENTRY_BYTES}) OVER (
+                                                 ORDER BY last_used DESC, content_hash) AS kept
+                                             FROM ocr_results)
+                                         WHERE kept > ?)""", (self.max_bytes,)).rowcount
+
+    def commit(self):
+        if not self.read_only:
+            self.conn.commit()
+
+    def close(self):
+        if not self.read_only:
+            self.evict()
+            self.conn.commit()
+        self.conn.close()
+
+
+def default_cache_path(output_folder):
+    """Cache file location inside the output folder"""
+    return os.path.join(output_folder, CACHE_FILENAME)
@@ -0,0 +1,672 @@
+# Part 2: OCR Engine (save as ocr_engine.py)
+
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import count, islice
+from PIL import Image
+import pytesseract
+from ocr_cache import OCRCache, file_hash
+from ocr_backends import DEFAULT_BACKEND, OCR_CONFIG, likely_has_text, make_backend
+from patterns import DEFAULT_PATTERN_CONFIG, PatternSet
+from memory_budget import decoded_size, no_budget
+
+# Supported image extensions
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+# Preprocessing settings
+CONTRAST_FACTOR = 2.0
+
+
+# Named OCR regions as (left, top, right, bottom) fractions of the frame.
+# Regions are tried in the configured order and OCR stops at the first one
+# whose text matches a pattern.
+OCR_REGIONS = {
+    'full': (0.0, 0.0, 1.0, 1.0),
+    'top': (0.0, 0.0, 1.0, 0.5),
+    'bottom': (0.0, 0.5, 1.0, 1.0),
+    'top-left': (0.0, 0.0, 0.5, 0.5),
+    'top-right': (0.5, 0.0, 1.0, 0.5),
+    'bottom-left': (0.0, 0.5, 0.5, 1.0),
+    'bottom-right': (0.5, 0.5, 1.0, 1.0),
+}
+
+# Image preprocessing and OCR options for the workers; max_size caps the long
+# edge in pixels (None keeps full resolution), regions lists OCR_REGIONS names
+# or "left,top,right,bottom" fractions, backend names an ocr_backends backend
+# and prefilter skips OCR for images without any label-like edges
+DEFAULT_PREPROCESS = {
+    'max_size': None,
+    'regions': ['full'],
+    'backend': DEFAULT_BACKEND,
+    'prefilter': False,
+}
+
+# Where to look for the group key: the filename is a microsecond regex while
+# OCR costs seconds per image, so the "-first" strategies only run the second
+# source when the first one misses
+MATCH_STRATEGIES = ('ocr-first', 'filename-first', 'ocr-only', 'filename-only')
+DEFAULT_MATCH_STRATEGY = 'ocr-first'
+
+# Images per Tesseract invocation; 1 OCRs each image with its own process via
+# pytesseract, larger batches share one process to amortize its startup cost
+DEFAULT_BATCH_SIZE = 1
+
+# Per-process state, set up by init_worker
+_worker_cache = None
+_worker_preprocess = DEFAULT_PREPROCESS
+_worker_backend = None
+_worker_budget = None
+_worker_run = None   # Run whose settings are active, see use_run_config
+_worker_runs = {}    # Run id -> (preprocess, backend, patterns, cache) on a shared pool
+
+# Settings of this many runs are kept open per worker of a shared pool; the
+# backend and cache of the oldest are closed to make room for another
+MAX_WORKER_RUNS = 16
+
+# Group key patterns of this process, compiled once; see use_patterns
+_patterns = PatternSet(DEFAULT_PATTERN_CONFIG)
+
+
+def config_fingerprint(patterns=None, preprocess=None):
+    """Key identifying the OCR settings a cached result was produced with.
+
+    The patterns' multiple flag is left out: the cache keeps the text and
+    the first key, which it doesn't change (see lookup_cached).
+    """
+    patterns = {name: value for name, value in (patterns or DEFAULT_PATTERN_CONFIG).items()
+                if name != 'multiple'}
+    config = {
+        'ocr_config': OCR_CONFIG,
+        'contrast': CONTRAST_FACTOR,
+        'color': 'L',
+        'patterns': patterns,
+        'preprocess': preprocess or DEFAULT_PREPROCESS,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def default_worker_count():
+    """Number of OCR worker processes to use when none is configured"""
+    return max(1, os.cpu_count() or 1)
+
+
+def use_patterns(pattern_config=None):
+    """Compile the pattern config (see patterns.py) used by this process"""
+    global _patterns
+    _patterns = PatternSet(pattern_config or DEFAULT_PATTERN_CONFIG)
+    return _patterns
+
+
+def match_keys(text):
+    """Standardized group keys found in text (more than one only when the
+    pattern config allows multiple keys)"""
+    return _patterns.keys(text)
+
+
+def match_pattern(text):
+    """Return the standardized group key for the first pattern found in text"""
+    keys = _patterns.keys(text)
+    return keys[0] if keys else None
+
+
+def parse_region(spec):
+    """Turn a region name or "left,top,right,bottom" fractions into a box"""
+    if spec in OCR_REGIONS:
+        return OCR_REGIONS[spec]
+    try:
+        box = tuple(float(part) for part in spec.split(','))
+    except ValueError:
+        box = ()
+    if len(box) != 4 or not (0 <= box[0] < box[2] <= 1 and 0 <= box[1] < box[3] <= 1):
+        raise ValueError(f"Invalid OCR region: {spec}")
+    return box
+
+
+def split_regions(text):
+    """Split a list of region specs separated by spaces or semicolons"""
+    return [spec for spec in re.split(r'[;\s]+', text) if spec]
+
+
+def load_for_ocr(img_path, max_size=None):
+    """Open an image as grayscale, downscaled so its long edge fits max_size.
+
+    Tesseract binarizes a grayscale version anyway, so one byte per pixel
+    is all that is kept. For JPEGs Image.draft lets the decoder produce
+    grayscale at a reduced scale directly, so big camera photos are never
+    decoded in colour at full resolution. The file is closed on return.
+    """
+    with Image.open(img_path) as source:
+        source.draft('L', (max_size, max_size) if max_size else source.size)
+        image = source.convert('L')
+
+    if max_size and max(image.size) > max_size:
+        image.thumbnail((max_size, max_size))
+    return image
+
+
+def enhance_contrast(image, factor=CONTRAST_FACTOR):
+    """Stretch a grayscale image's contrast around its mean in one pass.
+
+    Gives the same pixels as ImageEnhance.Contrast, but through a lookup
+    table instead of blending with a full-size gray copy of the image.
+    """
+    histogram = image.histogram()
+    mean = int(sum(level * count for level, count in enumerate(histogram)) / sum(histogram) + 0.5)
+    return image.point([min(255, max(0, int(mean + factor * (level - mean)))) for level in range(256)])
+
+
+def crop_region(image, box):
+    """Crop an image to a fractional (left, top, right, bottom) box"""
+    if box == OCR_REGIONS['full']:
+        return image
+    width, height = image.size
+    left, top, right, bottom = box
+    return image.crop((int(left * width), int(top * height),
+                       int(right * width), int(bottom * height)))
+
+
+def init_worker(tesseract_cmd, cache_path=None, config_key=None, preprocess=None,
+                pattern_config=None, memory_budget=None):
+    """Process pool initializer, carries the Tesseract path, preprocessing
+    settings, group key patterns and shared memory budget into each worker
+    and opens a read-only connection to the OCR cache if one is in use"""
+    global _worker_cache, _worker_preprocess, _worker_backend, _worker_budget
+    # Ctrl+C is handled by the parent, which lets in-flight images finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    _worker_preprocess = dict(DEFAULT_PREPROCESS, **(preprocess or {}))
+    _worker_backend = make_backend(_worker_preprocess['backend'])
+    use_patterns(pattern_config)
+    _worker_budget = memory_budget
+    if cache_path:
+        _worker_cache = OCRCache(cache_path, config_key, read_only=True)
+
+
+def use_run_config(config):
+    """Switch a shared pool worker to the settings of the run a task
+    belongs to; each run's backend, patterns and cache connection are set
+    up once per worker and kept for its later tasks"""
+    global _worker_run, _worker_cache, _worker_preprocess, _worker_backend, _patterns
+    run_id, cache_path, config_key, preprocess, pattern_config = config
+    if run_id == _worker_run:
+        return
+    state = _worker_runs.get(run_id)
+    if state is None:
+        if len(_worker_runs) >= MAX_WORKER_RUNS:
+            _, backend, _, cache = _worker_runs.pop(next(iter(_worker_runs)))
+            backend.close()
+            if cache:
+                cache.close()
+        run_preprocess = dict(DEFAULT_PREPROCESS, **(preprocess or {}))
+        state = (run_preprocess,
+                 make_backend(run_preprocess['backend']),
+                 PatternSet(pattern_config or DEFAULT_PATTERN_CONFIG),
+                 OCRCache(cache_path, config_key, read_only=True) if cache_path else None)
+        _worker_runs[run_id] = state
+    _worker_preprocess, _worker_backend, _patterns, _worker_cache = state
+    _worker_run = run_id
+
+
+def ocr_run_task(config, items, input_folder, filename_fallback, batched):
+    """OCR images of one run on a shared pool (see SharedOCRPool)"""
+    use_run_config(config)
+    if batched:
+        return ocr_batch(items, input_folder, filename_fallback)
+    index, img_file, content_hash = split_item(items[0])
+    return [ocr_image(index, input_folder, img_file, filename_fallback, content_hash)]
+
+
+def new_result(index, img_file):
+    """Empty match result for one image"""
+    return {
+        'index': index,
+        'file': img_file,
+        'text': '',
+        'key': None,
+        'keys': [],
+        'source': None,
+        'hash': None,
+        'cached': False,
+        'resumed': False,
+        'prefiltered': False,
+        'duplicate_of': None,
+        'duplicate_distance': None,
+        'ocr_run': False,
+        'region': None,
+        'timings': {},
+        'error': None,
+    }
+
+
+def set_keys(result, keys, source, region=None):
+    """Record the group keys of a match; 'key' is the first of them"""
+    result['keys'] = keys
+    result['key'] = keys[0]
+    result['source'] = source
+    result['region'] = region
+
+
+def add_timing(result, stage, started):
+    """Add the time since started to a result's stage timing, returns now"""
+    now = time.perf_counter()
+    result['timings'][stage] = result['timings'].get(stage, 0.0) + (now - started)
+    return now
+
+
+def worker_backend():
+    """The OCR backend of this process, created on first use outside a pool"""
+    global _worker_backend
+    if _worker_backend is None:
+        _worker_backend = make_backend(_worker_preprocess['backend'])
+    return _worker_backend
+
+
+def reserve_memory(img_paths):
+    """Wait for room in the memory budget to decode the given images"""
+    if _worker_budget is None:
+        return no_budget(0)
+    total = 0
+    for img_path in img_paths:
+        try:
+            total += decoded_size(img_path, _worker_preprocess['max_size'])
+        except Exception:
+            pass  # Unreadable files fail properly when they are decoded
+    return _worker_budget.reserve(total)
+
+
+def prefilter_skips(result, image):
+    """True when the pre-filter rules out a label, so OCR can be skipped"""
+    if not _worker_preprocess['prefilter']:
+        return False
+    started = time.perf_counter()
+    skip = not likely_has_text(image)
+    add_timing(result, 'prefilter', started)
+    result['prefiltered'] = skip
+    return skip
+
+
+def match_filename(index, img_file):
+    """Match an image by its filename alone, without opening it"""
+    return finish_match(new_result(index, img_file))
+
+
+def split_item(item):
+    """(index, img_file, content hash or None) of a work item; the hash is
+    passed along when it was already computed, e.g. for dedup"""
+    return item if len(item) == 3 else (item[0], item[1], None)
+
+
+def lookup_cached(result, img_path, content_hash=None):
+    """Fill in a previous OCR result for identical file contents.
+
+    Returns True on a cache hit; does nothing when no cache is open. The
+    file is only hashed if content_hash isn't given.
+    """
+    if content_hash:
+        result['hash'] = content_hash
+    if _worker_cache is None:
+        return False
+    if not content_hash:
+        started = time.perf_counter()
+        result['hash'] = file_hash(img_path)
+        add_timing(result, 'hash', started)
+    cached = _worker_cache.get(result['hash'])
+    if cached is None:
+        return False
+    result['text'], key = cached
+    result['cached'] = True
+    if key:
+        # The cache keeps the first key; others are cheap to find again
+        keys = match_keys(result['text']) if _patterns.multiple else []
+        set_keys(result, keys if key in keys else [key], 'ocr')
+    return True
+
+
+def ocr_image(index, input_folder, img_file, filename_fallback=True, content_hash=None):
+    """OCR a single image and match it against the patterns.
+
+    Runs inside a worker process, so it only takes and returns plain
+    picklable values. With filename_fallback the filename is tried when
+    the OCR text has no match. Time spent in each stage is returned in
+    result['timings']. Decoding waits for room in the memory budget, if
+    one is set, and the image is closed as soon as OCR is done with it.
+    content_hash, if known, saves hashing the file for the OCR cache.
+    """
+    result = new_result(index, img_file)
+    try:
+        img_path = os.path.join(input_folder, img_file)
+
+        # Reuse a previous OCR result for identical file contents
+        if lookup_cached(result, img_path, content_hash):
+            return finish_match(result) if filename_fallback else result
+
+        with reserve_memory([img_path]):
+            # Open and preprocess image
+            started = time.perf_counter()
+            image = load_for_ocr(img_path, _worker_preprocess['max_size'])
+            started = add_timing(result, 'decode', started)
+            try:
+                if prefilter_skips(result, image):
+                    return finish_match(result) if filename_fallback else result
+                started = time.perf_counter()
+
+                texts = []
+                for region in _worker_preprocess['regions']:
+                    # Enhance image for better OCR
+                    region_image = enhance_contrast(crop_region(image, parse_region(region)))
+                    started = add_timing(result, 'enhance', started)
+
+                    # Extract text with the configured OCR backend
+                    text = worker_backend().recognize(region_image)
+                    region_image.close()
+                    texts.append(text)
+                    result['ocr_run'] = True
+                    started = add_timing(result, 'ocr', started)
+
+                    keys = match_keys(text)
+                    started = add_timing(result, 'regex', started)
+                    if keys:
+                        set_keys(result, keys, 'ocr', region)
+                        break
+                result['text'] = "\n".join(texts)
+            finally:
+                image.close()
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+
+    return finish_match(result) if filename_fallback else result
+
+
+def ocr_batch(items, input_folder, filename_fallback=True):
+    """OCR a batch of images, one backend batch per region. Items are
+    (index, img_file) or (index, img_file, content hash).
+
+    The batched counterpart of ocr_image: cache hits, unreadable images and
+    images ruled out by the pre-filter drop out first, then the remaining
+    images go through the OCR backend together (a single Tesseract process
+    for the command line backends), region by region, until each has
+    matched. If the batch run fails, that region falls back to one call per
+    image so a single bad file does not fail the whole batch. The OCR time
+    of a batch is split evenly over its images. Returns results in item
+    order.
+    """
+    results = []
+    to_decode = []
+    for item in items:
+        index, img_file, content_hash = split_item(item)
+        result = new_result(index, img_file)
+        results.append(result)
+        img_path = os.path.join(input_folder, img_file)
+        try:
+            if lookup_cached(result, img_path, content_hash):
+                continue
+        except Exception as e:
+            result['error'] = str(e)
+            continue
+        to_decode.append((result, img_path))
+
+    # The whole batch is reserved at once: holding part of the budget while
+    # waiting for more could deadlock against the other workers
+    with reserve_memory([img_path for _, img_path in to_decode]):
+        pending = []  # [result, image, texts] still looking for a match
+        for result, img_path in to_decode:
+            started = time.perf_counter()
+            try:
+                image = load_for_ocr(img_path, _worker_preprocess['max_size'])
+            except Exception as e:
+                result['error'] = str(e)
+                continue
+            add_timing(result, 'decode', started)
+            if prefilter_skips(result, image):
+                image.close()
+                continue
+            pending.append([result, image, []])
+
+        try:
+            for region in _worker_preprocess['regions']:
+                if not pending:
+                    break
+                box = parse_region(region)
+                region_images = []
+                for result, image, _ in pending:
+                    started = time.perf_counter()
+                    region_images.append(enhance_contrast(crop_region(image, box)))
+                    add_timing(result, 'enhance', started)
+
+                started = time.perf_counter()
+                try:
+                    texts = worker_backend().recognize_batch(region_images)
+                except Exception:
+                    texts = None
+                share = (time.perf_counter() - started) / len(pending)
+
+                still_pending = []
+                for number, entry in enumerate(pending):
+                    result, image, region_texts = entry
+                    started = time.perf_counter() - share
+                    if texts is not None:
+                        text = texts[number]
+                    else:
+                        try:
+                            text = worker_backend().recognize(region_images[number])
+                        except Exception as e:
+                            result['error'] = str(e)
+                            image.close()
+                            continue
+                    add_timing(result, 'ocr', started)
+                    region_texts.append(text)
+                    result['text'] = "\n".join(region_texts)
+                    result['ocr_run'] = True
+
+                    started = time.perf_counter()
+                    keys = match_keys(text)
+                    add_timing(result, 'regex', started)
+                    if keys:
+                        set_keys(result, keys, 'ocr', region)
+                        image.close()
+                    else:
+                        still_pending.append(entry)
+                for region_image in region_images:
+                    region_image.close()
+                pending = still_pending
+        finally:
+            for _, image, _ in pending:
+                image.close()
+
+    if filename_fallback:
+        return [finish_match(result) if not result['error'] else result for result in results]
+    return results
+
+
+def finish_match(result):
+    """Fall back to the filename when no pattern was found yet"""
+    if not result['key']:
+        started = time.perf_counter()
+        keys = match_keys(os.path.basename(result['file']))
+        add_timing(result, 'regex', started)
+        if keys:
+            set_keys(result, keys, 'filename')
+    return result
+
+
+def run_ocr_pool(input_folder, items, max_workers=None, max_in_flight=None,
+                 cache_path=None, config_key=None, filename_fallback=True, preprocess=None,
+                 batch_size=DEFAULT_BATCH_SIZE, pattern_config=None, memory_budget=None):
+    """OCR images on a process pool, yielding results as they finish.
+
+    items is an iterable of (index, img_file) or (index, img_file, content
+    hash) tuples. At most max_in_flight tasks are submitted at any time
+    (defaults to twice the worker count) so huge folders don't queue thousands of futures up front. Results arrive in
+    completion order; each carries its 'index' so callers can rebuild a
+    deterministic ordering.
+
+    When cache_path is given, workers look results up in the OCR cache by
+    content hash and skip Tesseract on a hit; storing new results is left to
+    the caller, which owns the writable connection. preprocess overrides
+    DEFAULT_PREPROCESS for downscaling and region cropping. With a
+    batch_size above 1 each task is a batch of that many images OCR'd by a
+    single Tesseract process (see ocr_batch). pattern_config replaces the
+    built-in group key patterns in the workers. memory_budget (a
+    memory_budget.MemoryBudget) limits how much decoded image data all
+    workers together hold at once.
+    """
+    max_workers = max_workers or default_worker_count()
+    max_in_flight = max(max_in_flight or max_workers * 2, max_workers)
+    batch_size = max(1, batch_size or 1)
+    if cache_path:
+        # Fail here with the reason rather than in every worker's initializer
+        OCRCache(cache_path, config_key, read_only=True).close()
+
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=init_worker,
+                             initargs=(pytesseract.pytesseract.tesseract_cmd,
+                                       cache_path, config_key, preprocess,
+                                       pattern_config, memory_budget)) as executor:
+        pending = set()
+        files = iter(items)
+        exhausted = False
+
+        while pending or not exhausted:
+            # Top up the pool to the in-flight limit
+            while not exhausted and len(pending) < max_in_flight:
+                batch = []
+                while len(batch) < batch_size:
+                    try:
+                        batch.append(next(files))
+                    except StopIteration:
+                        exhausted = True
+                        break
+                if not batch:
+                    break
+                if batch_size == 1:
+                    index, img_file, content_hash = split_item(batch[0])
+                    pending.add(executor.submit(ocr_image, index, input_folder, img_file,
+                                                filename_fallback, content_hash))
+                else:
+                    pending.add(executor.submit(ocr_batch, batch, input_folder, filename_fallback))
+
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if batch_size == 1:
+                    yield future.result()
+                else:
+                    yield from future.result()
+
+
+def shared_pool_context():
+    """multiprocessing context for SharedOCRPool workers.
+
+    The pool is created and grown while other threads run (the app's UI,
+    the job queue's jobs), and a worker forked then could inherit a lock
+    another thread held at that moment and hang. Workers are therefore
+    forked from a clean server process (forkserver) where available and
+    spawned elsewhere.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class SharedOCRPool:
+    """One OCR process pool shared by several runs going at once.
+
+    run() takes the same arguments as run_ocr_pool and yields results the
+    same way, so each run keeps its own preprocessing, patterns and OCR
+    cache; the workers switch between them per task (see use_run_config).
+    At most max_in_flight tasks are queued on the pool, and a free slot
+    goes to the waiting run with the fewest tasks in flight, so runs get
+    an even share of the workers while they all have images to OCR and a
+    run left alone gets all of them. The memory budget is the pool's, the
+    one passed to run() is ignored; it has to be made with the pool's
+    context (see shared_pool_context).
+    """
+
+    def __init__(self, max_workers=None, max_in_flight=None, memory_budget=None, context=None):
+        self.max_workers = max_workers or default_worker_count()
+        self.max_in_flight = max(max_in_flight or self.max_workers * 2, self.max_workers)
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                            mp_context=context or shared_pool_context(),
+                                            initializer=init_worker,
+                                            initargs=(pytesseract.pytesseract.tesseract_cmd,
+                                                      None, None, None, None, memory_budget))
+        self.cond = threading.Condition()
+        self.run_ids = count(1)
+        self.in_flight = {}   # Run id -> its tasks on the pool
+        self.waiting = set()  # Runs with a task ready to submit
+        self.total = 0
+
+    def may_submit(self, run_id):
+        return (self.total < self.max_in_flight
+                and self.in_flight[run_id] == min(self.in_flight[other] for other in self.waiting))
+
+    def run(self, input_folder, items, max_workers=None, max_in_flight=None,
+            cache_path=None, config_key=None, filename_fallback=True, preprocess=None,
+            batch_size=DEFAULT_BATCH_SIZE, pattern_config=None, memory_budget=None):
+        batch_size = max(1, batch_size or 1)
+        with self.cond:
+            run_id = next(self.run_ids)
+            self.in_flight[run_id] = 0
+        config = (run_id, cache_path, config_key, preprocess, pattern_config)
+        finished = deque()
+        submitted = set()
+
+        def on_done(future):
+            with self.cond:
+                self.total -= 1
+                self.in_flight[run_id] -= 1
+                finished.append(future)
+                self.cond.notify_all()
+
+        files = iter(items)
+        batch = None
+        exhausted = False
+        try:
+            while True:
+                if batch is None and not exhausted:
+                    batch = list(islice(files, batch_size)) or None
+                    exhausted = batch is None
+                if batch is None and not submitted:
+                    break
+                with self.cond:
+                    if batch:
+                        self.waiting.add(run_id)
+                    while not finished and not (batch and self.may_submit(run_id)):
+                        self.cond.wait()
+                    submit = bool(batch) and self.may_submit(run_id)
+                    self.waiting.discard(run_id)
+                    if submit:
+                        self.total += 1
+                        self.in_flight[run_id] += 1
+                    done = list(finished)
+                    finished.clear()
+                    self.cond.notify_all()  # The runs waiting behind this one may go now
+                if submit:
+                    future = self.executor.submit(ocr_run_task, config, batch, input_folder,
+                                                  filename_fallback, batch_size > 1)
+                    submitted.add(future)
+                    future.add_done_callback(on_done)
+                    batch = None
+                for future in done:
+                    submitted.discard(future)
+                    yield from future.result()
+        finally:
+            # Abandoned early: drop the tasks not started yet
+            for future in submitted:
+                future.cancel()
+            with self.cond:
+                self.waiting.discard(run_id)
+                self.cond.notify_all()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,137 @@
+# Part 13: Group Key Patterns (save as patterns.py)
+#
+# A patterns file is JSON, e.g.
+#
+#     {
+#       "normalize": ["join-digit-spaces", "digit-lookalikes"],
+#       "patterns": [
+#         {"name": "acme", "regex": "ACME[- ]?(\\d{6})", "format": "ACME-{1}"},
+#         {"name": "default", "regex": "([1-2])[-_]?(\\d{9,})", "format": "{1}-{2}"}
+#       ]
+#     }
+#
+# "normalize" names rules from NORMALIZERS applied to the text before
+# matching. Each pattern's "format" builds the group key from its match:
+# {0} is the whole match, {1}, {2}, ... its groups. Patterns must not use
+# numbered backreferences, since all of them are compiled into one regex.
+
+import json
+import re
+
+DEFAULT_FORMAT = "{0}"
+
+# Built-in patterns, used when no patterns file is configured: a 1 or 2, an
+# optional separator and 9 or more digits, standardized as "1-123456789"
+DEFAULT_PATTERN_CONFIG = {
+    'normalize': [],
+    'patterns': [
+        {'name': 'default', 'regex': r'([1-2])[-_]?(\d{9,})', 'format': "{1}-{2}"},
+    ],
+}
+
+# Letters OCR commonly reads in place of digits
+LOOKALIKE_DIGITS = str.maketrans({'O': '0', 'o': '0', 'D': '0', 'I': '1', 'l': '1', '|': '1',
+                                  'S': '5', 'B': '8'})
+
+
+def fix_digit_lookalikes(text):
+    """Read look-alike letters as digits inside runs that are mostly digits"""
+    def fix(match):
+        run = match.group(0)
+        if sum(char.isdigit() for char in run) * 2 <= len(run):
+            return run
+        return run.translate(LOOKALIKE_DIGITS)
+    return re.sub(r'[\dOoDIl|SB]{3,}', fix, text)
+
+
+def join_digit_spaces(text):
+    """Remove spaces OCR inserted between the digits of a number"""
+    return re.sub(r'(?<=\d)[ \t]+(?=\d)', '', text)
+
+
+# Named text normalization rules for the "normalize" list
+NORMALIZERS = {
+    'digit-lookalikes': fix_digit_lookalikes,
+    'join-digit-spaces': join_digit_spaces,
+    'uppercase': str.upper,
+}
+
+
+class PatternSet:
+    """Patterns compiled into one alternation, so matching a text is a
+    single scan however many patterns there are.
+
+    The leftmost match in the text wins; when several patterns match at the
+    same position the one listed first does. With multiple set, every
+    distinct key found in the text is returned, in text order.
+    """
+
+    def __init__(self, config):
+        self.multiple = bool(config.get('multiple', False))
+        try:
+            self.rules = [NORMALIZERS[name] for name in config.get('normalize', [])]
+        except KeyError as e:
+            raise ValueError(f"Unknown normalization rule: {e.args[0]}")
+        if not config.get('patterns'):
+            raise ValueError("At least one pattern is required")
+
+        parts = []
+        self.entries = {}  # Group number of each pattern's wrapper -> (format, group count)
+        group = 1
+        for pattern in config['patterns']:
+            try:
+                groups = re.compile(pattern['regex']).groups
+            except (KeyError, TypeError, re.error) as e:
+                raise ValueError(f"Invalid pattern {pattern.get('name', pattern)}: {str(e)}")
+            key_format = pattern.get('format', DEFAULT_FORMAT)
+            try:
+                key_format.format(*[''] * (groups + 1))
+            except (IndexError, KeyError, ValueError):
+                raise ValueError(f"Invalid format for pattern {pattern.get('name', pattern['regex'])}: "
+                                 f"{key_format}")
+            parts.append(f"({pattern['regex']})")
+            self.entries[group] = (key_format, groups)
+            group += groups + 1
+        try:
+            self.regex = re.compile("|".join(parts))
+        except re.error as e:
+            raise ValueError(f"Patterns cannot be combined: {str(e)}")
+
+    def normalize(self, text):
+        for rule in self.rules:
+            text = rule(text)
+        return text
+
+    def format_key(self, match):
+        # The wrapper closes last, so it is the match's last group
+        start = match.lastindex
+        key_format, groups = self.entries[start]
+        return key_format.format(*[match.group(start + offset) or ''
+                                   for offset in range(groups + 1)])
+
+    def keys(self, text):
+        """Group keys found in text, at most one unless multiple is set"""
+        keys = []
+        for match in self.regex.finditer(self.normalize(text)):
+            key = self.format_key(match)
+            if key not in keys:
+                keys.append(key)
+            if not self.multiple:
+                break
+        return keys
+
+
+def load_pattern_config(path=None):
+    """Read and validate a patterns file, or the built-in patterns if no path"""
+    if not path:
+        return dict(DEFAULT_PATTERN_CONFIG)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Could not read patterns file {path}: {str(e)}")
+    if not isinstance(config, dict):
+        raise ValueError(f"Patterns file {path} must contain a JSON object")
+    config = {'normalize': config.get('normalize', []), 'patterns': config.get('patterns', [])}
+    PatternSet(config)
+    return config
@@ -0,0 +1,758 @@
+# Part 4: Processing Pipeline (save as photo_pipeline.py)
+#
+# The scan -> OCR -> group -> PPTX pipeline, free of any Tkinter imports so it
+# can be driven both by the desktop app and by the headless command line.
+
+import bisect
+import datetime
+import heapq
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from ocr_engine import (DEFAULT_BATCH_SIZE, DEFAULT_MATCH_STRATEGY, DEFAULT_PREPROCESS,
+                        MATCH_STRATEGIES, config_fingerprint, default_worker_count, match_filename,
+                        new_result, parse_region, run_ocr_pool, use_patterns)
+from ocr_backends import available_backends
+from ocr_cache import OCRCache, default_cache_path, file_hash
+from patterns import load_pattern_config
+from memory_budget import MemoryBudget
+from dedup import (DEDUP_MODES, DEFAULT_DEDUP, DEFAULT_THRESHOLD, HASH_BITS, DuplicateFinder,
+                   collect_duplicates, duplicate_result, fingerprint_ahead, same_match)
+from checkpoint import RunCancelled, RunJournal, checkpoint_path, file_signature, run_fingerprint
+from deck_builder import GroupFeed, build_deck, build_sharded_decks, build_streamed_deck
+from embed_images import DEFAULT_EMBED
+from slide_layout import DEFAULT_LAYOUT
+from instrumentation import RunTimings
+from scanner import scan_images
+from result_export import export_results, load_results
+
+DEFAULT_SETTINGS = {
+    'workers': None,                          # None uses one worker per CPU
+    'use_cache': True,                        # Reuse OCR results for unchanged files
+    'match_strategy': DEFAULT_MATCH_STRATEGY, # One of ocr_engine.MATCH_STRATEGIES
+    'patterns_file': None,                    # JSON group key patterns, None for the built-in ones
+    'multi_group': False,                     # Add a photo to every group whose key it shows
+    'dedup': DEFAULT_DEDUP,                   # One of dedup.DEDUP_MODES
+    'dedup_threshold': DEFAULT_THRESHOLD,     # Perceptual hash bits near-duplicates may differ in
+    'ocr_max_size': DEFAULT_PREPROCESS['max_size'],  # Long edge in pixels, None for full size
+    'ocr_regions': DEFAULT_PREPROCESS['regions'],    # Regions tried in order until a match
+    'ocr_batch_size': DEFAULT_BATCH_SIZE,     # Images per Tesseract process, 1 runs one per image
+    'ocr_backend': DEFAULT_PREPROCESS['backend'],    # One of ocr_backends.OCR_BACKENDS
+    'ocr_prefilter': DEFAULT_PREPROCESS['prefilter'],  # Skip OCR for images without label-like edges
+    'memory_budget_mb': 0,                    # Cap on decoded image data across OCR workers, 0 for none
+    'recursive': False,                       # Descend into subfolders of the input folder
+    'include': [],                            # Glob patterns an image must match
+    'exclude': [],                            # Glob patterns for images/subfolders to skip
+    'output_name': "organized_photos.pptx",   # May use {folder}, {date}, {timestamp}
+    'incremental': False,                     # Update the previous deck instead of rebuilding it
+    'embed_dpi': DEFAULT_EMBED['dpi'],        # Shrink photos to their slot at this DPI, 0 embeds originals
+    'embed_quality': DEFAULT_EMBED['quality'],  # JPEG quality for shrunk photos
+    'max_photos_per_slide': DEFAULT_LAYOUT['max_per_slide'],  # Larger groups continue on more slides, 0 for no limit
+    'pipeline': False,                        # Build slides of settled groups while OCR runs
+    'group_gap': 20,                          # A group settles once this many images past its last are matched
+    'shard_slides': 0,                        # Start a new deck every N slides, 0 for one deck
+    'shard_mb': 0,                            # Start a new deck at X MB of embedded media, 0 for no limit
+    'timings_log': None,                      # Export stage timings to this .json or .csv file
+    'export_results': None,                   # Export every photo's match to this .jsonl file
+    'results_index': False,                   # Also write an SQLite index of the export
+    'resume': True,                           # Pick up an interrupted run from its checkpoint
+    'verbose': False,                         # Also log every photo's OCR text and each group's photos
+}
+
+
+MANUAL_KEYS_FILENAME = "manual_keys.json"
+
+# Cache writes made before each commit of the OCR cache
+CACHE_COMMIT_EVERY = 100
+
+
+def make_settings(**overrides):
+    """Return a copy of the default settings with overrides applied"""
+    settings = dict(DEFAULT_SETTINGS)
+    for name, value in overrides.items():
+        if name not in settings:
+            raise ValueError(f"Unknown setting: {name}")
+        settings[name] = value
+    if settings['match_strategy'] not in MATCH_STRATEGIES:
+        raise ValueError(f"Unknown match strategy: {settings['match_strategy']}")
+    if not settings['ocr_regions']:
+        raise ValueError("At least one OCR region is required")
+    for region in settings['ocr_regions']:
+        parse_region(region)
+    load_pattern_config(settings['patterns_file'])
+    if settings['ocr_batch_size'] < 1:
+        raise ValueError("OCR batch size must be at least 1")
+    if settings['dedup'] not in DEDUP_MODES:
+        raise ValueError(f"Unknown duplicate mode: {settings['dedup']}")
+    if not 0 <= settings['dedup_threshold'] <= HASH_BITS:
+        raise ValueError(f"Duplicate threshold must be between 0 and {HASH_BITS}")
+    if settings['memory_budget_mb'] < 0:
+        raise ValueError("Memory budget cannot be negative")
+    if settings['ocr_backend'] not in available_backends():
+        raise ValueError(f"OCR backend not available: {settings['ocr_backend']}")
+    if settings['max_photos_per_slide'] < 0:
+        raise ValueError("Photos per slide cannot be negative")
+    if settings['incremental'] and (settings['shard_slides'] or settings['shard_mb']):
+        raise ValueError("Incremental updates are not supported with sharded output")
+    if settings['group_gap'] < 0:
+        raise ValueError("Group gap cannot be negative")
+    if settings['pipeline'] and (settings['shard_slides'] or settings['shard_mb']):
+        raise ValueError("Pipelined slide building is not supported with sharded output")
+    if settings['results_index'] and not settings['export_results']:
+        raise ValueError("A results index needs a results export file")
+    return settings
+
+
+def preprocess_settings(settings):
+    """OCR preprocessing options in the form the OCR engine expects"""
+    return {
+        'max_size': settings['ocr_max_size'] or None,
+        'regions': list(settings['ocr_regions']),
+        'backend': settings['ocr_backend'],
+        'prefilter': bool(settings['ocr_prefilter']),
+    }
+
+
+def pattern_settings(settings):
+    """Group key pattern config for the OCR engine"""
+    return dict(load_pattern_config(settings['patterns_file']), multiple=bool(settings['multi_group']))
+
+
+def deck_settings(settings):
+    """Embed and layout options for the deck builder, as (embed, layout)"""
+    embed = {'dpi': settings['embed_dpi'],
+             'quality': settings['embed_quality'],
+             'workers': settings['workers']}
+    layout = {'max_per_slide': settings['max_photos_per_slide']}
+    return embed, layout
+
+
+def manual_keys_path(output_folder):
+    """Manual group key assignments stored in the output folder"""
+    return os.path.join(output_folder, MANUAL_KEYS_FILENAME)
+
+
+def load_manual_keys(output_folder, input_folder, log=print):
+    """Group keys assigned to photos by hand, as {photo: key}.
+
+    They override whatever OCR or the filename matched, in every later run
+    on the same input folder.
+    """
+    path = manual_keys_path(output_folder)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log(f"Ignoring unreadable manual keys {path}: {str(e)}")
+        return {}
+    if data.get('input_folder') != os.path.abspath(input_folder):
+        return {}
+    return data.get('keys', {})
+
+
+def save_manual_keys(output_folder, input_folder, keys):
+    os.makedirs(output_folder, exist_ok=True)
+    path = manual_keys_path(output_folder)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'input_folder': os.path.abspath(input_folder), 'keys': keys}, f,
+                  indent=1, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def log_ocr_result(result, log=print, verbose=False):
+    """Report how a single photo was matched; its OCR text only if verbose"""
+    img_file = result['file']
+    if result['error']:
+        log(f"Error processing {img_file}: {result['error']}")
+    elif result['duplicate_of'] and result['duplicate_distance'] is None:
+        log(f"{img_file} duplicates {result['duplicate_of']}, reusing its match")
+    elif result['duplicate_of']:
+        log(f"{img_file} is a near-duplicate of {result['duplicate_of']} with the same match")
+    elif result['resumed']:
+        log(f"Resumed {img_file} from checkpoint")
+    elif result['prefiltered']:
+        log(f"Skipped OCR for {img_file}, no label found by the pre-filter")
+    elif result['cached'] and verbose:
+        log(f"Cached OCR Text for {img_file}: {result['text']}")
+    elif result['ocr_run'] and verbose:
+        log(f"OCR Text for {img_file}: {result['text']}")
+
+    keys = ", ".join(result['keys'])
+    if result['source'] == 'manual':
+        log(f"Assigned {keys} to {img_file} by hand")
+    elif result['source'] == 'ocr':
+        log(f"Found pattern {keys} in {img_file}")
+    elif result['source'] == 'filename':
+        log(f"Found pattern {keys} in filename {img_file}")
+    else:
+        log(f"No pattern match found in {img_file}")
+
+
+def run_ocr_stage(input_folder, output_folder, image_files, settings, progress_callback=None, log=print,
+                  timings=None, journal=None, cancel_event=None, on_result=None, ocr_pool=None):
+    """Match every image and return (results in scan order, match stats).
+
+    image_files may be a generator: images are handed to the OCR pool as
+    they are discovered and the progress total grows as the scan proceeds.
+    Depending on the match strategy, filenames are tried first in this
+    process and only the images that still need OCR go to the worker pool.
+
+    With settings['dedup'] on, each image is first checked for being a
+    duplicate of one seen earlier; exact copies skip matching and copy their
+    representative's result once it arrives. Near-duplicates are matched as
+    usual and collapsed onto their representative only if both got the
+    same keys. Photos found unchanged in the
+    checkpoint journal reuse their recorded match, and every other new
+    match is journalled. Keys assigned by hand (see load_manual_keys)
+    replace the match of their photos. Once cancel_event is set no
+    further images are started; those already in flight are finished and
+    journalled before RunCancelled is raised.
+
+    on_result, if given, is called with every result as it is reported,
+    duplicates included. ocr_pool (an ocr_engine.SharedOCRPool) runs the
+    OCR on a pool shared with other runs instead of one of its own.
+    """
+    max_workers = settings['workers'] or default_worker_count()
+    strategy = settings['match_strategy']
+    preprocess = preprocess_settings(settings)
+    pattern_config = pattern_settings(settings)
+    use_patterns(pattern_config)  # For the filename pass in this process
+    manual_keys = load_manual_keys(output_folder, input_folder, log)
+    stats = {'cache_hits': 0, 'cache_misses': 0, 'ocr_runs': 0, 'resumed': 0, 'prefiltered': 0,
+             'duplicates': 0}
+    results = {}
+    scanned = 0
+    done = 0
+
+    finder = None
+    if settings['dedup'] != 'off':
+        finder = DuplicateFinder(settings['dedup'], settings['dedup_threshold'], log=log)
+    dedup_seconds = {}                # Index -> time spent on its duplicate check
+    waiting = defaultdict(list)       # Representative index -> exact copies awaiting its result
+    near = {}                         # Index -> (representative index, distance) of near-duplicates
+    signatures = {}                   # Index -> file signature taken before matching, for the journal
+    held = defaultdict(list)          # Representative index -> matched near-duplicates awaiting it
+
+    def report(result):
+        index = result['index']
+        results[index] = result
+        if index in dedup_seconds:
+            result['timings']['dedup'] = dedup_seconds.pop(index)
+        signature = signatures.pop(index, None)
+        if (journal and signature and not result['resumed'] and not result['error']
+                and not result['duplicate_of']):
+            journal.record(result, signature)
+        # Applied after journalling, so the journal only ever holds real matches
+        if result['file'] in manual_keys:
+            key = manual_keys[result['file']]
+            result.update(key=key, keys=[key], source='manual')
+        if index in near:
+            original, distance = near.pop(index)
+            if original not in results:
+                held[original].append((result, distance))
+                return
+            collapse(result, results[original], distance)
+        announce(result)
+
+    def collapse(result, original, distance):
+        if same_match(result, original):
+            result.update(duplicate_of=original['file'], duplicate_distance=distance)
+            stats['duplicates'] += 1
+
+    def announce(result):
+        nonlocal done
+        index = result['index']
+        log_ocr_result(result, log, settings['verbose'])
+        done += 1
+        if timings:
+            timings.add_image(result['file'], result['timings'])
+        # Update progress against the images discovered so far
+        if progress_callback:
+            progress_callback((done / scanned) * 50)
+        if on_result:
+            on_result(result)
+        for dup_index, dup_file in waiting.pop(index, []):
+            report(duplicate_result(dup_index, dup_file, result))
+        for near_result, distance in held.pop(index, []):
+            collapse(near_result, result, distance)
+            announce(near_result)
+
+    def needs_ocr():
+        # Filename pass: cheap, so it runs as each image is discovered and
+        # only the misses are queued for OCR
+        nonlocal scanned
+        if finder:
+            scan = fingerprint_ahead(finder, input_folder, image_files, max_workers)
+        else:
+            scan = ((index, img_file, None, 0.0) for index, img_file in enumerate(image_files))
+        for index, img_file, fingerprint, seconds in scan:
+            if cancel_event and cancel_event.is_set():
+                break
+            scanned += 1
+            if timings:
+                timings.set_discovered(scanned)
+            if finder:
+                started = time.perf_counter()
+                found = finder.check(fingerprint, index)
+                dedup_seconds[index] = seconds + time.perf_counter() - started
+                if found and found[1] is not None:
+                    near[index] = found  # Matched below, collapsed in report if the keys agree
+                elif found:
+                    stats['duplicates'] += 1
+                    original = found[0]
+                    if original in results:
+                        report(duplicate_result(index, img_file, results[original]))
+                    else:
+                        waiting[original].append((index, img_file))
+                    continue
+            entry = None
+            if journal:
+                signatures[index] = file_signature(input_folder, img_file)
+                entry = journal.lookup(img_file, signatures[index])
+            if entry:
+                result = new_result(index, img_file)
+                result.update(text=entry['text'], key=entry['key'], keys=entry['keys'],
+                              source=entry['source'], resumed=True)
+                stats['resumed'] += 1
+                report(result)
+                continue
+            if strategy in ('filename-first', 'filename-only'):
+                result = match_filename(index, img_file)
+                if result['key'] or strategy == 'filename-only':
+                    report(result)
+                    continue
+            # The content hash goes along, so the OCR cache lookup needn't read the file again
+            yield (index, img_file, fingerprint[0]) if fingerprint else (index, img_file)
+
+    def finished():
+        if cancel_event and cancel_event.is_set():
+            raise RunCancelled(f"Cancelled after {done} of {scanned} images")
+        return [results[index] for index in sorted(results)], stats
+
+    if strategy == 'filename-only':
+        for _ in needs_ocr():
+            pass
+        return finished()
+
+    # Open the OCR cache (stale entries are dropped if the config changed)
+    cache = None
+    if settings['use_cache']:
+        os.makedirs(output_folder, exist_ok=True)
+        cache = OCRCache(default_cache_path(output_folder),
+                         config_fingerprint(pattern_config, preprocess))
+
+    # Shared by the workers to throttle how many images are decoded at once
+    memory_budget = None
+    if settings['memory_budget_mb'] and not ocr_pool:
+        memory_budget = MemoryBudget(settings['memory_budget_mb'] * 1024 * 1024)
+
+    # Process remaining images with OCR on the worker pool; results arrive
+    # in completion order and are slotted back by their index
+    try:
+        run_pool = ocr_pool.run if ocr_pool else run_ocr_pool
+        ocr_results = run_pool(input_folder, needs_ocr(),
+                               max_workers=max_workers,
+                               cache_path=cache.path if cache else None,
+                               config_key=cache.config_key if cache else None,
+                               filename_fallback=(strategy == 'ocr-first'),
+                               preprocess=preprocess,
+                               batch_size=settings['ocr_batch_size'],
+                               pattern_config=pattern_config,
+                               memory_budget=memory_budget)
+        uncommitted = 0
+        for result in ocr_results:
+            if result['ocr_run']:
+                stats['ocr_runs'] += 1
+            if result['prefiltered']:
+                stats['prefiltered'] += 1
+
+            if cache and result['hash'] and (result['cached'] or not result['error']):
+                if result['cached']:
+                    stats['cache_hits'] += 1
+                    cache.touch(result['hash'])
+                else:
+                    stats['cache_misses'] += 1
+                    ocr_key = result['key'] if result['source'] == 'ocr' else None
+                    cache.put(result['hash'], result['text'], ocr_key)
+                uncommitted += 1
+                if uncommitted >= CACHE_COMMIT_EVERY:
+                    cache.commit()
+                    uncommitted = 0
+            # After caching, as a manual key replaces the match it reports
+            report(result)
+    finally:
+        if cache:
+            cache.close()
+
+    return finished()
+
+
+def group_results(results):
+    """Group photos by their OCR-extracted pattern, in file order.
+
+    A photo with several keys (multi_group) is added to each of their groups.
+    Duplicates are left out; only their representative is shown.
+    """
+    photo_groups = defaultdict(list)
+    unmatched_photos = []
+    for result in results:
+        if result['duplicate_of']:
+            continue
+        for key in result['keys']:
+            photo_groups[key].append(result['file'])
+        if not result['keys']:
+            unmatched_photos.append(result['file'])
+    return dict(photo_groups), unmatched_photos
+
+
+class GroupFinalizer:
+    """Hands groups to a GroupFeed as soon as their membership is settled.
+
+    Results arrive in completion order, but the scan is sorted and a
+    group's photos are usually taken one after another. A group counts as
+    settled once every image up to gap images past its last photo has been
+    matched without adding another. Groups are released in the order of
+    their first photo, the order group_results gives them, and a released
+    group that still gains a photo is released again, so the deck ends up
+    the same as one built after OCR.
+    """
+
+    def __init__(self, feed, gap):
+        self.feed = feed
+        self.gap = gap
+        self.finished = set()  # Matched indexes past the contiguous prefix
+        self.prefix = 0        # Every image before this index has been matched
+        self.members = {}      # Group key -> [(index, file)] in scan order
+        self.heap = []         # (first index, key position, group key) of unreleased groups
+        self.released = set()
+        self.reopened = set()  # Released groups that have gained a photo since
+
+    def add(self, result):
+        index = result['index']
+        if not result['duplicate_of']:
+            for position, key in enumerate(result['keys']):
+                members = self.members.setdefault(key, [])
+                bisect.insort(members, (index, result['file']))
+                if key in self.released:
+                    self.reopened.add(key)
+                elif members[0][0] == index:
+                    heapq.heappush(self.heap, (index, position, key))
+        self.finished.add(index)
+        while self.prefix in self.finished:
+            self.finished.remove(self.prefix)
+            self.prefix += 1
+        self.release_settled()
+
+    def settled(self, key):
+        return self.members[key][-1][0] + self.gap < self.prefix
+
+    def release(self, key):
+        self.released.add(key)
+        self.reopened.discard(key)
+        self.feed.put(key, [img_file for _, img_file in self.members[key]])
+
+    def release_settled(self, final=False):
+        while self.heap:
+            first, _, key = self.heap[0]
+            if key in self.released or self.members[key][0][0] != first:
+                heapq.heappop(self.heap)  # Superseded by an earlier first photo
+                continue
+            # An image not matched yet could still start an earlier group
+            if not final and (first >= self.prefix or not self.settled(key)):
+                break
+            heapq.heappop(self.heap)
+            self.release(key)
+        for key in sorted(self.reopened, key=lambda key: self.members[key][0]):
+            if final or self.settled(key):
+                self.release(key)
+
+    def finish(self):
+        """Release what is left once every image has been matched"""
+        self.release_settled(final=True)
+        self.feed.close()
+
+
+def format_output_name(output_name, input_folder):
+    """Expand {folder}, {date} and {timestamp} placeholders in the output name"""
+    now = datetime.datetime.now()
+    name = output_name.format(folder=os.path.basename(os.path.normpath(input_folder)),
+                              date=now.strftime("%Y%m%d"),
+                              timestamp=now.strftime("%Y%m%d_%H%M%S"))
+    if not name.lower().endswith('.pptx'):
+        name += '.pptx'
+    return name
+
+
+def organize_photos(input_folder, output_folder, settings=None, progress_callback=None, log=print,
+                    timings=None, cancel_event=None, ocr_pool=None):
+    """Run the full scan -> OCR -> group -> PPTX pipeline.
+
+    progress_callback receives a percentage between 0 and 100 and log
+    receives debug messages. Stage durations are recorded into timings (a
+    RunTimings, created if not given) so callers can poll it for live
+    throughput. Returns the processing details dictionary, or None when the
+    input folder contains no images.
+
+    Matches are journalled to a checkpoint in the output folder while the
+    run is in progress. Setting cancel_event (a threading.Event) stops the
+    run between images with RunCancelled; the checkpoint is kept, so the
+    next run with the same options skips the photos already matched. It is
+    deleted once the presentation has been saved.
+
+    ocr_pool (an ocr_engine.SharedOCRPool) runs the OCR on a pool shared
+    with other runs, as the job queue does. settings['workers'] then only
+    sizes the threads preparing pictures for the deck, and the pool's own
+    memory budget replaces settings['memory_budget_mb'].
+    """
+    settings = settings or make_settings()
+    timings = timings or RunTimings()
+    started = time.time()
+
+    os.makedirs(output_folder, exist_ok=True)
+    journal = RunJournal(checkpoint_path(output_folder),
+                         run_fingerprint(input_folder, settings, preprocess_settings(settings),
+                                         pattern_settings(settings)),
+                         resume=settings['resume'], log=log)
+    if journal.completed:
+        log(f"Resuming from checkpoint with {len(journal.completed)} images already matched")
+
+    try:
+        image_files = scan_images(input_folder,
+                                  recursive=settings['recursive'],
+                                  include=settings['include'],
+                                  exclude=settings['exclude'],
+                                  log=log)
+        deck = None
+        if settings['pipeline']:
+            results, match_stats, deck = run_pipelined(input_folder, output_folder, image_files,
+                                                       settings, progress_callback, log, timings,
+                                                       journal, cancel_event, ocr_pool)
+        else:
+            results, match_stats = run_ocr_stage(input_folder, output_folder, image_files, settings,
+                                                 progress_callback, log, timings, journal,
+                                                 cancel_event, ocr_pool=ocr_pool)
+        journal.flush()
+        if not results:
+            journal.discard()
+            return None
+        details = build_output(input_folder, output_folder, settings, results, match_stats,
+                               progress_callback, log, timings, cancel_event, deck)
+    finally:
+        journal.close()
+    journal.discard()
+
+    details['stats']['elapsed_seconds'] = round(time.time() - started, 3)
+    return details
+
+
+def run_pipelined(input_folder, output_folder, image_files, settings, progress_callback=None, log=print,
+                  timings=None, journal=None, cancel_event=None, ocr_pool=None):
+    """Match every image while a second thread builds the slides of the
+    groups that have settled (see GroupFinalizer and
+    deck_builder.build_streamed_deck), so only the last groups are left to
+    build once OCR finishes.
+
+    Returns (results, match stats, (output_path, deck_stats)), the last
+    None when there were no images.
+    """
+    feed = GroupFeed()
+    finalizer = GroupFinalizer(feed, settings['group_gap'])
+    embed, layout = deck_settings(settings)
+    output_name = format_output_name(settings['output_name'], input_folder)
+    deck = {}
+
+    def build():
+        try:
+            deck['result'] = build_streamed_deck(input_folder, output_folder, output_name, feed,
+                                                 incremental=settings['incremental'],
+                                                 embed=embed,
+                                                 layout=layout,
+                                                 progress_callback=progress_callback,
+                                                 log=log,
+                                                 timings=timings,
+                                                 cancel_event=cancel_event)
+        except BaseException as e:
+            deck['error'] = e
+            feed.abort()  # Don't leave OCR waiting on a full feed
+
+    builder = threading.Thread(target=build, name="slide-builder", daemon=True)
+    builder.start()
+    try:
+        results, match_stats = run_ocr_stage(input_folder, output_folder, image_files, settings,
+                                             progress_callback, log, timings, journal, cancel_event,
+                                             on_result=finalizer.add, ocr_pool=ocr_pool)
+    except BaseException:
+        feed.abort()
+        builder.join()
+        raise
+    if not results:
+        feed.abort()  # Nothing to save
+        builder.join()
+        return results, match_stats, None
+    finalizer.finish()
+    builder.join()
+    if 'error' in deck:
+        raise deck['error']
+    return results, match_stats, deck['result']
+
+
+def build_output(input_folder, output_folder, settings, results, match_stats, progress_callback=None,
+                 log=print, timings=None, cancel_event=None, deck=None):
+    """Group matched results, build the presentation(s) and return the details.
+
+    deck is the (output_path, deck_stats) of a presentation already built
+    while OCR ran (see run_pipelined); it is reported instead of building one.
+    """
+    timings = timings or RunTimings()
+    if settings['export_results']:
+        # Before the deck, so the matches are kept even if building it fails
+        export_results(settings['export_results'], input_folder, results, settings, match_stats,
+                       index=settings['results_index'], workers=settings['workers'])
+        log(f"Exported {len(results)} results to {settings['export_results']}")
+    photo_groups, unmatched_photos = group_results(results)
+    duplicates = collect_duplicates(results)
+
+    log(f"Total groups found: {len(photo_groups)}")
+    if settings['verbose']:
+        log(f"Groups: {photo_groups}")
+
+    output_name = format_output_name(settings['output_name'], input_folder)
+    embed, layout = deck_settings(settings)
+    shard_index = None
+    if deck:
+        output_path, deck_stats = deck
+        output_files = [output_path]
+    elif settings['shard_slides'] or settings['shard_mb']:
+        shard_index, output_files, deck_stats = build_sharded_decks(
+            input_folder, output_folder, output_name, photo_groups,
+            max_slides=settings['shard_slides'],
+            max_mb=settings['shard_mb'],
+            embed=embed,
+            layout=layout,
+            progress_callback=progress_callback,
+            log=log,
+            timings=timings,
+            cancel_event=cancel_event)
+        output_path = output_files[0] if output_files else None
+    else:
+        output_path, deck_stats = build_deck(input_folder, output_folder, output_name, photo_groups,
+                                             incremental=settings['incremental'],
+                                             embed=embed,
+                                             layout=layout,
+                                             progress_callback=progress_callback,
+                                             log=log,
+                                             timings=timings,
+                                             cancel_event=cancel_event)
+        output_files = [output_path]
+
+    timings.finish()
+    if settings['timings_log']:
+        timings.export(settings['timings_log'])
+
+    return {
+        'input_folder': input_folder,
+        'output_folder': output_folder,
+        'output_path': output_path,
+        'output_files': output_files,
+        'shard_index': shard_index,
+        'settings': settings,
+        'groups': photo_groups,
+        'unmatched': unmatched_photos,
+        'duplicates': duplicates,
+        'timings': timings.snapshot(),
+        'stats': {
+            'total_photos': len(results),
+            'grouped_photos': sum(1 for r in results if r['keys'] and not r['duplicate_of']),
+            'total_slides': deck_stats['total_slides'],
+            'total_groups': len(photo_groups),
+            'unmatched_count': len(unmatched_photos),
+            'match_strategy': settings['match_strategy'],
+            'ocr_matches': sum(1 for r in results if r['source'] == 'ocr'),
+            'filename_matches': sum(1 for r in results if r['source'] == 'filename'),
+            'manual_matches': sum(1 for r in results if r['source'] == 'manual' and not r['duplicate_of']),
+            'multi_group_photos': sum(1 for r in results if len(r['keys']) > 1 and not r['duplicate_of']),
+            'dedup': settings['dedup'],
+            'duplicates': match_stats['duplicates'],
+            'ocr_backend': settings['ocr_backend'],
+            'ocr_runs': match_stats['ocr_runs'],
+            'prefiltered': match_stats['prefiltered'],
+            'cache_hits': match_stats['cache_hits'],
+            'cache_misses': match_stats['cache_misses'],
+            'resumed': match_stats['resumed'],
+            'slides_added': deck_stats['slides_added'],
+            'slides_rebuilt': deck_stats['slides_rebuilt'],
+            'slides_kept': deck_stats['slides_kept'],
+            'slides_removed': deck_stats['slides_removed'],
+            'original_image_bytes': deck_stats['original_bytes'],
+            'embedded_image_bytes': deck_stats['embedded_bytes'],
+        }
+    }
+
+
+def same_content(input_folder, result):
+    """Whether a photo still has the content hash recorded for its result"""
+    if not result['hash']:
+        return False
+    try:
+        return file_hash(os.path.join(input_folder, result['file'])) == result['hash']
+    except OSError:
+        return False
+
+
+def rebuild_from_results(results_file, input_folder, output_folder, settings=None, keys=None,
+                         progress_callback=None, log=print, timings=None, cancel_event=None):
+    """Build the presentation from an exported result set instead of OCR.
+
+    The photos are read from input_folder, which need not be where they
+    were when the results were exported. With keys given only those groups
+    are built. Photos that no longer exist are left out and photos changed
+    since the export keep their exported match (both are logged; a copied
+    photo whose mtime changed counts as unchanged if its content hash
+    still matches); keys
+    assigned by hand since the export are applied. Returns the processing
+    details, or None when the export holds no photos.
+    """
+    settings = settings or make_settings()
+    timings = timings or RunTimings()
+    started = time.time()
+    header, exported = load_results(results_file, set(keys) if keys else None, log)
+    if header['input_folder'] != os.path.abspath(input_folder):
+        log(f"Results were exported from {header['input_folder']}, reading photos from {input_folder}")
+    manual_keys = load_manual_keys(output_folder, input_folder, log)
+
+    results = []
+    missing = changed = 0
+    for result in exported:
+        signature = file_signature(input_folder, result['file'])
+        if signature is None:
+            log(f"Leaving out {result['file']}, it no longer exists")
+            missing += 1
+            continue
+        if signature != result['signature'] and not same_content(input_folder, result):
+            log(f"{result['file']} changed since the export, keeping its exported match")
+            changed += 1
+        if result['file'] in manual_keys and not result['duplicate_of']:
+            key = manual_keys[result['file']]
+            result.update(key=key, keys=[key], source='manual')
+        result['index'] = len(results)
+        results.append(result)
+    if not results:
+        return None
+
+    match_stats = {'cache_hits': 0, 'cache_misses': 0, 'ocr_runs': 0, 'resumed': 0, 'prefiltered': 0,
+                   'duplicates': sum(1 for r in results if r['duplicate_of'])}
+    # Report the matching options the results were made with
+    settings = dict(settings, match_strategy=header['match_strategy'], dedup=header['dedup'],
+                    ocr_backend=header['ocr_backend'])
+    if settings['export_results'] and os.path.abspath(settings['export_results']) == os.path.abspath(results_file):
+        settings['export_results'] = None  # Don't replace the export with what was read from it
+    details = build_output(input_folder, output_folder, settings, results, match_stats,
+                           progress_callback, log, timings, cancel_event)
+    details['stats'].update(results_file=results_file, missing_photos=missing, changed_photos=changed,
+                            elapsed_seconds=round(time.time() - started, 3))
+    return details
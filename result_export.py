@@ -0,0 +1,188 @@
+# Part 19: Result Export (save as result_export.py)
+#
+# Every photo's match written to a JSON lines file, so the slides can be
+# rebuilt later (with another layout, say) without running OCR again. The
+# first line is a header; each following line is one photo, in scan order,
+# with the fields that hold their default values left out. An optional
+# SQLite index next to it maps photos and group keys to line offsets, so a
+# few groups can be read out of a large export without parsing all of it.
+
+import datetime
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from checkpoint import file_signature
+from ocr_cache import connect_read_only, file_hash
+from ocr_engine import new_result
+
+RESULTS_FILENAME = "organize_results.jsonl"
+RESULTS_VERSION = 1
+
+# Result fields written for each photo, besides its file and signature
+EXPORT_FIELDS = ('hash', 'text', 'key', 'keys', 'source', 'region', 'cached', 'resumed',
+                 'prefiltered', 'ocr_run', 'duplicate_of', 'duplicate_distance', 'error', 'timings')
+
+
+def results_path(output_folder):
+    """Default export location in the output folder"""
+    return os.path.join(output_folder, RESULTS_FILENAME)
+
+
+def index_path(path):
+    """SQLite index stored next to an export"""
+    return os.path.splitext(path)[0] + ".index.sqlite"
+
+
+def export_entry(input_folder, result):
+    """Export line of a result. Photos matched without reading their
+    content (by filename, from the checkpoint or without the OCR cache)
+    are hashed now, so a rebuild can tell a copied photo from a changed one"""
+    signature = file_signature(input_folder, result['file'])
+    entry = {'file': result['file'],
+             'size': signature[0] if signature else None,
+             'mtime_ns': signature[1] if signature else None}
+    digest = result['hash']
+    if digest is None and signature:
+        try:
+            digest = file_hash(os.path.join(input_folder, result['file']))
+        except OSError:
+            pass
+    for field in EXPORT_FIELDS:
+        value = digest if field == 'hash' else result[field]
+        if value not in (None, False, '', [], {}):
+            entry[field] = value
+    return entry
+
+
+def export_results(path, input_folder, results, settings, match_stats, index=False, workers=None):
+    """Write results (in scan order) to a JSON lines file, with an SQLite
+    index next to it if index is set. Missing hashes are computed on a
+    pool of workers threads"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    header = {
+        'version': RESULTS_VERSION,
+        'input_folder': os.path.abspath(input_folder),
+        'exported': datetime.datetime.now().isoformat(timespec='seconds'),
+        'match_strategy': settings['match_strategy'],
+        'patterns_file': settings['patterns_file'],
+        'multi_group': settings['multi_group'],
+        'dedup': settings['dedup'],
+        'ocr_backend': settings['ocr_backend'],
+        'count': len(results),
+        'stats': match_stats,
+    }
+    rows = []  # (position, file, key, source, offset, keys) for the index
+    temp_path = path + ".tmp"
+    workers = workers or max(1, os.cpu_count() or 1)
+    with open(temp_path, 'wb') as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b"\n")
+        entries = executor.map(lambda result: export_entry(input_folder, result), results)
+        for position, (result, entry) in enumerate(zip(results, entries)):
+            offset = f.tell()
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n")
+            rows.append((position, result['file'], result['key'], result['source'], offset,
+                         result['keys']))
+    os.replace(temp_path, path)
+    if index:
+        write_index(path, rows)
+    elif os.path.exists(index_path(path)):
+        os.remove(index_path(path))  # It would describe an older export
+
+
+def write_index(path, rows):
+    db_path = index_path(path)
+    temp_path = db_path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    try:
+        conn.execute("CREATE TABLE export (size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)")
+        conn.execute("""CREATE TABLE photos (
+                            position INTEGER PRIMARY KEY,
+                            file TEXT NOT NULL UNIQUE,
+                            group_key TEXT,
+                            source TEXT,
+                            offset INTEGER NOT NULL)""")
+        conn.execute("CREATE TABLE photo_keys (group_key TEXT NOT NULL, position INTEGER NOT NULL)")
+        conn.executemany("INSERT INTO photos VALUES (?, ?, ?, ?, ?)",
+                         (row[:5] for row in rows))
+        conn.executemany("INSERT INTO photo_keys VALUES (?, ?)",
+                         ((key, row[0]) for row in rows for key in row[5]))
+        conn.execute("CREATE INDEX idx_photo_keys ON photo_keys (group_key)")
+        stat = os.stat(path)
+        conn.execute("INSERT INTO export VALUES (?, ?)", (stat.st_size, stat.st_mtime_ns))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(temp_path, db_path)
+
+
+def read_header(f, path):
+    try:
+        header = json.loads(f.readline() or 'null')
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('version') != RESULTS_VERSION:
+        raise ValueError(f"Not a results export: {path}")
+    return header
+
+
+def entry_result(position, entry):
+    """Match result for an exported line"""
+    result = new_result(position, entry['file'])
+    for field in EXPORT_FIELDS:
+        if field in entry:
+            result[field] = entry[field]
+    result['signature'] = [entry['size'], entry['mtime_ns']] if entry['size'] is not None else None
+    return result
+
+
+def open_index(path, log=print):
+    """Connection to the index of an export, or None if it is missing or stale"""
+    db_path = index_path(path)
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = connect_read_only(db_path)
+        row = conn.execute("SELECT size, mtime_ns FROM export").fetchone()
+    except sqlite3.Error as e:
+        log(f"Ignoring unreadable results index {db_path}: {str(e)}")
+        return None
+    stat = os.stat(path)
+    if row != (stat.st_size, stat.st_mtime_ns):
+        log(f"Ignoring results index {db_path}, the export has changed since")
+        conn.close()
+        return None
+    return conn
+
+
+def load_results(path, keys=None, log=print):
+    """Read an export, returns (header, results in scan order).
+
+    With keys given only the photos in those groups are returned; the
+    index, if there is an up-to-date one, is used to read just their lines.
+    """
+    with open(path, 'rb') as f:
+        header = read_header(f, path)
+        conn = open_index(path, log) if keys else None
+        if conn is None:
+            results = []
+            for position, line in enumerate(f):
+                entry = json.loads(line)
+                if keys is None or any(key in keys for key in entry.get('keys', [])):
+                    results.append(entry_result(position, entry))
+            return header, results
+        try:
+            marks = ", ".join("?" * len(keys))
+            rows = conn.execute(f"""SELECT DISTINCT photos.position, photos.offset
+                                    FROM photo_keys JOIN photos USING (position)
+                                    WHERE photo_keys.group_key IN ({marks})
+                                    ORDER BY photos.position""", list(keys)).fetchall()
+        finally:
+            conn.close()
+        results = []
+        for position, offset in rows:
+            f.seek(offset)
+            results.append(entry_result(position, json.loads(f.readline())))
+        return header, results
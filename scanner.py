@@ -0,0 +1,92 @@
+# Part 7: Directory Scanner (save as scanner.py)
+
+import fnmatch
+import os
+from ocr_engine import IMAGE_EXTENSIONS
+
+
+def matches_any(rel_path, patterns):
+    """True if the relative path or its basename matches one of the globs"""
+    name = os.path.basename(rel_path)
+    posix_path = rel_path.replace(os.sep, '/')
+    return any(fnmatch.fnmatch(posix_path, pattern) or fnmatch.fnmatch(name, pattern)
+               for pattern in patterns)
+
+
+def is_wanted(rel_path, include=None, exclude=None):
+    """True if a file is an image the include/exclude globs let through"""
+    if not rel_path.lower().endswith(IMAGE_EXTENSIONS):
+        return False
+    if include and not matches_any(rel_path, include):
+        return False
+    if exclude and matches_any(rel_path, exclude):
+        return False
+    return True
+
+
+def in_scan(rel_path, recursive=False, include=None, exclude=None):
+    """True if scan_images would yield rel_path, were the file there"""
+    folders = rel_path.split(os.sep)[:-1]
+    if folders and not recursive:
+        return False
+    # Excluded subfolders are pruned with everything below them
+    for depth in range(1, len(folders) + 1):
+        if exclude and matches_any(os.path.join(*folders[:depth]), exclude):
+            return False
+    return is_wanted(rel_path, include, exclude)
+
+
+def scan_order_key(rel_path):
+    """Sort key putting paths in the order scan_images yields them: a
+    folder's files by name, then its subfolders depth-first"""
+    parts = rel_path.split(os.sep)
+    return [(1, folder) for folder in parts[:-1]] + [(0, parts[-1])]
+
+
+def scan_images(input_folder, recursive=False, include=None, exclude=None, log=print):
+    """Yield image paths relative to input_folder as they are discovered.
+
+    Uses os.scandir so directory entries are streamed rather than listed up
+    front, letting OCR start on the first photos while the rest of a large
+    network share is still being walked. Entries are sorted within each
+    directory so the order is deterministic. include globs (if any) must
+    match an image for it to be yielded; exclude globs skip images and,
+    when recursive, prune whole subfolders. Symlinked folders are not
+    followed. Folders that can't be read are reported to log and skipped.
+    """
+    include = include or []
+    exclude = exclude or []
+    pending = ['']
+
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            with os.scandir(os.path.join(input_folder, rel_dir)) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            log(f"Error scanning {rel_dir or input_folder}: {str(e)}")
+            continue
+
+        subfolders = []
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not matches_any(rel_path, exclude):
+                        subfolders.append(rel_path)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+
+            if is_wanted(rel_path, include, exclude):
+                yield rel_path
+
+        # Depth-first, visiting subfolders in name order
+        pending.extend(reversed(subfolders))
+
+
+def list_image_files(input_folder, recursive=False, include=None, exclude=None, log=print):
+    """Get all image files, sorted so grouping is deterministic"""
+    return list(scan_images(input_folder, recursive, include, exclude, log))
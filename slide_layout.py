@@ -0,0 +1,188 @@
+# Part 16: Slide Layout (save as slide_layout.py)
+#
+# Works out where every photo goes before any slide is built: groups larger
+# than max_per_slide continue on further slides, and each slide's photos are
+# placed in the grid that shows them largest without distorting them.
+
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from pptx.util import Inches
+
+DIMENSIONS_FILENAME = "photo_dimensions.json"
+DIMENSIONS_VERSION = 1
+
+# Default 4:3 presentation
+SLIDE_WIDTH = Inches(10)
+SLIDE_HEIGHT = Inches(7.5)
+MARGIN = Inches(0.2)
+GAP = Inches(0.1)
+
+# Assumed for photos whose size can't be read
+FALLBACK_SIZE = (4, 3)
+
+DEFAULT_LAYOUT = {
+    'max_per_slide': 12,   # Photos per slide before a group continues on the next, 0 for no limit
+}
+
+
+def dimensions_path(output_folder):
+    """Dimension cache stored in the output folder"""
+    return os.path.join(output_folder, DIMENSIONS_FILENAME)
+
+
+def read_dimensions(img_path):
+    """(width, height) of an image, read from its header without decoding it"""
+    with Image.open(img_path) as image:
+        return image.size
+
+
+class DimensionCache:
+    """Pixel sizes of photos kept between runs, valid while a photo's size
+    and mtime are unchanged.
+
+    A header read is cheap but still opens every file, which adds up for
+    thousands of photos on a network share.
+    """
+
+    def __init__(self, path=None, input_folder=None, log=print):
+        self.path = path
+        self.log = log
+        self.input_folder = os.path.abspath(input_folder) if input_folder else None
+        self.entries = self.load() if path else {}
+        self.used = {}  # Entries looked up this run, the only ones saved again
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.log(f"Ignoring unreadable dimension cache {self.path}: {str(e)}")
+            return {}
+        if data.get('version') != DIMENSIONS_VERSION or data.get('input_folder') != self.input_folder:
+            return {}
+        return data.get('photos', {})
+
+    def probe(self, input_folder, photo):
+        """(photo, cache entry or None), reading the header only on a miss"""
+        img_path = os.path.join(input_folder, photo)
+        try:
+            stat = os.stat(img_path)
+            entry = self.entries.get(photo)
+            if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+                return photo, entry
+            width, height = read_dimensions(img_path)
+            return photo, [stat.st_size, stat.st_mtime_ns, width, height]
+        except Exception as e:
+            self.log(f"Could not read the size of {photo}: {str(e)}")
+            return photo, None
+
+    def lookup(self, input_folder, photos, workers=None):
+        """Pixel sizes as {photo: (width, height)}, probing files on a thread
+        pool; unreadable photos are left out"""
+        workers = workers or max(1, os.cpu_count() or 1)
+        sizes = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for photo, entry in executor.map(lambda photo: self.probe(input_folder, photo), photos):
+                if entry:
+                    self.used[photo] = entry
+                    sizes[photo] = (entry[2], entry[3])
+        return sizes
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': DIMENSIONS_VERSION,
+                       'input_folder': self.input_folder,
+                       'photos': self.used}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+def fitted_size(width, height, box_width, box_height):
+    """Largest size with the photo's aspect ratio that fits the box"""
+    scale = min(box_width / width, box_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def page_sizes(count, max_per_slide):
+    """Split count photos into slides of at most max_per_slide, as evenly as
+    possible so the last slide isn't left with one or two"""
+    if not max_per_slide or count <= max_per_slide:
+        return [count]
+    pages = math.ceil(count / max_per_slide)
+    base, extra = divmod(count, pages)
+    return [base + 1] * extra + [base] * (pages - extra)
+
+
+def grid_slots(sizes, left=MARGIN, top=MARGIN, width=SLIDE_WIDTH - 2 * MARGIN,
+               height=SLIDE_HEIGHT - 2 * MARGIN):
+    """Place photos of the given pixel sizes in the grid that shows them largest.
+
+    Every rows x columns grid without an empty row is tried, scaling each
+    photo to fit its cell with its aspect ratio kept. Photos are centred in
+    their cells and a part-filled last row is centred on the slide.
+    Returns (x, y, width, height) in EMU per photo, filled row by row.
+    """
+    count = len(sizes)
+    best = None
+    for rows in range(1, count + 1):
+        cols = math.ceil(count / rows)
+        if (rows - 1) * cols >= count:
+            continue
+        gap = min(GAP, width / cols / 10, height / rows / 10)
+        cell_width = (width - gap * (cols - 1)) / cols
+        cell_height = (height - gap * (rows - 1)) / rows
+        area = 0
+        for photo_width, photo_height in sizes:
+            fit_width, fit_height = fitted_size(photo_width, photo_height, cell_width, cell_height)
+            area += fit_width * fit_height
+        if best is None or area > best[0]:
+            best = (area, cols, gap, cell_width, cell_height)
+
+    _, cols, gap, cell_width, cell_height = best
+    slots = []
+    for idx, (photo_width, photo_height) in enumerate(sizes):
+        row, col = divmod(idx, cols)
+        in_row = min(cols, count - row * cols)
+        row_left = left + (cols - in_row) * (cell_width + gap) / 2
+        fit_width, fit_height = fitted_size(photo_width, photo_height, cell_width, cell_height)
+        slots.append((int(row_left + col * (cell_width + gap) + (cell_width - fit_width) / 2),
+                      int(top + row * (cell_height + gap) + (cell_height - fit_height) / 2),
+                      fit_width, fit_height))
+    return slots
+
+
+def layout_group(photos, sizes, max_per_slide=DEFAULT_LAYOUT['max_per_slide']):
+    """Slides of one group, each a list of (photo, (x, y, width, height))"""
+    slides = []
+    start = 0
+    for page_size in page_sizes(len(photos), max_per_slide):
+        page = photos[start:start + page_size]
+        slots = grid_slots([sizes.get(photo) or FALLBACK_SIZE for photo in page])
+        slides.append(list(zip(page, slots)))
+        start += page_size
+    return slides
+
+
+def layout_groups(input_folder, photo_groups, layout=None, cache_path=None, workers=None, log=print):
+    """Lay out the slides of every group in one pass.
+
+    The sizes of all photos are gathered up front from the dimension cache
+    at cache_path (if given) or their headers, so no image is decoded.
+    Returns {group_key: slides} in group order, see layout_group.
+    """
+    layout = dict(DEFAULT_LAYOUT, **(layout or {}))
+    cache = DimensionCache(cache_path, input_folder, log)
+    photos = list(dict.fromkeys(photo for group in photo_groups.values() for photo in group))
+    sizes = cache.lookup(input_folder, photos, workers)
+    if cache_path:
+        try:
+            cache.save()
+        except OSError as e:
+            log(f"Could not save dimension cache {cache_path}: {str(e)}")
+    return {group_key: layout_group(group, sizes, layout['max_per_slide'])
+            for group_key, group in photo_groups.items()}
@@ -0,0 +1,129 @@
+# Part 18: Thumbnail Cache (save as thumbnails.py)
+#
+# Small JPEG previews of the photos for the details window. They are made on
+# demand and kept in the output folder next to the OCR cache, so reviewing a
+# run again doesn't decode the originals a second time.
+
+import io
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from checkpoint import file_signature
+
+THUMBNAILS_FILENAME = "thumbnails.sqlite"
+THUMBNAIL_SIZE = 160  # Longest edge in pixels
+THUMBNAIL_QUALITY = 75
+
+
+def thumbnails_path(output_folder):
+    """Thumbnail cache stored in the output folder"""
+    return os.path.join(output_folder, THUMBNAILS_FILENAME)
+
+
+def make_thumbnail(img_path, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """JPEG bytes of a thumbnail; JPEGs are decoded at reduced scale"""
+    with Image.open(img_path) as image:
+        image.draft('RGB', (size, size))
+        thumbnail = image.convert('RGB')
+    thumbnail.thumbnail((size, size))
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class ThumbnailCache:
+    """Thumbnails on disk by photo path, valid while the photo's size and
+    mtime are unchanged. Safe to share between threads, as long as log is."""
+
+    def __init__(self, path, input_folder, log=print):
+        self.path = path
+        self.log = log
+        self.input_folder = input_folder
+        self.folder_key = os.path.abspath(input_folder)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS thumbnails (
+                                 input_folder TEXT NOT NULL,
+                                 photo TEXT NOT NULL,
+                                 size INTEGER NOT NULL,
+                                 mtime_ns INTEGER NOT NULL,
+                                 data BLOB NOT NULL,
+                                 PRIMARY KEY (input_folder, photo))""")
+        self.conn.commit()
+
+    def get(self, photo):
+        """Thumbnail JPEG bytes of a photo, made and stored first if missing
+        or stale; None if the photo can't be read"""
+        signature = file_signature(self.input_folder, photo)
+        if signature is None:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM thumbnails WHERE input_folder = ? AND photo = ? "
+                "AND size = ? AND mtime_ns = ?", (self.folder_key, photo, *signature)).fetchone()
+        if row:
+            return row[0]
+        try:
+            data = make_thumbnail(os.path.join(self.input_folder, photo))
+        except Exception as e:
+            self.log(f"Could not make a thumbnail of {photo}: {str(e)}")
+            return None
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?)",
+                              (self.folder_key, photo, *signature, data))
+            self.conn.commit()
+        return data
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ThumbnailLoader:
+    """Gets thumbnails from a ThumbnailCache on a thread pool.
+
+    on_ready(photo, data) is called on a worker thread for every finished
+    thumbnail (data None if it failed). Requests for photos dropped by
+    keep_only before a worker got to them are skipped, so scrolling quickly
+    through a long list doesn't queue work for photos no longer shown.
+    """
+
+    def __init__(self, cache, on_ready, workers=None):
+        self.cache = cache
+        self.on_ready = on_ready
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1))
+        self.lock = threading.Lock()
+        self.requested = set()  # Queued or being made
+        self.wanted = set()
+
+    def request(self, photo):
+        with self.lock:
+            self.wanted.add(photo)
+            if photo in self.requested:
+                return
+            self.requested.add(photo)
+        self.executor.submit(self.load, photo)
+
+    def keep_only(self, photos):
+        """Forget requests for every photo not in photos"""
+        with self.lock:
+            self.wanted = set(photos)
+
+    def load(self, photo):
+        with self.lock:
+            if photo not in self.wanted:
+                self.requested.discard(photo)
+                return
+        data = self.cache.get(photo)
+        with self.lock:
+            self.requested.discard(photo)
+        self.on_ready(photo, data)
+
+    def close(self):
+        """Drop queued requests, wait for those in progress and close the cache"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.cache.close()
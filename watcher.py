@@ -0,0 +1,244 @@
+# Part 17: Watch Folder (save as watcher.py)
+#
+# Keeps the deck of an input folder up to date while photos are dropped into
+# it: once a new or changed image has finished being written it is matched,
+# and only the groups it joins or leaves get their slides rebuilt (the
+# incremental mode of deck_builder.build_deck).
+
+import os
+import threading
+import time
+from checkpoint import RunCancelled, file_signature
+from instrumentation import RunTimings
+from photo_pipeline import build_output, format_output_name, make_settings, run_ocr_stage
+from scanner import in_scan, scan_images, scan_order_key
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # Optional, changes are found by rescanning without it
+    FileSystemEventHandler = object
+    Observer = None
+
+DEFAULT_POLL_SECONDS = 2.0     # Between rescans when polling
+DEFAULT_RESCAN_SECONDS = 60.0  # Between rescans when file events are watched, for missed events
+DEFAULT_SETTLE_SECONDS = 2.0   # How long a file must stay unchanged before it is read
+
+# Events usually come in bursts while a file is written
+EVENT_DELAY = 0.2
+
+
+class ChangeCollector(FileSystemEventHandler):
+    """Paths touched by file system events since they were last taken"""
+
+    def __init__(self, input_folder, wake):
+        self.input_folder = os.path.abspath(input_folder)
+        self.wake = wake
+        self.lock = threading.Lock()
+        self.paths = set()
+        self.rescan = False  # A folder came or went, its files raise no events of their own
+
+    def on_any_event(self, event):
+        with self.lock:
+            if event.is_directory:
+                self.rescan = self.rescan or event.event_type in ('created', 'deleted', 'moved')
+            else:
+                for path in (event.src_path, getattr(event, 'dest_path', None)):
+                    if path:
+                        self.paths.add(os.path.relpath(os.fsdecode(path), self.input_folder))
+        self.wake.set()
+
+    def take(self):
+        """(paths, whether a rescan is needed)"""
+        with self.lock:
+            paths, rescan = self.paths, self.rescan
+            self.paths, self.rescan = set(), False
+        return paths, rescan
+
+
+class FolderWatcher:
+    """Find the images added, changed or removed since the last look.
+
+    With watchdog installed, file system events (inotify on Linux) tell
+    which files to look at and the folder is only rescanned every
+    rescan_seconds in case events were missed, as they often are on network
+    shares; without it the folder is rescanned every poll_seconds. A new or
+    changed file is only reported once its size and mtime have held for
+    settle_seconds, so a photo still being copied isn't read half-written.
+    """
+
+    def __init__(self, input_folder, recursive=False, include=None, exclude=None,
+                 poll_seconds=DEFAULT_POLL_SECONDS, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 rescan_seconds=DEFAULT_RESCAN_SECONDS, use_events=True, log=print):
+        self.input_folder = input_folder
+        self.log = log
+        self.recursive = recursive
+        self.include = include or []
+        self.exclude = exclude or []
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.rescan_seconds = rescan_seconds
+        self.known = {}    # Path -> signature when last reported
+        self.pending = {}  # Path -> (signature, when it was first seen)
+        self.last_rescan = None
+        self.wake = threading.Event()
+        self.collector = None
+        self.observer = None
+        if use_events and Observer is not None:
+            self.collector = ChangeCollector(input_folder, self.wake)
+            self.observer = Observer()
+            self.observer.schedule(self.collector, input_folder, recursive=recursive)
+            self.observer.start()
+
+    def stop(self):
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+
+    def note(self, rel_path, signature, now):
+        """Track a file's current signature (None if it is gone)"""
+        if signature is None or signature == self.known.get(rel_path):
+            self.pending.pop(rel_path, None)
+            return
+        seen = self.pending.get(rel_path)
+        if seen is None or seen[0] != signature:
+            # Already settled if it was last written long enough ago
+            written = time.time() - signature[1] / 1e9
+            self.pending[rel_path] = (signature, now - written if written >= self.settle_seconds else now)
+
+    def changes(self):
+        """Return (settled new or changed files in scan order, removed files)"""
+        now = time.monotonic()
+        removed = []
+        paths, rescan = self.collector.take() if self.collector else (set(), True)
+        interval = self.rescan_seconds if self.collector else self.poll_seconds
+        if rescan or self.last_rescan is None or now - self.last_rescan >= interval:
+            current = set()
+            for rel_path in scan_images(self.input_folder, self.recursive, self.include, self.exclude,
+                                        self.log):
+                current.add(rel_path)
+                self.note(rel_path, file_signature(self.input_folder, rel_path), now)
+            removed = [rel_path for rel_path in self.known if rel_path not in current]
+            for rel_path in [rel_path for rel_path in self.pending if rel_path not in current]:
+                del self.pending[rel_path]
+            self.last_rescan = now
+        else:
+            # Only the files events named, and those still settling
+            for rel_path in paths | set(self.pending):
+                if not in_scan(rel_path, self.recursive, self.include, self.exclude):
+                    continue
+                signature = file_signature(self.input_folder, rel_path)
+                if signature is None and rel_path in self.known:
+                    removed.append(rel_path)
+                self.note(rel_path, signature, now)
+
+        ready = [rel_path for rel_path, (_, since) in self.pending.items()
+                 if now - since >= self.settle_seconds]
+        for rel_path in ready:
+            self.known[rel_path] = self.pending.pop(rel_path)[0]
+        for rel_path in removed:
+            self.known.pop(rel_path, None)
+        return sorted(ready, key=scan_order_key), removed
+
+    def retry(self, rel_paths):
+        """Report files again on the next look, e.g. after a failed update"""
+        for rel_path in rel_paths:
+            signature = self.known.pop(rel_path, None)
+            if signature is not None:
+                self.pending[rel_path] = (signature, float('-inf'))
+
+    def wait(self, stop_event):
+        """Sleep until the next look is due, a file event arrives or stop_event is set"""
+        now = time.monotonic()
+        interval = self.rescan_seconds if self.collector else self.poll_seconds
+        timeout = self.last_rescan + interval - now
+        for _, since in self.pending.values():
+            timeout = min(timeout, since + self.settle_seconds - now)
+        deadline = now + max(timeout, 0)
+        while not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self.wake.wait(min(remaining, 0.5)):
+                time.sleep(EVENT_DELAY)
+                break
+        self.wake.clear()
+
+
+class WatchSession:
+    """The matches of every photo in the input folder, updated as files
+    change, and the deck built from them"""
+
+    def __init__(self, input_folder, output_folder, settings, log=print):
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.log = log
+        # The deck is updated in place, so its name is fixed when watching starts
+        self.settings = make_settings(**dict(settings, incremental=True, pipeline=False,
+                                             output_name=format_output_name(settings['output_name'],
+                                                                            input_folder)))
+        self.results = {}  # File -> match result
+
+    def update(self, changed, removed, cancel_event=None):
+        """Match the changed files, forget the removed ones and update the
+        deck, returns the processing details"""
+        timings = RunTimings()
+        results, match_stats = run_ocr_stage(self.input_folder, self.output_folder, changed,
+                                             self.settings, log=self.log, timings=timings,
+                                             cancel_event=cancel_event)
+        for result in results:
+            self.results[result['file']] = result
+        for rel_path in removed:
+            self.results.pop(rel_path, None)
+        ordered = [self.results[rel_path] for rel_path in sorted(self.results, key=scan_order_key)]
+        return build_output(self.input_folder, self.output_folder, self.settings, ordered, match_stats,
+                            log=self.log, timings=timings, cancel_event=cancel_event)
+
+
+def watch_folder(input_folder, output_folder, settings, stop_event, log=print, on_update=None,
+                 poll_seconds=DEFAULT_POLL_SECONDS, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 rescan_seconds=DEFAULT_RESCAN_SECONDS):
+    """Keep the deck of input_folder up to date until stop_event is set.
+
+    The photos already in the folder are matched first (the OCR cache and
+    a previous deck's unchanged slides are reused), then each batch of new,
+    changed or removed photos updates the deck. on_update receives the
+    processing details after every update. An update interrupted by
+    stop_event is dropped and redone on the next start. Returns the details
+    of the last update, or None if there was none.
+    """
+    if settings['dedup'] != 'off':
+        raise ValueError("Duplicate detection is not supported in watch mode")
+    session = WatchSession(input_folder, output_folder, settings, log)
+    watcher = FolderWatcher(input_folder, settings['recursive'], settings['include'],
+                            settings['exclude'], poll_seconds, settle_seconds, rescan_seconds,
+                            log=log)
+    log(f"Watching {input_folder} for new photos "
+        f"({'file events' if watcher.observer else 'polling'}), Ctrl+C to stop")
+    details = None
+    failed = False  # The last update failed, the deck has to be built again
+    try:
+        while not stop_event.is_set():
+            changed, removed = watcher.changes()
+            if changed or removed or failed:
+                started = time.monotonic()
+                try:
+                    details = session.update(changed, removed, stop_event)
+                except RunCancelled:
+                    log("Stopped during an update, it will be redone on the next start")
+                    break
+                except Exception as e:
+                    log(f"Update failed, retrying in {poll_seconds:.0f}s: {str(e)}")
+                    watcher.retry(changed)
+                    failed = True
+                    stop_event.wait(poll_seconds)
+                    continue
+                failed = False
+                log(f"Updated {details['output_path']} with {len(changed)} new or changed and "
+                    f"{len(removed)} removed photos in {time.monotonic() - started:.1f}s")
+                if on_update:
+                    on_update(details)
+            watcher.wait(stop_event)
+    finally:
+        watcher.stop()
+    return details